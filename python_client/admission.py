@@ -0,0 +1,167 @@
+#!/usr/bin/env python3
+"""
+Admission control for the gateway's HTTP routes
+
+- RouteLimiter: caps concurrent requests on one route; excess requests wait in a
+  bounded queue for at most max_queue_time, and anything beyond that is shed
+  immediately with Overloaded (the HTTP layer turns it into 503 + Retry-After)
+- Waiting requests are grouped by caller (API token fingerprint or remote address)
+  and freed slots go to callers round-robin, so one busy agent cannot starve the rest
+- When the queue is full, a newcomer displaces the newest waiter of the caller with
+  the most queued requests, as long as that caller still has more queued afterwards
+"""
+
+import asyncio
+import logging
+import math
+from collections import OrderedDict, deque
+from typing import Deque, Dict
+
+logger = logging.getLogger(__name__)
+
+
+class Overloaded(Exception):
+    """Raised when a request is shed; retry_after is a suggested wait in whole seconds"""
+
+    def __init__(self, reason: str, retry_after: int):
+        super().__init__(reason)
+        self.reason = reason
+        self.retry_after = retry_after
+
+
+class RouteLimiter:
+    """Concurrency limit plus a bounded, per-caller fair queue for one route"""
+
+    def __init__(self, name: str, limit: int, max_queue: int, max_queue_time: float):
+        self.name = name
+        self.limit = max(limit, 1)
+        self.max_queue = max(max_queue, 0)
+        self.max_queue_time = max_queue_time
+        self.in_flight = 0
+        self.queued = 0
+        # caller -> waiting futures, oldest first; iteration order is the round-robin order
+        self._queues: "OrderedDict[str, Deque[asyncio.Future]]" = OrderedDict()
+        self._service_time = 0.1  # EWMA of request duration, seconds
+        self.admitted = 0
+        self.queued_total = 0
+        self.shed_queue_full = 0
+        self.shed_queue_timeout = 0
+        self.displaced = 0
+
+    def retry_after(self) -> int:
+        """Rough seconds until a slot frees up for a request arriving now"""
+        wait = self._service_time * (self.queued + 1) / self.limit
+        return min(max(math.ceil(wait), 1), 60)
+
+    async def acquire(self, caller: str):
+        """Wait for a slot; raises Overloaded if the queue is full or the wait would be too long"""
+        if self.in_flight < self.limit and not self.queued:
+            self.in_flight += 1
+            self.admitted += 1
+            return
+
+        if self.queued >= self.max_queue and not self._displace_for(caller):
+            self.shed_queue_full += 1
+            raise Overloaded("queue full", self.retry_after())
+
+        future = asyncio.get_running_loop().create_future()
+        self._queues.setdefault(caller, deque()).append(future)
+        self.queued += 1
+        self.queued_total += 1
+        try:
+            async with asyncio.timeout(self.max_queue_time):
+                await future
+        except TimeoutError:
+            if future.done() and not future.cancelled() and future.exception() is None:
+                # Granted at the same moment the timer fired
+                self.admitted += 1
+                return
+            self._forget(caller, future)
+            self.shed_queue_timeout += 1
+            raise Overloaded("queue timeout", self.retry_after())
+        except asyncio.CancelledError:
+            if future.done() and not future.cancelled() and future.exception() is None:
+                self.release()
+            else:
+                self._forget(caller, future)
+            raise
+        # Overloaded set on the future (displaced) propagates from the await above
+        self.admitted += 1
+
+    def release(self, duration: float | None = None):
+        """Return a slot, handing it to the next caller in round-robin order"""
+        if duration is not None:
+            self._service_time += 0.2 * (duration - self._service_time)
+        self.in_flight -= 1
+        while self.in_flight < self.limit and self._queues:
+            caller, waiters = next(iter(self._queues.items()))
+            future = waiters.popleft()
+            self.queued -= 1
+            if waiters:
+                self._queues.move_to_end(caller)
+            else:
+                del self._queues[caller]
+            if not future.done():
+                future.set_result(True)
+                self.in_flight += 1
+
+    def _forget(self, caller: str, future: asyncio.Future):
+        waiters = self._queues.get(caller)
+        if waiters is not None and future in waiters:
+            waiters.remove(future)
+            self.queued -= 1
+            if not waiters:
+                del self._queues[caller]
+
+    def _displace_for(self, caller: str) -> bool:
+        """Free a queue slot for caller by shedding the newest waiter of the heaviest other caller"""
+        if not self._queues:
+            return False
+        heaviest = max(self._queues, key=lambda c: len(self._queues[c]))
+        if heaviest == caller or len(self._queues[heaviest]) <= len(self._queues.get(caller, ())) + 1:
+            return False
+        future = self._queues[heaviest].pop()
+        self.queued -= 1
+        if not self._queues[heaviest]:
+            del self._queues[heaviest]
+        future.set_exception(Overloaded("displaced by fair share", self.retry_after()))
+        self.displaced += 1
+        return True
+
+    def stats(self) -> dict:
+        return {
+            "limit": self.limit,
+            "in_flight": self.in_flight,
+            "queued": self.queued,
+            "queued_callers": len(self._queues),
+            "max_queue": self.max_queue,
+            "max_queue_ms": round(self.max_queue_time * 1000),
+            "admitted": self.admitted,
+            "queued_total": self.queued_total,
+            "shed_queue_full": self.shed_queue_full,
+            "shed_queue_timeout": self.shed_queue_timeout,
+            "displaced": self.displaced,
+            "service_time_ms": round(self._service_time * 1000, 3),
+        }
+
+
+class AdmissionController:
+    """One RouteLimiter per route, created on first use with the route's configured limit"""
+
+    def __init__(self, default_limit: int, max_queue: int, max_queue_time: float,
+                 route_limits: Dict[str, int] | None = None):
+        self.default_limit = default_limit
+        self.max_queue = max_queue
+        self.max_queue_time = max_queue_time
+        self.route_limits = dict(route_limits or {})
+        self.routes: Dict[str, RouteLimiter] = {}
+
+    def limiter(self, route: str) -> RouteLimiter:
+        limiter = self.routes.get(route)
+        if limiter is None:
+            limit = self.route_limits.get(route, self.default_limit)
+            limiter = self.routes[route] = RouteLimiter(route, limit, self.max_queue, self.max_queue_time)
+        return limiter
+
+    def stats(self) -> dict:
+        return {route: limiter.stats() for route, limiter in self.routes.items()}
@@ -13,6 +13,8 @@ from typing import Dict, List, Optional, Any
 import argparse
 import httpx
 
+from email_templates import EmailView, templates_for
+
 # Disable logging for cleaner AI agent interaction
 logging.getLogger().setLevel(logging.ERROR)
 
@@ -190,47 +192,14 @@ class ShiftWorkTestInterface:
             schedules = schedule_result.get("schedules", [])
             employee_display_name = employee_name or person_id
             
-            if schedules:
-                email_body = f"""Subject: Work Schedule for {employee_display_name}
-From: system@shiftwork.com
-To: {recipient_email}
-
-Hello,
-
-Here is the work schedule information for employee {employee_display_name}:
-
-Company ID: {company_id}
-Employee ID: {person_id}
-Total Schedules: {len(schedules)}
-
-Schedule Details:
-"""
-                for i, schedule in enumerate(schedules, 1):
-                    email_body += f"\n--- Schedule {i} ---\n"
-                    for key, value in schedule.items():
-                        email_body += f"{key}: {value}\n"
-                    email_body += "\n"
-                
-                email_body += f"""
-This email was generated automatically on {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}.
-
-Best regards,
-ShiftWork Schedule System
-"""
-            else:
-                email_body = f"""Subject: Work Schedule for {employee_display_name}
-From: system@shiftwork.com
-To: {recipient_email}
-
-Hello,
-
-No schedules found for employee {employee_display_name} in company {company_id}.
-
-This email was generated automatically on {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}.
-
-Best regards,
-ShiftWork Schedule System
-"""
+            email_body = templates_for(None).render_raw(EmailView(
+                company_id=company_id,
+                person_id=person_id,
+                recipient=recipient_email,
+                employee=employee_display_name,
+                sender="system@shiftwork.com",
+                schedules=schedules,
+            ))
             
             return {
                 "status": "success",
@@ -0,0 +1,104 @@
+#!/usr/bin/env python3
+"""
+Micro-benchmark for schedule email rendering
+
+Renders weekly schedule emails (a handful of ScheduleDto rows each) with the
+compiled templates in email_templates.py and, for comparison, with the
+string-concatenation loop they replaced. Prints emails per second.
+
+Run: python bench_email_templates.py [--emails 10000] [--schedules 7] [--locale en]
+"""
+
+import argparse
+import time
+from datetime import datetime, timedelta
+
+from email_templates import EmailView, templates_for
+
+
+def make_views(emails: int, schedules_each: int):
+    start = datetime(2026, 1, 5, 8, 0, 0)
+    generated_at = datetime(2026, 1, 4, 18, 0, 0)
+    views = []
+    for person in range(emails):
+        schedules = []
+        for day in range(schedules_each):
+            begin = start + timedelta(days=day)
+            schedules.append({
+                "scheduleId": person * schedules_each + day,
+                "name": f"Shift {day}",
+                "companyId": "6513451",
+                "personId": person,
+                "locationId": person % 12,
+                "areaId": person % 40,
+                "startDate": begin.isoformat(),
+                "endDate": (begin + timedelta(hours=8)).isoformat(),
+                "description": "Front of house opening shift",
+                "status": "published",
+                "timeZone": "America/New_York",
+                "type": "shift",
+            })
+        views.append(EmailView(
+            company_id="6513451", person_id=str(person), recipient=f"employee{person}@example.com",
+            employee=f"Employee {person}", sender="schedules@example.com", schedules=schedules,
+            generated_at=generated_at,
+        ))
+    return views
+
+
+def legacy_body(view: EmailView) -> str:
+    """The body += f"..." loop previously used by http_smtp_client"""
+    body = f"""Hello,
+
+Here is the work schedule information for employee {view.employee}:
+
+Company ID: {view.company_id}
+Employee ID: {view.person_id}
+Total Schedules: {len(view.schedules)}
+
+Schedule Details:
+"""
+    for i, schedule in enumerate(view.schedules, 1):
+        body += f"\n--- Schedule {i} ---\n"
+        for key, value in schedule.items():
+            body += f"{key}: {value}\n"
+        body += "\n"
+    body += f"""
+This email was generated automatically on {view.generated_at.strftime('%Y-%m-%d %H:%M:%S')}.
+
+Best regards,
+ShiftWork Schedule System
+"""
+    return body
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Schedule email rendering micro-benchmark")
+    parser.add_argument("--emails", type=int, default=10000)
+    parser.add_argument("--schedules", type=int, default=7, help="schedules per email")
+    parser.add_argument("--locale", default="en")
+    args = parser.parse_args()
+
+    views = make_views(args.emails, args.schedules)
+    templates = templates_for(args.locale)
+    print(f"{args.emails} emails x {args.schedules} schedules, locale {templates.locale}")
+
+    cases = (
+        ("legacy +=", legacy_body),
+        ("text", templates.render_text),
+        ("html", templates.render_html),
+        ("text+html", lambda view: (templates.render_text(view), templates.render_html(view))),
+    )
+    baseline = None
+    for name, render in cases:
+        started = time.perf_counter()
+        for view in views:
+            render(view)
+        elapsed = time.perf_counter() - started
+        rate = args.emails / elapsed
+        baseline = baseline or rate
+        print(f"{name:10s} {elapsed * 1000:8.1f} ms  {rate:10,.0f} emails/s  {rate / baseline:5.2f}x vs legacy")
+
+
+if __name__ == "__main__":
+    main()
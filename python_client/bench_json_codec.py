@@ -0,0 +1,75 @@
+#!/usr/bin/env python3
+"""
+Micro-benchmark for the gateway's JSON backends
+
+Encodes a get_employee_schedules-shaped result holding 10k ScheduleDto rows
+with every available backend and prints throughput.
+
+Run: python bench_json_codec.py [--rows 10000] [--repeat 20]
+"""
+
+import argparse
+import time
+from datetime import datetime, timedelta
+
+import json_codec
+
+
+def make_payload(rows: int) -> dict:
+    start = datetime(2026, 1, 5, 8, 0, 0)
+    schedules = []
+    for i in range(rows):
+        begin = start + timedelta(hours=i)
+        schedules.append({
+            "scheduleId": i,
+            "name": f"Shift {i}",
+            "companyId": "6513451",
+            "personId": i % 250,
+            "crewId": None,
+            "taskShiftId": None,
+            "locationId": i % 12,
+            "areaId": i % 40,
+            "startDate": begin,
+            "endDate": begin + timedelta(hours=8),
+            "description": "Front of house opening shift",
+            "status": "published",
+            "settings": None,
+            "updatedBy": "scheduler@example.com",
+            "createdBy": "scheduler@example.com",
+            "updatedAt": begin - timedelta(days=3),
+            "createdAt": begin - timedelta(days=7),
+            "externalCode": None,
+            "timeZone": "America/New_York",
+            "color": "#3b82f6",
+            "type": "shift",
+            "voidedBy": None,
+            "voidedAt": None,
+        })
+    return {"company_id": "6513451", "total_schedules": rows, "schedules": schedules}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="JSON backend micro-benchmark")
+    parser.add_argument("--rows", type=int, default=10000)
+    parser.add_argument("--repeat", type=int, default=20)
+    args = parser.parse_args()
+
+    payload = make_payload(args.rows)
+    print(f"Payload: {args.rows} schedules")
+    baseline = None
+    for requested in ("json", "msgspec", "orjson"):
+        name, dumps, _ = json_codec.select_backend(requested)
+        if name != requested:
+            print(f"{requested:8s} not installed")
+            continue
+        size = len(dumps(payload))
+        started = time.perf_counter()
+        for _ in range(args.repeat):
+            dumps(payload)
+        per_call = (time.perf_counter() - started) / args.repeat
+        baseline = baseline or per_call
+        print(f"{name:8s} {per_call * 1000:8.2f} ms/encode  {size / per_call / 1e6:8.1f} MB/s  {baseline / per_call:5.1f}x vs json")
+
+
+if __name__ == "__main__":
+    main()
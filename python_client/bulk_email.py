@@ -0,0 +1,193 @@
+#!/usr/bin/env python3
+"""
+Concurrent bulk email pipeline for schedule emails
+
+- run_bulk(): a fixed number of worker tasks take recipients from a queue, so
+  schedule fetches, rendering and SMTP sends for different recipients overlap
+  instead of running one after another
+- TokenBucket: sends are paced to the SMTP provider's rate (messages per
+  second, with a burst allowance), however many workers are ready to send
+- Each recipient is retried with full-jitter backoff when its fetch or send
+  fails transiently (timeouts, 4xx SMTP replies, dropped connections); permanent
+  failures (5xx, a rejected recipient) are reported at once
+- BulkReport: per-recipient outcome and attempt count, totals and throughput;
+  a progress callback sees every completed recipient
+"""
+
+import asyncio
+import logging
+import time
+from dataclasses import dataclass, field
+from typing import Any, Awaitable, Callable, Dict, Iterable, List, Optional
+
+import httpx
+
+from resilience import full_jitter_backoff
+from smtp_pool import SMTPConnectionError, SMTPError
+
+logger = logging.getLogger(__name__)
+
+
+class TokenBucket:
+    """Allows `rate` acquisitions per second on average and up to `burst` at once"""
+
+    def __init__(self, rate: float, burst: int = 1):
+        self.rate = rate
+        self.burst = max(burst, 1)
+        self._tokens = float(self.burst)
+        self._updated = time.monotonic()
+        self._lock = asyncio.Lock()
+        self.waited = 0.0
+
+    async def acquire(self):
+        if self.rate <= 0:
+            return  # unlimited
+        # The lock makes waiters take tokens in arrival order
+        async with self._lock:
+            while True:
+                now = time.monotonic()
+                self._tokens = min(self.burst, self._tokens + (now - self._updated) * self.rate)
+                self._updated = now
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    return
+                delay = (1 - self._tokens) / self.rate
+                self.waited += delay
+                await asyncio.sleep(delay)
+
+
+def is_transient(error: BaseException) -> bool:
+    """Whether a failed fetch or send is worth retrying"""
+    if isinstance(error, SMTPConnectionError):
+        return True
+    if isinstance(error, SMTPError):
+        return getattr(error, "transient", False)
+    if isinstance(error, httpx.HTTPStatusError):
+        return error.response.status_code in (408, 425, 429) or error.response.status_code >= 500
+    return isinstance(error, (httpx.TransportError, asyncio.TimeoutError, OSError))
+
+
+@dataclass
+class RecipientResult:
+    key: str
+    ok: bool
+    attempts: int  # fetch and send calls together; 2 means neither was retried
+    stage: str = "sent"  # where it ended: "sent", or the stage that failed ("fetch"/"send")
+    error: Optional[str] = None
+    seconds: float = 0.0
+
+
+@dataclass
+class BulkReport:
+    total: int
+    results: Dict[str, RecipientResult] = field(default_factory=dict)
+    started: float = field(default_factory=time.monotonic)
+    finished: Optional[float] = None
+
+    @property
+    def done(self) -> int:
+        return len(self.results)
+
+    @property
+    def sent(self) -> int:
+        return sum(1 for r in self.results.values() if r.ok)
+
+    @property
+    def failed(self) -> int:
+        return self.done - self.sent
+
+    @property
+    def elapsed(self) -> float:
+        return (self.finished or time.monotonic()) - self.started
+
+    def as_results(self) -> Dict[str, bool]:
+        return {key: result.ok for key, result in self.results.items()}
+
+    def summary(self) -> dict:
+        elapsed = self.elapsed
+        return {
+            "total": self.total,
+            "sent": self.sent,
+            "failed": self.failed,
+            "retried": sum(1 for r in self.results.values() if r.attempts > 2),
+            "elapsed_seconds": round(elapsed, 3),
+            "per_second": round(self.done / elapsed, 2) if elapsed > 0 else 0.0,
+            "failures": {key: f"{r.stage}: {r.error}" for key, r in self.results.items() if not r.ok},
+        }
+
+
+async def _with_retries(stage: str, call: Callable[[], Awaitable[Any]], max_attempts: int,
+                        backoff_base: float, backoff_cap: float, attempts: List[int]) -> Any:
+    while True:
+        attempts[0] += 1
+        try:
+            return await call()
+        except Exception as e:
+            if attempts[0] >= max_attempts or not is_transient(e):
+                raise
+            delay = full_jitter_backoff(attempts[0], backoff_base, backoff_cap)
+            logger.info(f"Bulk email {stage} failed ({type(e).__name__}: {e}); retrying in {delay:.2f}s")
+            await asyncio.sleep(delay)
+
+
+async def run_bulk(items: Iterable[Any], *, key: Callable[[Any], str],
+                   prepare: Callable[[Any], Awaitable[Any]], send: Callable[[Any, Any], Awaitable[None]],
+                   limiter: Optional[TokenBucket] = None, concurrency: int = 8, max_attempts: int = 4,
+                   backoff_base: float = 1.0, backoff_cap: float = 30.0,
+                   progress: Optional[Callable[[BulkReport, RecipientResult], None]] = None,
+                   prepared: Optional[Callable[[Any], None]] = None,
+                   log_every: float = 5.0) -> BulkReport:
+    """Prepare and send a message for every item, `concurrency` items at a time.
+
+    prepare(item) fetches and renders (the result is reused across send
+    retries); send(item, message) delivers it. Both are retried while they
+    fail transiently, up to max_attempts calls each. prepared(item), if given,
+    is called once per item after its last prepare attempt, whether or not
+    it succeeded.
+    """
+    items = list(items)
+    report = BulkReport(total=len(items))
+    queue: asyncio.Queue = asyncio.Queue()
+    for item in items:
+        queue.put_nowait(item)
+    last_log = [time.monotonic()]
+
+    async def process(item):
+        started = time.monotonic()
+        stage = "fetch"
+        fetch_attempts, send_attempts = [0], [0]
+        try:
+            try:
+                message = await _with_retries(stage, lambda: prepare(item), max_attempts, backoff_base, backoff_cap, fetch_attempts)
+            finally:
+                if prepared is not None:
+                    prepared(item)
+            stage = "send"
+
+            async def paced_send():
+                if limiter is not None:
+                    await limiter.acquire()
+                await send(item, message)
+
+            await _with_retries(stage, paced_send, max_attempts, backoff_base, backoff_cap, send_attempts)
+            result = RecipientResult(key(item), True, fetch_attempts[0] + send_attempts[0])
+        except Exception as e:
+            result = RecipientResult(key(item), False, fetch_attempts[0] + send_attempts[0], stage, f"{type(e).__name__}: {e}")
+            logger.warning(f"Bulk email to {result.key} failed at {stage} after {result.attempts} attempt(s): {e}")
+        result.seconds = time.monotonic() - started
+        report.results[result.key] = result
+        if progress is not None:
+            progress(report, result)
+        if time.monotonic() - last_log[0] >= log_every:
+            last_log[0] = time.monotonic()
+            logger.info(f"Bulk email progress: {report.done}/{report.total} done, {report.failed} failed")
+
+    async def worker():
+        while not queue.empty():
+            await process(queue.get_nowait())
+
+    await asyncio.gather(*(worker() for _ in range(max(1, min(concurrency, len(items))))))
+    report.finished = time.monotonic()
+    logger.info(f"Bulk email finished: {report.sent} sent, {report.failed} failed of {report.total} "
+                f"in {report.elapsed:.1f}s")
+    return report
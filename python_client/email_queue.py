@@ -0,0 +1,303 @@
+#!/usr/bin/env python3
+"""
+Durable outbound queue for schedule emails (SQLite in WAL mode)
+
+- Rendered messages are stored before anything is sent, so a run that dies
+  part-way resumes by draining the queue: nothing is fetched or rendered again
+- Each message has an idempotency key, (company, person, schedule version);
+  enqueueing a key that is already queued or sent is a no-op, so re-running
+  a bulk job only emails people whose schedules changed or who were not
+  reached yet
+- Delivery is at-least-once: a worker leases a message, sends it and only
+  then marks it sent. A worker that dies holding a lease leaves the message
+  to be picked up again once the lease expires
+- Any number of drain() workers, in one process or several, can share the
+  file; claims run in BEGIN IMMEDIATE transactions, so a message is leased to
+  one worker at a time
+- Transient failures are retried with backoff (next_attempt_at); permanent
+  ones, or too many attempts, leave the message as "failed" with its error.
+  Attempts are counted at claim time, so a message whose worker keeps dying
+  before it can report back is given up on too
+
+SQLite calls run on one dedicated thread, so the event loop never waits on disk.
+"""
+
+import asyncio
+import hashlib
+import json
+import logging
+import os
+import socket
+import sqlite3
+import time
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
+from typing import Any, Awaitable, Callable, Dict, List, Optional
+
+from bulk_email import TokenBucket, is_transient
+from resilience import full_jitter_backoff
+
+logger = logging.getLogger(__name__)
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS emails (
+    id INTEGER PRIMARY KEY,
+    idempotency_key TEXT NOT NULL UNIQUE,
+    recipient TEXT NOT NULL,
+    sender TEXT NOT NULL,
+    message BLOB NOT NULL,
+    status TEXT NOT NULL DEFAULT 'pending',
+    attempts INTEGER NOT NULL DEFAULT 0,
+    next_attempt_at REAL NOT NULL,
+    lease_until REAL,
+    worker TEXT,
+    last_error TEXT,
+    created_at REAL NOT NULL,
+    sent_at REAL
+);
+CREATE INDEX IF NOT EXISTS emails_ready ON emails (status, next_attempt_at);
+"""
+
+
+def schedule_version(schedules: Optional[List[Dict[str, Any]]]) -> str:
+    """Stable digest of a person's schedule rows; changes whenever any row does"""
+    canonical = json.dumps(schedules or [], sort_keys=True, separators=(",", ":"), default=str)
+    return hashlib.blake2b(canonical.encode("utf-8"), digest_size=16).hexdigest()
+
+
+def idempotency_key(company_id: str, person_id: str, schedules: Optional[List[Dict[str, Any]]]) -> str:
+    return f"{company_id}:{person_id}:{schedule_version(schedules)}"
+
+
+@dataclass
+class QueuedEmail:
+    id: int
+    idempotency_key: str
+    recipient: str
+    sender: str
+    message: bytes
+    attempts: int
+
+
+class EmailQueue:
+    """SQLite-backed email queue; every method is a coroutine run on the queue's own thread.
+
+    Use as an async context manager (or call close()) so the database and
+    the thread are released.
+    """
+
+    def __init__(self, path: str, lease_seconds: float = 300.0, max_attempts: int = 5):
+        self.path = path
+        self.lease_seconds = lease_seconds
+        self.max_attempts = max(max_attempts, 1)
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="email-queue")
+        self._db: Optional[sqlite3.Connection] = None
+        self._closed = False
+
+    async def __aenter__(self) -> "EmailQueue":
+        return self
+
+    async def __aexit__(self, exc_type, exc_val, exc_tb):
+        await self.close()
+
+    async def _run(self, fn: Callable, *args):
+        return await asyncio.get_running_loop().run_in_executor(self._executor, fn, *args)
+
+    def _connection(self) -> sqlite3.Connection:
+        if self._db is None:
+            directory = os.path.dirname(os.path.abspath(self.path))
+            os.makedirs(directory, exist_ok=True)
+            # Autocommit mode; transactions are opened explicitly where they matter
+            db = sqlite3.connect(self.path, timeout=30.0, isolation_level=None, check_same_thread=False)
+            db.execute("PRAGMA journal_mode=WAL")
+            # A commit survives a process crash at NORMAL in WAL mode (only power loss can roll one back)
+            db.execute("PRAGMA synchronous=NORMAL")
+            db.executescript(_SCHEMA)
+            self._db = db
+        return self._db
+
+    def _enqueue(self, key: str, recipient: str, sender: str, message: bytes) -> bool:
+        now = time.time()
+        cursor = self._connection().execute(
+            "INSERT OR IGNORE INTO emails (idempotency_key, recipient, sender, message, next_attempt_at, created_at) "
+            "VALUES (?, ?, ?, ?, ?, ?)",
+            (key, recipient, sender, message, now, now),
+        )
+        return cursor.rowcount == 1
+
+    async def enqueue(self, key: str, recipient: str, sender: str, message: bytes) -> bool:
+        """Store a rendered message; False if the key was already queued or sent"""
+        return await self._run(self._enqueue, key, recipient, sender, message)
+
+    def _contains(self, key: str) -> bool:
+        row = self._connection().execute("SELECT 1 FROM emails WHERE idempotency_key = ?", (key,)).fetchone()
+        return row is not None
+
+    async def contains(self, key: str) -> bool:
+        return await self._run(self._contains, key)
+
+    def _claim(self, worker: str, limit: int) -> List[QueuedEmail]:
+        db = self._connection()
+        now = time.time()
+        db.execute("BEGIN IMMEDIATE")
+        try:
+            # Leases that expired on their last allowed attempt: the worker died (or hung) every time
+            abandoned = db.execute(
+                "UPDATE emails SET status = 'failed', lease_until = NULL, "
+                "last_error = 'Lease expired on attempt ' || attempts || ' of ' || ? || ' (worker ' || "
+                "COALESCE(worker, '?') || ' stopped while sending)' "
+                "WHERE status = 'sending' AND lease_until < ? AND attempts >= ?",
+                (self.max_attempts, now, self.max_attempts),
+            ).rowcount
+            rows = db.execute(
+                "SELECT id, idempotency_key, recipient, sender, message, attempts FROM emails "
+                "WHERE (status = 'pending' AND next_attempt_at <= ?) OR (status = 'sending' AND lease_until < ?) "
+                "ORDER BY next_attempt_at, id LIMIT ?",
+                (now, now, limit),
+            ).fetchall()
+            db.executemany(
+                "UPDATE emails SET status = 'sending', lease_until = ?, worker = ?, attempts = attempts + 1 WHERE id = ?",
+                [(now + self.lease_seconds, worker, row[0]) for row in rows],
+            )
+            db.execute("COMMIT")
+        except BaseException:
+            db.execute("ROLLBACK")
+            raise
+        if abandoned:
+            logger.warning(f"Gave up on {abandoned} queued email(s) whose lease expired on the last allowed attempt")
+        return [QueuedEmail(row[0], row[1], row[2], row[3], bytes(row[4]), row[5] + 1) for row in rows]
+
+    async def claim(self, worker: str, limit: int = 1) -> List[QueuedEmail]:
+        """Lease up to `limit` messages that are due (or whose lease expired) to worker.
+
+        An expired lease that was already the message's max_attempts-th
+        attempt marks it failed instead of leasing it again.
+        """
+        return await self._run(self._claim, worker, limit)
+
+    def _mark_sent(self, email_id: int):
+        # The message body is no longer needed; the row stays as the idempotency record
+        self._connection().execute(
+            "UPDATE emails SET status = 'sent', sent_at = ?, lease_until = NULL, last_error = NULL, message = x'' "
+            "WHERE id = ?",
+            (time.time(), email_id),
+        )
+
+    async def mark_sent(self, email_id: int):
+        await self._run(self._mark_sent, email_id)
+
+    def _mark_failed(self, email_id: int, error: str, retry_at: Optional[float]):
+        if retry_at is None:
+            self._connection().execute(
+                "UPDATE emails SET status = 'failed', lease_until = NULL, last_error = ? WHERE id = ?",
+                (error, email_id),
+            )
+        else:
+            self._connection().execute(
+                "UPDATE emails SET status = 'pending', lease_until = NULL, last_error = ?, next_attempt_at = ? "
+                "WHERE id = ?",
+                (error, retry_at, email_id),
+            )
+
+    async def mark_failed(self, email_id: int, error: str, retry_at: Optional[float] = None):
+        """Record a failed send: retried from retry_at if given, otherwise given up on"""
+        await self._run(self._mark_failed, email_id, error, retry_at)
+
+    def _next_due(self) -> Optional[float]:
+        """When the next message can be claimed: now, a future time, or None if nothing is left"""
+        row = self._connection().execute(
+            "SELECT MIN(CASE WHEN status = 'pending' THEN next_attempt_at ELSE lease_until END) "
+            "FROM emails WHERE status IN ('pending', 'sending')"
+        ).fetchone()
+        return row[0]
+
+    async def next_due(self) -> Optional[float]:
+        return await self._run(self._next_due)
+
+    def _requeue_failed(self) -> int:
+        cursor = self._connection().execute(
+            "UPDATE emails SET status = 'pending', attempts = 0, next_attempt_at = ? WHERE status = 'failed'",
+            (time.time(),),
+        )
+        return cursor.rowcount
+
+    async def requeue_failed(self) -> int:
+        """Give every failed message a fresh set of attempts (e.g. after fixing SMTP settings)"""
+        return await self._run(self._requeue_failed)
+
+    def _purge(self, older_than: float) -> int:
+        cursor = self._connection().execute(
+            "DELETE FROM emails WHERE status = 'sent' AND sent_at < ?", (time.time() - older_than,)
+        )
+        return cursor.rowcount
+
+    async def purge(self, older_than: float) -> int:
+        """Delete sent records older than `older_than` seconds (their keys can then be sent again)"""
+        return await self._run(self._purge, older_than)
+
+    def _stats(self) -> Dict[str, int]:
+        counts = {"pending": 0, "sending": 0, "sent": 0, "failed": 0}
+        for status, count in self._connection().execute("SELECT status, COUNT(*) FROM emails GROUP BY status"):
+            counts[status] = count
+        return counts
+
+    async def stats(self) -> Dict[str, int]:
+        return await self._run(self._stats)
+
+    def _close(self):
+        if self._db is not None:
+            self._db.close()
+            self._db = None
+
+    async def close(self):
+        if self._closed:
+            return
+        self._closed = True
+        await self._run(self._close)
+        self._executor.shutdown(wait=True)
+
+
+async def drain(queue: EmailQueue, send: Callable[[QueuedEmail], Awaitable[None]], *, workers: int = 4,
+                limiter: Optional[TokenBucket] = None, backoff_base: float = 5.0, backoff_cap: float = 300.0,
+                wait_for_retries: bool = True, poll_interval: float = 1.0) -> Dict[str, int]:
+    """Send queued messages with `workers` concurrent workers until the queue is empty.
+
+    Messages waiting for a retry (or for another worker's lease to expire)
+    are waited for when wait_for_retries is set; otherwise draining stops
+    once nothing is due. Returns counts of what this call did.
+    """
+    counts = {"sent": 0, "retried": 0, "failed": 0}
+    prefix = f"{socket.gethostname()}:{os.getpid()}"
+
+    async def worker(number: int):
+        name = f"{prefix}:{number}"
+        while True:
+            claimed = await queue.claim(name)
+            if not claimed:
+                due = await queue.next_due()
+                if due is None or (not wait_for_retries and due > time.time()):
+                    return
+                await asyncio.sleep(min(max(due - time.time(), 0.05), poll_interval))
+                continue
+            for email in claimed:
+                try:
+                    if limiter is not None:
+                        await limiter.acquire()
+                    await send(email)
+                except Exception as e:
+                    error = f"{type(e).__name__}: {e}"
+                    if is_transient(e) and email.attempts < queue.max_attempts:
+                        delay = full_jitter_backoff(email.attempts, backoff_base, backoff_cap)
+                        await queue.mark_failed(email.id, error, retry_at=time.time() + delay)
+                        counts["retried"] += 1
+                        logger.info(f"Queued email {email.idempotency_key} failed ({error}); retrying in {delay:.1f}s")
+                    else:
+                        await queue.mark_failed(email.id, error)
+                        counts["failed"] += 1
+                        logger.warning(f"Queued email {email.idempotency_key} to {email.recipient} failed: {error}")
+                    continue
+                await queue.mark_sent(email.id)
+                counts["sent"] += 1
+
+    await asyncio.gather(*(worker(n) for n in range(max(workers, 1))))
+    return counts
@@ -0,0 +1,305 @@
+#!/usr/bin/env python3
+"""
+Compiled templates for schedule emails (plain text and HTML)
+
+- Templates are compiled to Python functions returning a single f-string
+  (CompiledTemplate), with the locale's wording inlined, so rendering a
+  section runs no template parsing at all
+- Each schedule block is rendered by a function compiled once per row shape
+  (the tuple of keys): one call per schedule, however many fields it has
+- Sections are collected in a list and joined once, or handed one by one to a
+  writer callback to stream them, instead of growing a string with +=
+- templates_for(locale) caches one ScheduleEmailTemplates per locale; "es-MX"
+  falls back to "es", unknown locales to English
+
+Used by http_smtp_client (MIME and simple-text emails) and by
+ai_agent_test_interface's mock email. bench_email_templates.py measures
+render throughput.
+"""
+
+import html
+import re
+import time
+from dataclasses import dataclass
+from datetime import datetime
+from functools import lru_cache
+from string import Formatter
+from typing import Any, Callable, Dict, List, Mapping, Optional, Sequence
+
+Writer = Callable[[str], Any]
+
+# Wording and timestamp format per language; templates below pick fields by name
+LOCALES: Dict[str, Dict[str, str]] = {
+    "en": {
+        "subject": "Work Schedule for {employee}",
+        "greeting": "Hello,",
+        "intro": "Here is the work schedule information for employee {employee}:",
+        "company": "Company ID",
+        "employee_id": "Employee ID",
+        "total": "Total Schedules",
+        "details": "Schedule Details:",
+        "schedule": "Schedule",
+        "empty": "No schedules found for employee {employee} in company {company_id}.",
+        "error": "Error",
+        "generated": "This email was generated automatically on {generated_at}.",
+        "closing": "Best regards,",
+        "signature": "ShiftWork Schedule System",
+        "timestamp_format": "%Y-%m-%d %H:%M:%S",
+    },
+    "es": {
+        "subject": "Horario de trabajo de {employee}",
+        "greeting": "Hola,",
+        "intro": "Esta es la información del horario de trabajo del empleado {employee}:",
+        "company": "ID de empresa",
+        "employee_id": "ID de empleado",
+        "total": "Total de turnos",
+        "details": "Detalle de turnos:",
+        "schedule": "Turno",
+        "empty": "No se encontraron turnos para el empleado {employee} en la empresa {company_id}.",
+        "error": "Error",
+        "generated": "Este correo se generó automáticamente el {generated_at}.",
+        "closing": "Saludos cordiales,",
+        "signature": "Sistema de Horarios ShiftWork",
+        "timestamp_format": "%d/%m/%Y %H:%M:%S",
+    },
+}
+DEFAULT_LOCALE = "en"
+
+_HEADERS = "Subject: {subject}\nFrom: {sender}\nTo: {recipient}\n\n"
+
+_TEXT_HEAD = """{greeting}
+
+{intro}
+
+{company}: {company_id}
+{employee_id}: {person_id}
+{total}: {count}
+
+{details}
+"""
+_TEXT_ROW_HEAD = "\n--- {schedule} {index} ---\n"
+_TEXT_EMPTY = """{greeting}
+
+{empty}{error_note}
+"""
+_TEXT_FOOTER = """
+{generated}
+
+{closing}
+{signature}
+"""
+
+_HTML_HEAD = """<!DOCTYPE html>
+<html><body style="font-family:Arial,sans-serif;font-size:14px">
+<p>{greeting}</p>
+<p>{intro}</p>
+<table cellpadding="4" style="border-collapse:collapse">
+<tr><th align="left">{company}</th><td>{company_id}</td></tr>
+<tr><th align="left">{employee_id}</th><td>{person_id}</td></tr>
+<tr><th align="left">{total}</th><td>{count}</td></tr>
+</table>
+<h3>{details}</h3>
+"""
+_HTML_ROW_HEAD = '<h4>{schedule} {index}</h4>\n<table cellpadding="4" border="1" style="border-collapse:collapse">\n'
+_HTML_ROW_TAIL = "</table>\n"
+_HTML_EMPTY = """<!DOCTYPE html>
+<html><body style="font-family:Arial,sans-serif;font-size:14px">
+<p>{greeting}</p>
+<p>{empty}</p>{error_note}
+"""
+_HTML_FOOTER = """<p>{generated}</p>
+<p>{closing}<br>{signature}</p>
+</body></html>
+"""
+
+
+_HTML_SPECIAL = re.compile("[&<>\"']")
+_SEPARATOR = "\x1f"
+
+
+@dataclass
+class EmailView:
+    """Everything a schedule email shows, independent of how it is sent"""
+
+    company_id: str
+    person_id: str
+    recipient: str
+    employee: str
+    sender: str = ""
+    schedules: Optional[Sequence[Mapping[str, Any]]] = None
+    error: Optional[str] = None
+    # Formatted with the locale's timestamp format when left unset
+    generated_at: Optional[datetime] = None
+
+
+def _compile_function(params: str, pieces: Sequence[tuple], prologue: str = "", namespace: Optional[dict] = None):
+    """Compile pieces into a function that returns them as one f-string.
+
+    pieces are (is_literal, text). Literal text is bound as a constant and
+    never placed in the generated source, so it may come from anywhere
+    (e.g. schedule keys); non-literal text is a Python expression and must
+    only ever be built from this module's own identifiers.
+    """
+    scope = dict(namespace or {})
+    body = []
+    for is_literal, text in pieces:
+        if is_literal:
+            if text:
+                name = f"_L{len(scope)}"
+                scope[name] = text
+                body.append("{" + name + "}")
+        else:
+            body.append("{" + text + "}")
+    source = f"def _render({params}):\n{prologue}    return f\"{''.join(body)}\"\n"
+    exec(compile(source, "<email template>", "exec"), scope)
+    return scope["_render"]
+
+
+class CompiledTemplate:
+    """A str.format-style template with named fields, compiled once to a Python f-string function"""
+
+    def __init__(self, source: str):
+        self.source = source
+        pieces = []
+        for literal, field, spec, conversion in Formatter().parse(source):
+            pieces.append((True, literal))
+            if field is not None:
+                if not field.isidentifier() or spec or conversion:
+                    raise ValueError(f"Unsupported template field: {field!r}")
+                pieces.append((False, f"_v[{field!r}]"))
+        self._render = _compile_function("_v", pieces)
+
+    def render(self, values: Mapping[str, Any]) -> str:
+        return self._render(values)
+
+
+def _escape_row(values) -> List[str]:
+    """HTML-escaped strings for a row's values; one scan over the row when nothing needs escaping"""
+    values = [str(value) for value in values]
+    if _HTML_SPECIAL.search(_SEPARATOR.join(values)) is None:
+        return values
+    return [html.escape(value) for value in values]
+
+
+class ScheduleEmailTemplates:
+    """Compiled text and HTML templates for one locale"""
+
+    def __init__(self, locale: str):
+        self.locale = locale
+        self.strings = strings = LOCALES[locale]
+        self.timestamp_format = strings["timestamp_format"]
+        self._text = {name: self._compile(source, escape=False) for name, source in (
+            ("head", _TEXT_HEAD), ("empty", _TEXT_EMPTY), ("footer", _TEXT_FOOTER),
+        )}
+        self._html = {name: self._compile(source, escape=True) for name, source in (
+            ("head", _HTML_HEAD), ("empty", _HTML_EMPTY), ("footer", _HTML_FOOTER),
+        )}
+        self._subject = CompiledTemplate(strings["subject"])
+        self._headers = CompiledTemplate(_HEADERS)
+        # Row shape (tuple of keys) -> compiled function rendering a whole schedule block
+        self._text_rows: Dict[tuple, str] = {}
+        self._html_rows: Dict[tuple, str] = {}
+        self._clock = (None, "")
+
+    def _compile(self, source: str, escape: bool) -> CompiledTemplate:
+        # Inline the locale's wording (whose own {employee}-style fields survive), then parse the result once
+        fields = {field: "{" + field + "}" for _, field, _, _ in Formatter().parse(source) if field}
+        for key in fields.keys() & self.strings.keys():
+            fields[key] = html.escape(self.strings[key], quote=False) if escape else self.strings[key]
+        return CompiledTemplate(source.format_map(fields))
+
+    def _row_renderer(self, keys: tuple, as_html: bool) -> Callable[[int, Any], str]:
+        """Compiled function rendering one schedule block with these keys, built on first use"""
+        cache = self._html_rows if as_html else self._text_rows
+        render = cache.get(keys)
+        if render is None:
+            label = self.strings["schedule"]
+            names = [f"v{i}" for i in range(len(keys))]
+            if as_html:
+                head_before, head_after = _HTML_ROW_HEAD.format(
+                    schedule=html.escape(label, quote=False), index="\0").split("\0")
+                pieces = [(True, head_before), (False, "index"), (True, head_after)]
+                for key, name in zip(keys, names):
+                    pieces += [(True, f'<tr><th align="left">{html.escape(str(key))}</th><td>'), (False, name),
+                               (True, "</td></tr>\n")]
+                pieces.append((True, _HTML_ROW_TAIL))
+                prologue = f"    {', '.join(names)}, = _escape_row(values)\n" if names else ""
+            else:
+                pieces = [(True, f"\n--- {label} "), (False, "index"), (True, " ---\n")]
+                for key, name in zip(keys, names):
+                    pieces += [(True, f"{key}: "), (False, name), (True, "\n")]
+                pieces.append((True, "\n"))
+                prologue = f"    {', '.join(names)}, = values\n" if names else ""
+            render = _compile_function("index, values", pieces, prologue, {"_escape_row": _escape_row})
+            if len(cache) < 256:
+                cache[keys] = render
+        return render
+
+    def _timestamp(self, view: EmailView) -> str:
+        if view.generated_at is not None:
+            return view.generated_at.strftime(self.timestamp_format)
+        # Emails rendered within the same second share one strftime
+        now = int(time.time())
+        if self._clock[0] != now:
+            self._clock = (now, datetime.fromtimestamp(now).strftime(self.timestamp_format))
+        return self._clock[1]
+
+    def _values(self, view: EmailView, as_html: bool) -> Dict[str, Any]:
+        values = {
+            "employee": view.employee,
+            "company_id": view.company_id,
+            "person_id": view.person_id,
+            "count": len(view.schedules or ()),
+            "generated_at": self._timestamp(view),
+        }
+        if as_html:
+            values = {key: html.escape(str(value)) for key, value in values.items()}
+            values["error_note"] = (f"\n<p>{html.escape(self.strings['error'])}: {html.escape(view.error)}</p>"
+                                    if view.error else "")
+        else:
+            values["error_note"] = f"\n\n{self.strings['error']}: {view.error}" if view.error else ""
+        return values
+
+    def _render(self, view: EmailView, as_html: bool, write: Optional[Writer]) -> Optional[str]:
+        out: List[str] = []
+        emit = write or out.append
+        templates = self._html if as_html else self._text
+        values = self._values(view, as_html)
+        schedules = view.schedules or ()
+        if schedules:
+            emit(templates["head"].render(values))
+            row_renderer = self._row_renderer
+            for index, schedule in enumerate(schedules, 1):
+                emit(row_renderer(tuple(schedule), as_html)(index, schedule.values()))
+        else:
+            emit(templates["empty"].render(values))
+        emit(templates["footer"].render(values))
+        return None if write else "".join(out)
+
+    def subject(self, view: EmailView) -> str:
+        return self._subject.render({"employee": view.employee})
+
+    def render_text(self, view: EmailView, write: Optional[Writer] = None) -> Optional[str]:
+        """Plain-text body; returned as one string, or streamed to write() if given"""
+        return self._render(view, False, write)
+
+    def render_html(self, view: EmailView, write: Optional[Writer] = None) -> Optional[str]:
+        """HTML body; returned as one string, or streamed to write() if given"""
+        return self._render(view, True, write)
+
+    def render_raw(self, view: EmailView, write: Optional[Writer] = None) -> Optional[str]:
+        """Subject/From/To header lines followed by the plain-text body (simple-text emails)"""
+        out: List[str] = []
+        emit = write or out.append
+        emit(self._headers.render({"subject": self.subject(view), "sender": view.sender, "recipient": view.recipient}))
+        self._render(view, False, emit)
+        return None if write else "".join(out)
+
+
+@lru_cache(maxsize=64)
+def templates_for(locale: Optional[str] = None) -> ScheduleEmailTemplates:
+    """Compiled templates for a locale such as "es" or "es-MX" (cached; English if unknown)"""
+    name = (locale or DEFAULT_LOCALE).replace("_", "-").lower()
+    if name not in LOCALES:
+        name = name.split("-", 1)[0]
+    return ScheduleEmailTemplates(name if name in LOCALES else DEFAULT_LOCALE)
@@ -9,11 +9,32 @@ Security / robustness improvements:
 - Add optional bearer token authentication via MCP_AUTH_TOKEN
 - Restrict CORS to configured ALLOWED_ORIGINS (comma-separated) with safe default
 - CORS credentials only enabled when authentication is active
-- Use a small retry/backoff wrapper for HTTP calls to the .NET API
+- Retries to the .NET API use full-jitter backoff under a shared retry budget
+- Per-route circuit breakers fail fast while the API is down, serving stale cached data where available
+- Optional hedged GETs: a second request is sent when the first is slower than the route's recent p95, within a hedge budget
+- Tool calls run under a deadline (X-Request-Timeout header, timeout_seconds argument or per-tool default) that bounds upstream work
+- Admission control: per-route concurrency limits with a bounded, per-token fair queue; excess load gets 503 + Retry-After
+- Prometheus-format /metrics: request/tool/upstream latency histograms, payload sizes, cache, pool, admission and event-loop lag
+- Event-loop monitor: lag percentiles on /health and /metrics, and the loop thread's stack is logged when a callback blocks
+- Parsing large upstream bodies, building snapshot indexes and encoding large results run on a worker thread pool,
+  which keeps the loop responsive (it adds no CPU; --workers does)
+- --workers N runs N gateway processes on one port (SO_REUSEPORT) with rolling restarts on SIGHUP and a merged /metrics
 - Avoid leaking internal exception details to clients
 - Normalize types when filtering schedules (compare strings)
 - Audit logging for authentication attempts and tool executions
-- Connection limits for httpx client (max 100 connections)
+- Upstream connection pool limits, keepalive expiry and optional HTTP/2 configurable from env, with pool-wait/reuse metrics
+- Per-company schedule snapshot cache (TTL, LRU, single-flight) with stats on /health
+- Optional shared cache tier (CACHE_BACKEND=mmap|redis) so worker processes and replicas fetch each company once
+- Snapshots are indexed by personId/locationId/areaId/status for O(result) lookups
+- get_schedules_paged tool backed by /schedules/paged, with an optional paged mode for get_employee_schedules
+- get_company_regional_settings tool (language, time zone, date/time formats) from /companies/{id}/settings
+- Company schedule lists are decoded incrementally from the response stream, straight into typed records
+- Large schedule/people results are sent as chunked JSON, or NDJSON with ?format=ndjson
+- /api/tools/execute_batch runs many tool calls concurrently with deduplication
+- Responses are encoded with orjson/msgspec when installed (json_codec), falling back to stdlib json
+- Cached schedules are compact typed Schedule records rather than dicts
+- Conditional GETs (ETag/Last-Modified, content-hash fallback) reuse parsed upstream bodies
+- HMAC-authenticated /webhooks/shiftwork receiver invalidates affected cache entries
 """
 
 import asyncio
@@ -25,6 +46,14 @@ import inspect
 from datetime import datetime
 import time
 import re
+import hashlib
+import hmac
+import base64
+import math
+import tempfile
+import signal
+from collections import OrderedDict
+from contextlib import asynccontextmanager
 
 import os
 
@@ -39,6 +68,21 @@ from aiohttp import web
 from aiohttp.web import Application, RouteTableDef
 import aiohttp_cors
 
+from admission import AdmissionController, Overloaded
+import metrics
+from loop_monitor import LoopMonitor
+from offload import Offloader
+from resilience import (
+    CircuitBreaker, CircuitOpenError, LatencyTracker, RetryBudget, deadline_remaining, deadline_scope, full_jitter_backoff,
+)
+from upstream_pool import HTTP2_AVAILABLE, PoolStats, build_transport
+from workers import Supervisor, WorkerContext
+from schedule_cache import CompanySnapshot, ConditionalStore, SnapshotCache
+from json_stream import iter_json_array_batches
+import json_codec
+from schedule_record import decode_schedules, pack_schedules, unpack_schedules
+from shared_cache import build_shared_cache, pack_value, unpack_value
+
 # Basic logging configuration with level controlled by env var
 LOG_LEVEL = os.environ.get("LOG_LEVEL", "INFO").upper()
 logging.basicConfig(level=LOG_LEVEL)
@@ -71,6 +115,127 @@ logger.info(f"CORS Allowed Origins: {ALLOWED_ORIGINS}")
 HTTPX_TIMEOUT = float(os.environ.get("HTTPX_TIMEOUT", "30.0"))
 HTTPX_RETRIES = int(os.environ.get("HTTPX_RETRIES", "3"))
 HTTPX_BACKOFF_FACTOR = float(os.environ.get("HTTPX_BACKOFF_FACTOR", "0.5"))
+HTTPX_BACKOFF_MAX = float(os.environ.get("HTTPX_BACKOFF_MAX", "10.0"))
+
+# Retries (all routes together) may add at most this percent of recent upstream traffic
+RETRY_BUDGET_PERCENT = float(os.environ.get("RETRY_BUDGET_PERCENT", "20"))
+RETRY_BUDGET_MIN_PER_SECOND = float(os.environ.get("RETRY_BUDGET_MIN_PER_SECOND", "1"))
+RETRY_BUDGET_WINDOW = float(os.environ.get("RETRY_BUDGET_WINDOW", "10"))
+
+# Per-route circuit breaker: open after N consecutive failures, probe again after the reset timeout
+BREAKER_FAILURE_THRESHOLD = int(os.environ.get("BREAKER_FAILURE_THRESHOLD", "5"))
+BREAKER_RESET_SECONDS = float(os.environ.get("BREAKER_RESET_SECONDS", "30"))
+
+# Hedged GETs (opt-in): duplicate a request still pending after the route's HEDGE_PERCENTILE latency
+HEDGE_REQUESTS = os.environ.get("HEDGE_REQUESTS", "false").lower() in ("1", "true", "yes")
+HEDGE_PERCENTILE = min(max(float(os.environ.get("HEDGE_PERCENTILE", "95")), 50.0), 99.9)
+HEDGE_MIN_DELAY = float(os.environ.get("HEDGE_MIN_DELAY_MS", "20")) / 1000.0
+HEDGE_BUDGET_PERCENT = float(os.environ.get("HEDGE_BUDGET_PERCENT", "5"))
+
+# Tool call deadlines: a default, per-tool overrides ("name=seconds,..."), and a cap on what callers may request
+TOOL_TIMEOUT_SECONDS = float(os.environ.get("TOOL_TIMEOUT_SECONDS", str(HTTPX_TIMEOUT)))
+TOOL_TIMEOUT_MAX_SECONDS = float(os.environ.get("TOOL_TIMEOUT_MAX_SECONDS", "120"))
+TOOL_TIMEOUTS: Dict[str, float] = {}
+for _item in os.environ.get("TOOL_TIMEOUTS", "").split(","):
+    _name, _, _seconds = _item.partition("=")
+    if _name.strip():
+        try:
+            TOOL_TIMEOUTS[_name.strip()] = float(_seconds)
+        except ValueError:
+            logger.warning(f"Ignoring invalid TOOL_TIMEOUTS entry: {_item!r}")
+
+# Upstream connection pool. The client only talks to API_BASE_URL, so these are per-host limits.
+HTTPX_HTTP2 = os.environ.get("HTTPX_HTTP2", "false").lower() in ("1", "true", "yes")
+HTTPX_MAX_CONNECTIONS = max(int(os.environ.get("HTTPX_MAX_CONNECTIONS", "100")), 1)
+HTTPX_MAX_KEEPALIVE_CONNECTIONS = max(int(os.environ.get("HTTPX_MAX_KEEPALIVE_CONNECTIONS", "20")), 0)
+HTTPX_KEEPALIVE_EXPIRY = float(os.environ.get("HTTPX_KEEPALIVE_EXPIRY", "30.0"))
+HTTPX_POOL_TIMEOUT = float(os.environ.get("HTTPX_POOL_TIMEOUT", str(HTTPX_TIMEOUT)))
+
+# Company schedule snapshot cache (TTL of 0 keeps no snapshots; concurrent loads of a company still share one fetch)
+SCHEDULE_CACHE_TTL = float(os.environ.get("SCHEDULE_CACHE_TTL", "60"))
+SCHEDULE_CACHE_MAX_ENTRIES = int(os.environ.get("SCHEDULE_CACHE_MAX_ENTRIES", "256"))
+SCHEDULE_CACHE_MAX_BYTES = int(os.environ.get("SCHEDULE_CACHE_MAX_BYTES", str(256 * 1024 * 1024)))
+
+# Cache tier shared between processes: memory (in-process only), mmap (same host) or redis (any Redis-compatible server)
+CACHE_BACKEND = os.environ.get("CACHE_BACKEND", "memory").strip().lower()
+CACHE_MMAP_DIR = os.environ.get(
+    "CACHE_MMAP_DIR", os.path.join("/dev/shm" if os.path.isdir("/dev/shm") else tempfile.gettempdir(), "shiftwork-cache")
+)
+CACHE_MMAP_MAX_BYTES = int(os.environ.get("CACHE_MMAP_MAX_BYTES", str(512 * 1024 * 1024)))
+CACHE_REDIS_URL = os.environ.get("CACHE_REDIS_URL", "redis://localhost:6379/0")
+CACHE_REDIS_POOL_SIZE = int(os.environ.get("CACHE_REDIS_POOL_SIZE", "8"))
+CACHE_TIMEOUT_MS = float(os.environ.get("CACHE_TIMEOUT_MS", "250"))
+# How long a process trusts its last read of a company's shared generation before checking again
+CACHE_SYNC_MS = float(os.environ.get("CACHE_SYNC_MS", "500"))
+# Shared validators + parsed bodies (people, paged schedules) are always revalidated, so they may live long
+CACHE_SHARED_CONDITIONAL_TTL = float(os.environ.get("CACHE_SHARED_CONDITIONAL_TTL", "3600"))
+
+# Webhook receiver: same secret the .NET WebhookService signs X-ShiftWork-Signature with
+WEBHOOK_SECRET_KEY = os.environ.get("WEBHOOK_SECRET_KEY")
+WEBHOOK_DEDUPE_SECONDS = float(os.environ.get("WEBHOOK_DEDUPE_SECONDS", "600"))
+WEBHOOK_COALESCE_SECONDS = float(os.environ.get("WEBHOOK_COALESCE_SECONDS", "0.25"))
+
+# Conditional upstream requests: validators + parsed bodies kept per URL
+CONDITIONAL_REQUESTS = os.environ.get("CONDITIONAL_REQUESTS", "true").lower() in ("1", "true", "yes")
+CONDITIONAL_CACHE_MAX_ENTRIES = int(os.environ.get("CONDITIONAL_CACHE_MAX_ENTRIES", "1024"))
+CONDITIONAL_CACHE_MAX_BYTES = int(os.environ.get("CONDITIONAL_CACHE_MAX_BYTES", str(256 * 1024 * 1024)))
+
+# Route get_employee_schedules through the filtered /schedules/paged endpoint instead of the company snapshot
+EMPLOYEE_SCHEDULES_PAGED = os.environ.get("EMPLOYEE_SCHEDULES_PAGED", "false").lower() in ("1", "true", "yes")
+PAGED_PAGE_SIZE = min(max(int(os.environ.get("PAGED_PAGE_SIZE", "200")), 1), 1000)
+
+# Results with at least this many rows are written as a chunked stream instead of one JSON body
+STREAM_MIN_ROWS = int(os.environ.get("STREAM_MIN_ROWS", "500"))
+STREAM_BATCH_ROWS = max(int(os.environ.get("STREAM_BATCH_ROWS", "256")), 1)
+
+# Request header carrying the caller's deadline, in seconds from now
+DEADLINE_HEADER = "X-Request-Timeout"
+
+# Admission control: concurrent requests per route, then a bounded queue with a wait cap; the rest get 503
+ADMISSION_CONTROL = os.environ.get("ADMISSION_CONTROL", "true").lower() in ("1", "true", "yes")
+ADMISSION_MAX_CONCURRENCY = max(int(os.environ.get("ADMISSION_MAX_CONCURRENCY", "64")), 1)
+ADMISSION_MAX_QUEUE = max(int(os.environ.get("ADMISSION_MAX_QUEUE", "128")), 0)
+ADMISSION_MAX_QUEUE_MS = float(os.environ.get("ADMISSION_MAX_QUEUE_MS", "2000"))
+# Per-route concurrency overrides, e.g. "/api/tools/execute_batch=8,/api/tools/execute=32"
+ADMISSION_ROUTE_LIMITS: Dict[str, int] = {}
+for _item in os.environ.get("ADMISSION_ROUTE_LIMITS", "").split(","):
+    _route, _, _limit = _item.rpartition("=")
+    if _route.strip():
+        try:
+            ADMISSION_ROUTE_LIMITS[_route.strip()] = int(_limit)
+        except ValueError:
+            logger.warning(f"Ignoring invalid ADMISSION_ROUTE_LIMITS entry: {_item!r}")
+# Cheap probes, metrics scrapes and webhook deliveries bypass admission control
+ADMISSION_EXEMPT_PATHS = {"/health", "/ping", "/metrics", "/webhooks/shiftwork"}
+
+# Event-loop monitor: heartbeat interval, and how long the loop may be blocked before its stack is logged
+LOOP_MONITOR = os.environ.get("LOOP_MONITOR", "true").lower() in ("1", "true", "yes")
+LOOP_LAG_INTERVAL_MS = max(float(os.environ.get("LOOP_LAG_INTERVAL_MS", "100")), 1.0)
+LOOP_BLOCK_THRESHOLD_MS = float(os.environ.get("LOOP_BLOCK_THRESHOLD_MS", "250"))
+
+# Worker threads for CPU-heavy steps (0 runs them on the event loop), and the sizes above which they are offloaded
+OFFLOAD_WORKERS = max(int(os.environ.get("OFFLOAD_WORKERS", str(min(4, os.cpu_count() or 1)))), 0)
+OFFLOAD_MIN_BYTES = int(os.environ.get("OFFLOAD_MIN_BYTES", str(256 * 1024)))
+OFFLOAD_MIN_ROWS = int(os.environ.get("OFFLOAD_MIN_ROWS", "2000"))
+
+# Gateway processes (--workers); caches, pools and admission limits are per process
+WORKERS = max(int(os.environ.get("WORKERS", "1")), 1)
+# How long a stopping server (or retiring worker) may take to finish in-flight requests
+GRACEFUL_SHUTDOWN_SECONDS = float(os.environ.get("GRACEFUL_SHUTDOWN_SECONDS", "30"))
+# Per-peer timeout when a worker collects the other workers' metrics for /metrics
+WORKER_METRICS_TIMEOUT = float(os.environ.get("WORKER_METRICS_TIMEOUT", "2"))
+
+# Tool names used as metric labels; anything else is reported as "<unknown>" to bound cardinality
+TOOL_NAMES = ("ping", "get_employee_schedules", "get_people_with_unpublished_schedules", "get_schedules_paged",
+              "get_company_regional_settings")
+
+# CompanySettingsDto fields returned by get_company_regional_settings; pay, PTO and security settings stay behind the API
+REGIONAL_SETTINGS_FIELDS = ("defaultTimeZone", "defaultLanguage", "firstDayOfWeek", "dateFormat", "timeFormat",
+                            "currencySymbol")
+
+# Batch tool execution limits
+BATCH_MAX_ITEMS = int(os.environ.get("BATCH_MAX_ITEMS", "200"))
+BATCH_MAX_CONCURRENCY = max(int(os.environ.get("BATCH_MAX_CONCURRENCY", "10")), 1)
 
 # Audit logger for security events
 audit_logger = logging.getLogger("audit")
@@ -83,59 +248,814 @@ def _log_audit_event(event_type: str, details: dict):
     """Log security-relevant events for audit trail"""
     audit_logger.info(f"{event_type}: {json.dumps(details)}")
 
+def _json_response(data, status: int = 200, headers: dict | None = None) -> web.Response:
+    """JSON response whose body is encoded straight to bytes by the configured backend (or already encoded)"""
+    body = data if isinstance(data, bytes) else json_codec.dumps(data)
+    return web.Response(body=body, status=status, headers=headers, content_type="application/json")
+
 # Small helper for safe error responses
 def _http_error_response(message: str, status: int = 500):
     # Do not include stack traces or raw exception text in production responses
-    return web.json_response({"error": message, "timestamp": datetime.now().isoformat()}, status=status)
+    return _json_response({"error": message, "timestamp": datetime.now().isoformat()}, status=status)
+
+async def _stream_json_response(request, result: dict, rows_key: str):
+    """Send a tool result whose rows_key holds a list, streaming the rows in batches.
+
+    ?format=ndjson writes one row per line (total in X-Total-Count). Otherwise
+    results below STREAM_MIN_ROWS, and error results, use a plain JSON response;
+    larger ones are written as chunked JSON with the row list last. Once the
+    headers are out, a client disconnect or write error ends the stream here
+    (the response is truncated) rather than reaching the caller, which could
+    only try to send a second response.
+    """
+    rows = result.get(rows_key) or []
+    ndjson = request.query.get("format") == "ndjson"
+    if "error" in result or (not ndjson and len(rows) < STREAM_MIN_ROWS):
+        return _json_response(result)
+
+    resp = web.StreamResponse(headers={"X-Total-Count": str(len(rows))})
+    resp.content_type = "application/x-ndjson" if ndjson else "application/json"
+    resp.charset = "utf-8"
+    resp.enable_chunked_encoding()
+    await resp.prepare(request)
+
+    batches = (rows[i:i + STREAM_BATCH_ROWS] for i in range(0, len(rows), STREAM_BATCH_ROWS))
+    dumps = json_codec.dumps
+    try:
+        if ndjson:
+            for batch in batches:
+                await resp.write(b"".join(dumps(row) + b"\n" for row in batch))
+        else:
+            meta = dumps({k: v for k, v in result.items() if k != rows_key})
+            await resp.write(meta[:-1] + (b"," if meta != b"{}" else b"") + dumps(rows_key) + b":[")
+            for i, batch in enumerate(batches):
+                await resp.write((b"," if i else b"") + b",".join(dumps(row) for row in batch))
+            await resp.write(b"]}")
+        await resp.write_eof()
+    except ConnectionResetError:
+        # Also aiohttp's ClientConnectionResetError; the client went away mid-stream
+        logger.info(f"Client disconnected while streaming {request.path} ({resp.body_length} bytes sent)")
+    except Exception as e:
+        logger.error(f"Error while streaming {request.path} after headers were sent: {e}", exc_info=True)
+        # Drop the connection so the client sees an incomplete body rather than a cleanly ended one
+        if request.transport is not None:
+            request.transport.close()
+    return resp
+
+def _result_rows(result) -> int:
+    """Number of rows in a tool result's row list, used to decide whether encoding it is worth offloading"""
+    if not isinstance(result, dict):
+        return 0
+    return sum(len(result.get(key) or ()) for key in ("schedules", "items", "people"))
+
+def _verify_webhook_signature(body: bytes, signature: str | None) -> bool:
+    """Check the base64 HMAC-SHA256 signature the .NET WebhookService puts in X-ShiftWork-Signature"""
+    if not WEBHOOK_SECRET_KEY or not signature:
+        return False
+    expected = base64.b64encode(hmac.new(WEBHOOK_SECRET_KEY.encode("utf-8"), body, hashlib.sha256).digest()).decode()
+    return hmac.compare_digest(expected, signature.strip())
+
+def _endpoint_label(path: str) -> str:
+    """Collapse ids in an upstream path so stats group by route, e.g. /api/companies/{id}/schedules"""
+    path = re.sub(r"/companies/[^/]+", "/companies/{id}", path)
+    return re.sub(r"/\d+(?=/|$)", "/{id}", path)
+
+def _tool_timeout(tool_name: str | None, *requested) -> float:
+    """Deadline in seconds for a tool call: the shortest caller-requested value (capped), else the tool's default"""
+    values = []
+    for value in requested:
+        if value is None or value == "":
+            continue
+        try:
+            seconds = float(value)
+        except (TypeError, ValueError):
+            raise ValueError("timeout must be a number of seconds")
+        if not seconds > 0:
+            raise ValueError("timeout must be positive")
+        values.append(seconds)
+    if values:
+        return min(min(values), TOOL_TIMEOUT_MAX_SECONDS)
+    return TOOL_TIMEOUTS.get(tool_name, TOOL_TIMEOUT_SECONDS)
+
+_COMPANY_PATH = re.compile(r"^/api/companies/([^/]+)/")
+
+def _shared_snapshot_key(key: tuple) -> str:
+    company_id, scope, generation = key
+    return f"schedules:{company_id}:{generation}:{scope}"
+
+def _unpack_snapshot(data) -> CompanySnapshot:
+    return CompanySnapshot(unpack_schedules(data))
+
+def _token_scope(token: str | None) -> str:
+    """Short fingerprint of the upstream token so cached data is never shared across credentials"""
+    if not token:
+        return ""
+    return hashlib.sha256(token.encode()).hexdigest()[:16]
 
 class ShiftWorkServer:
-    def __init__(self, http_port: int = LISTEN_PORT):
+    def __init__(self, http_port: int = LISTEN_PORT, worker: WorkerContext | None = None):
         self.server = Server("shiftwork-server")
+        # Set when running as one of several --workers processes
+        self.worker = worker
+        self._metrics_runner: Optional[web.AppRunner] = None
         self.http_client: Optional[httpx.AsyncClient] = None
+        self._setup_metrics()
+        self.pool_stats = PoolStats(observe_wait=self.m_pool_wait.observe)
+        self._upstream_in_flight = 0
+        self.loop_monitor = LoopMonitor(
+            interval=LOOP_LAG_INTERVAL_MS / 1000.0,
+            block_threshold=LOOP_BLOCK_THRESHOLD_MS / 1000.0,
+            observe=self.m_loop_lag.observe,
+        )
+        self.offloader = Offloader(OFFLOAD_WORKERS, observe=self.m_offload_duration.observe)
+        self.retry_budget = RetryBudget(RETRY_BUDGET_PERCENT, RETRY_BUDGET_MIN_PER_SECOND, RETRY_BUDGET_WINDOW)
+        # Keyed by upstream route label (see _endpoint_label)
+        self.breakers: Dict[str, CircuitBreaker] = {}
+        self.hedge_budget = RetryBudget(HEDGE_BUDGET_PERCENT, 0, RETRY_BUDGET_WINDOW)
+        self.latencies: Dict[str, LatencyTracker] = {}
+        self.hedge_stats = {"sent": 0, "won": 0}
+        self.admission = AdmissionController(
+            ADMISSION_MAX_CONCURRENCY, ADMISSION_MAX_QUEUE, ADMISSION_MAX_QUEUE_MS / 1000.0, ADMISSION_ROUTE_LIMITS
+        )
         self.http_port = http_port
         self.http_app: Optional[Application] = None
         # Use validated module-level API_BASE_URL
         self.api_base_url = API_BASE_URL
         logger.info(f"API base URL: {self.api_base_url}")
+        # Keyed by (company_id, token scope)
+        self.schedule_cache = SnapshotCache(
+            ttl=SCHEDULE_CACHE_TTL,
+            max_entries=SCHEDULE_CACHE_MAX_ENTRIES,
+            max_bytes=SCHEDULE_CACHE_MAX_BYTES,
+            name="schedule_cache",
+        )
+        self.conditional_store = ConditionalStore(
+            max_entries=CONDITIONAL_CACHE_MAX_ENTRIES,
+            max_bytes=CONDITIONAL_CACHE_MAX_BYTES,
+        )
+        self.shared_cache = build_shared_cache(
+            CACHE_BACKEND,
+            mmap_dir=CACHE_MMAP_DIR,
+            mmap_max_bytes=CACHE_MMAP_MAX_BYTES,
+            redis_url=CACHE_REDIS_URL,
+            redis_pool_size=CACHE_REDIS_POOL_SIZE,
+            timeout=CACHE_TIMEOUT_MS / 1000.0,
+        )
+        # company_id -> (shared generation, monotonic time until which it is trusted)
+        self._generations: Dict[str, tuple] = {}
+        self._background_tasks: set = set()
+        # Webhook bookkeeping: recent delivery digests, and invalidations waiting for the coalescing window
+        self._webhook_seen: "OrderedDict[bytes, float]" = OrderedDict()
+        self._pending_invalidations: Dict[str, set] = {}
+        self._invalidation_handle: Optional[asyncio.TimerHandle] = None
+        self.webhook_stats = {"received": 0, "duplicates": 0, "rejected": 0, "flushes": 0, "invalidations": 0}
         self._setup_handlers()
         self._setup_http_routes()
 
+    def _setup_metrics(self):
+        """Create the /metrics registry: hot-path histograms/counters plus scrape-time gauges over existing stats"""
+        registry = self.metrics = metrics.Registry()
+        self.m_http_requests = registry.counter(
+            "gateway_http_requests_total", "HTTP requests by route, method and status", ("route", "method", "status"))
+        self.m_http_duration = registry.histogram(
+            "gateway_http_request_duration_seconds", "HTTP request latency by route", ("route",))
+        self.m_http_response_bytes = registry.histogram(
+            "gateway_http_response_bytes", "HTTP response body size by route", ("route",), metrics.SIZE_BUCKETS)
+        self.m_tool_calls = registry.counter(
+            "gateway_tool_calls_total", "Tool calls by tool, transport (http/mcp) and outcome", ("tool", "transport", "outcome"))
+        self.m_tool_duration = registry.histogram(
+            "gateway_tool_duration_seconds", "Tool call latency by tool and transport", ("tool", "transport"))
+        self.m_upstream_requests = registry.counter(
+            "gateway_upstream_requests_total", "Upstream .NET API attempts by endpoint and outcome", ("endpoint", "outcome"))
+        self.m_upstream_duration = registry.histogram(
+            "gateway_upstream_request_duration_seconds", "Upstream attempt latency by endpoint", ("endpoint",))
+        self.m_upstream_bytes = registry.histogram(
+            "gateway_upstream_response_bytes", "Upstream response body size by endpoint", ("endpoint",), metrics.SIZE_BUCKETS)
+        self.m_pool_wait = registry.histogram(
+            "gateway_upstream_pool_wait_seconds", "Time spent waiting for a pooled upstream connection")
+        self.m_offload_duration = registry.histogram(
+            "gateway_offload_task_seconds", "Run time of parse/index/encode steps offloaded to worker threads")
+        self.m_loop_lag = registry.histogram(
+            "gateway_event_loop_lag_seconds", "How late the event loop ran the monitor's heartbeat timer",
+            buckets=metrics.LAG_BUCKETS)
+        registry.gauge_function(
+            "gateway_event_loop_lag_recent_seconds", "Event-loop lag percentiles over the monitor's recent samples",
+            ("quantile",),
+            lambda: [((str(q / 100),), self.loop_monitor.percentile(q)) for q in (50, 90, 99)])
+        registry.gauge_function(
+            "gateway_event_loop_stalls_total", "Times the loop was blocked longer than LOOP_BLOCK_THRESHOLD_MS", (),
+            lambda: [((), self.loop_monitor.stalls)], "counter")
+
+        registry.gauge_function(
+            "gateway_offload_tasks_total", "CPU-heavy steps by where they ran (worker or inline on the loop)", ("mode",),
+            lambda: [(("worker",), self.offloader.offloaded), (("inline",), self.offloader.inline)], "counter")
+        registry.gauge_function(
+            "gateway_offload_in_flight", "Offloaded steps queued or running on worker threads", (),
+            lambda: [((), self.offloader.in_flight)])
+
+        def caches():
+            yield "schedules", self.schedule_cache.stats()
+
+        for stat, kind in (("hits", "counter"), ("misses", "counter"), ("coalesced", "counter"),
+                           ("evictions", "counter"), ("stale_served", "counter"),
+                           ("entries", "gauge"), ("bytes", "gauge"), ("hit_ratio", "gauge")):
+            suffix = "_total" if kind == "counter" else ""
+            registry.gauge_function(
+                f"gateway_cache_{stat}{suffix}", f"Snapshot cache {stat.replace('_', ' ')}", ("cache",),
+                lambda stat=stat: [((name,), stats[stat]) for name, stats in caches()], kind)
+        for stat in ("not_modified", "unchanged", "stale", "bytes_downloaded", "bytes_saved"):
+            registry.gauge_function(
+                f"gateway_conditional_{stat}_total", f"Conditional upstream requests: {stat.replace('_', ' ')}", ("endpoint",),
+                lambda stat=stat: [((endpoint,), c[stat]) for endpoint, c in self.conditional_store.stats()["endpoints"].items()],
+                "counter")
+        for stat in ("hits", "misses", "writes", "errors"):
+            registry.gauge_function(
+                f"gateway_shared_cache_{stat}_total", f"Shared cache tier {stat}", ("backend",),
+                lambda stat=stat: [((CACHE_BACKEND,), self.shared_cache.stats()[stat])] if self.shared_cache else [],
+                "counter")
+        registry.gauge_function(
+            "gateway_upstream_in_flight", "Upstream requests currently in progress", (),
+            lambda: [((), self._upstream_in_flight)])
+        registry.gauge_function(
+            "gateway_upstream_pool_max_connections", "Configured upstream connection pool size", (),
+            lambda: [((), HTTPX_MAX_CONNECTIONS)])
+        for stat in ("new_connections", "reused_connections", "pool_timeouts"):
+            registry.gauge_function(
+                f"gateway_upstream_{stat}_total", f"Upstream pool {stat.replace('_', ' ')}", (),
+                lambda stat=stat: [((), getattr(self.pool_stats, stat))], "counter")
+        registry.gauge_function(
+            "gateway_circuit_breaker_state", "Circuit breaker state by endpoint (0 closed, 1 half-open, 2 open)", ("endpoint",),
+            lambda: [((label,), {"closed": 0, "half_open": 1, "open": 2}[b.state]) for label, b in self.breakers.items()])
+        registry.gauge_function(
+            "gateway_upstream_retries_total", "Upstream retries granted by the retry budget", (),
+            lambda: [((), self.retry_budget.retries)], "counter")
+        registry.gauge_function(
+            "gateway_upstream_hedges_total", "Hedged upstream requests sent", (),
+            lambda: [((), self.hedge_stats["sent"])], "counter")
+        for stat in ("in_flight", "queued", "limit"):
+            registry.gauge_function(
+                f"gateway_admission_{stat}", f"Admission control {stat.replace('_', ' ')} by route", ("route",),
+                lambda stat=stat: [((route,), st[stat]) for route, st in self.admission.stats().items()])
+        registry.gauge_function(
+            "gateway_admission_shed_total", "Requests rejected with 503 by admission control", ("route", "reason"),
+            lambda: [((route, reason), st[key]) for route, st in self.admission.stats().items()
+                     for reason, key in (("queue_full", "shed_queue_full"), ("queue_timeout", "shed_queue_timeout"),
+                                         ("displaced", "displaced"))],
+            "counter")
+
+    @asynccontextmanager
+    async def _tool_metrics(self, tool_name: str, transport: str):
+        """Count and time one tool call"""
+        label = tool_name if tool_name in TOOL_NAMES else "<unknown>"
+        started = time.perf_counter()
+        outcome = "error"
+        try:
+            yield
+            outcome = "ok"
+        except TimeoutError:
+            outcome = "timeout"
+            raise
+        except (LookupError, ValueError):
+            outcome = "invalid"
+            raise
+        finally:
+            self.m_tool_calls.inc(label, transport, outcome)
+            self.m_tool_duration.observe(time.perf_counter() - started, label, transport)
+
     async def _get_http_client(self) -> httpx.AsyncClient:
         if self.http_client is None:
             # Create a single shared AsyncClient instance with connection limits
             # Default headers (no Authorization — injected per-request)
             self.http_client = httpx.AsyncClient(
                 base_url=self.api_base_url,
-                timeout=HTTPX_TIMEOUT,
+                timeout=httpx.Timeout(HTTPX_TIMEOUT, pool=HTTPX_POOL_TIMEOUT),
                 headers={"Accept": "application/json"},
-                limits=httpx.Limits(max_connections=100, max_keepalive_connections=20)
+                transport=build_transport(
+                    self.pool_stats,
+                    http2=HTTPX_HTTP2,
+                    max_connections=HTTPX_MAX_CONNECTIONS,
+                    max_keepalive_connections=HTTPX_MAX_KEEPALIVE_CONNECTIONS,
+                    keepalive_expiry=HTTPX_KEEPALIVE_EXPIRY,
+                )
             )
         return self.http_client
 
-    async def _http_get(self, path: str, params: dict | None = None, auth_token: str | None = None) -> httpx.Response:
-        """Simple retrying GET wrapper with exponential backoff.
-        
+    def _breaker_for(self, path: str) -> CircuitBreaker:
+        label = _endpoint_label(path)
+        breaker = self.breakers.get(label)
+        if breaker is None:
+            breaker = self.breakers[label] = CircuitBreaker(label, BREAKER_FAILURE_THRESHOLD, BREAKER_RESET_SECONDS)
+        return breaker
+
+    async def _call_upstream(self, path: str, send):
+        """Run send() under the route's circuit breaker, retrying failures within the retry budget.
+
+        send() performs one attempt and raises httpx.HTTPStatusError for 5xx.
+        Transport errors and 5xx count against the breaker and are retried
+        with full-jitter backoff while attempts and the shared budget last;
+        a body that cannot be parsed (ValueError) counts against the breaker
+        but is not retried. 4xx errors propagate immediately. Raises
+        CircuitOpenError without contacting the API while the breaker is open.
+        """
+        breaker = self._breaker_for(path)
+        endpoint = breaker.name
+        self.retry_budget.record_request()
+        attempt = 1
+        while True:
+            probe = breaker.state == CircuitBreaker.HALF_OPEN
+            if not breaker.allow():
+                self.m_upstream_requests.inc(endpoint, "circuit_open")
+                raise CircuitOpenError(f"Circuit open for {breaker.name}")
+            started = time.perf_counter()
+            self._upstream_in_flight += 1
+            try:
+                result = await send()
+            except asyncio.CancelledError:
+                self.m_upstream_requests.inc(endpoint, "cancelled")
+                raise
+            except ValueError:
+                # The API answered, but with a body that is not what the route returns
+                self.m_upstream_duration.observe(time.perf_counter() - started, endpoint)
+                self.m_upstream_requests.inc(endpoint, "parse_error")
+                breaker.record_failure()
+                raise
+            except (httpx.RequestError, httpx.HTTPStatusError) as e:
+                self.m_upstream_duration.observe(time.perf_counter() - started, endpoint)
+                if isinstance(e, httpx.HTTPStatusError) and e.response.status_code < 500:
+                    # The API answered; a client error says nothing about its health
+                    self.m_upstream_requests.inc(endpoint, "client_error")
+                    breaker.record_success()
+                    raise
+                self.m_upstream_requests.inc(endpoint, "server_error" if isinstance(e, httpx.HTTPStatusError) else "transport_error")
+                breaker.record_failure()
+                if attempt >= HTTPX_RETRIES:
+                    raise
+                backoff = full_jitter_backoff(attempt, HTTPX_BACKOFF_FACTOR, HTTPX_BACKOFF_MAX)
+                remaining = deadline_remaining()
+                if remaining is not None and backoff >= remaining:
+                    # The caller's deadline would pass before the retry could even start
+                    raise
+                if not self.retry_budget.try_acquire():
+                    logger.warning(f"Retry budget exhausted; not retrying GET {path}")
+                    raise
+                logger.debug(f"HTTP GET attempt {attempt} failed for {path}: {e}; sleeping {backoff:.3f}s before retry")
+            except Exception:
+                self.m_upstream_requests.inc(endpoint, "error")
+                raise
+            else:
+                self.m_upstream_duration.observe(time.perf_counter() - started, endpoint)
+                self.m_upstream_requests.inc(endpoint, "ok")
+                breaker.record_success()
+                return result
+            finally:
+                self._upstream_in_flight -= 1
+                if probe:
+                    # A half-open probe that ended without a verdict must not block the next one
+                    breaker.release()
+            # Back off outside the attempt, so the wait neither counts as in flight nor holds a probe
+            await asyncio.sleep(backoff)
+            attempt += 1
+
+    async def _hedged(self, path: str, send, discard=None):
+        """Await send(), firing a second identical send() if the first is slow.
+
+        The hedge goes out once the first request has been pending longer than
+        the route's HEDGE_PERCENTILE latency (never sooner than HEDGE_MIN_DELAY_MS)
+        and only while the hedge budget allows; whichever finishes first wins
+        and the other is cancelled. If the loser had already finished, its
+        result is passed to discard() (e.g. to close a streamed response whose
+        body was never read). Only for idempotent requests.
+        """
+        label = _endpoint_label(path)
+        tracker = self.latencies.get(label)
+        if tracker is None:
+            tracker = self.latencies[label] = LatencyTracker()
+        self.hedge_budget.record_request()
+
+        def start():
+            started = time.perf_counter()
+            task = asyncio.ensure_future(send())
+            # Cancelled losers record their elapsed time as a lower bound, so slow replicas still count
+            def finished(t):
+                tracker.record(time.perf_counter() - started)
+                if not t.cancelled():
+                    t.exception()  # retrieved here so a discarded loser does not log a warning
+
+            task.add_done_callback(finished)
+            return task
+
+        def release(task):
+            if discard is not None and not task.cancelled() and task.exception() is None:
+                self._spawn(discard(task.result()))
+
+        delay = tracker.percentile(HEDGE_PERCENTILE)
+        first = start()
+        tasks = [first]
+        winner = None
+        try:
+            if delay is None or self._breaker_for(path).state != CircuitBreaker.CLOSED:
+                winner = first
+                return await first
+            done, _ = await asyncio.wait(tasks, timeout=max(delay, HEDGE_MIN_DELAY))
+            if done or not self.hedge_budget.try_acquire():
+                winner = first
+                return await first
+
+            self.hedge_stats["sent"] += 1
+            tasks.append(start())
+            pending = set(tasks)
+            while True:
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    # A failed request only loses if the other one can still succeed
+                    if task.exception() is None or not pending:
+                        winner = task
+                        if task is not first:
+                            self.hedge_stats["won"] += 1
+                        return task.result()
+        finally:
+            for task in tasks:
+                if task is winner:
+                    continue
+                if task.done():
+                    release(task)
+                else:
+                    # Cancellation may come too late to stop it; whatever it returns is released then
+                    task.cancel()
+                    task.add_done_callback(release)
+
+    def _spawn(self, coro):
+        """Run coro in the background, keeping a reference until it finishes"""
+        task = asyncio.ensure_future(coro)
+        self._background_tasks.add(task)
+        task.add_done_callback(self._background_tasks.discard)
+        return task
+
+    async def _open_stream(self, client: httpx.AsyncClient, path: str, params: dict | None,
+                           headers: dict) -> httpx.Response:
+        """Send a streaming GET and return as soon as the response headers arrive.
+
+        The body is left unread; the caller must aclose() the response. With
+        HEDGE_REQUESTS on, the two attempts race on their headers and the
+        loser is cancelled (or closed) before any of its body is read.
+        """
+        def send():
+            return client.send(client.build_request("GET", path, params=params, headers=headers), stream=True)
+
+        if HEDGE_REQUESTS:
+            return await self._hedged(path, send, discard=lambda resp: resp.aclose())
+        return await send()
+
+    async def _http_get(self, path: str, params: dict | None = None, auth_token: str | None = None,
+                        headers: dict | None = None) -> httpx.Response:
+        """GET with retries, retry budget and circuit breaker (see _call_upstream).
+
         auth_token: per-request Bearer token. Falls back to API_AUTH_TOKEN env var.
+        headers: extra request headers (e.g. conditional validators).
+        A 5xx response is returned once retries are exhausted.
         """
         client = await self._get_http_client()
         token = auth_token or API_AUTH_TOKEN
-        headers = {"Authorization": f"Bearer {token}"} if token else {}
-        last_exc = None
-        for attempt in range(1, HTTPX_RETRIES + 1):
-            try:
+        headers = dict(headers or {})
+        if token:
+            headers["Authorization"] = f"Bearer {token}"
+
+        async def send():
+            if HEDGE_REQUESTS:
+                resp = await self._hedged(path, lambda: client.get(path, params=params, headers=headers))
+            else:
                 resp = await client.get(path, params=params, headers=headers)
-                # Raise for 5xx server errors so we can retry
-                if 500 <= resp.status_code < 600 and attempt < HTTPX_RETRIES:
-                    logger.warning(f"Server error {resp.status_code} on GET {path}, attempt {attempt}/{HTTPX_RETRIES}")
-                    raise httpx.HTTPStatusError("Server error", request=resp.request, response=resp)
-                return resp
-            except (httpx.RequestError, httpx.HTTPStatusError) as e:
-                last_exc = e
-                backoff = HTTPX_BACKOFF_FACTOR * (2 ** (attempt - 1))
-                logger.debug(f"HTTP GET attempt {attempt} failed for {path}: {e}; sleeping {backoff}s before retry")
-                await asyncio.sleep(backoff)
-        # If we exhausted retries, raise the last exception
-        raise last_exc
+            if 500 <= resp.status_code < 600:
+                logger.warning(f"Server error {resp.status_code} on GET {path}")
+                raise httpx.HTTPStatusError("Server error", request=resp.request, response=resp)
+            return resp
+
+        try:
+            return await self._call_upstream(path, send)
+        except httpx.HTTPStatusError as e:
+            return e.response
+
+    async def _get_company_snapshot(self, company_id: str, auth_token: str | None = None) -> CompanySnapshot | None:
+        """Return the company's indexed schedule snapshot, or None if the company is unknown.
+
+        Concurrent calls for the same company share one load, even when
+        SCHEDULE_CACHE_TTL is 0 and the snapshot is not kept afterwards.
+        """
+        token = auth_token or API_AUTH_TOKEN
+
+        path = f"/api/companies/{company_id}/schedules"
+
+        async def fetch():
+            # Decoded batch by batch as the body arrives (straight into Schedule records with msgspec),
+            # so the raw body is never held whole; a 304 or unchanged body reuses the previous snapshot
+            return await self._http_stream_json_batches(path, decode_schedules, CompanySnapshot, auth_token=token)
+
+        # The generation changes whenever any process invalidates the company, which retires this key everywhere
+        key = (str(company_id), _token_scope(token), await self._company_generation(str(company_id)))
+        if self.shared_cache is None or SCHEDULE_CACHE_TTL <= 0:
+            load = fetch
+        else:
+            async def load():
+                packed = await self.shared_cache.get(_shared_snapshot_key(key))
+                if packed is not None:
+                    snapshot = await self.offloader.run(_unpack_snapshot, packed, offload=len(packed) >= OFFLOAD_MIN_BYTES)
+                    return snapshot, len(packed)
+                snapshot, size = await fetch()
+                if snapshot is not None:
+                    await self._share_snapshot(key, snapshot)
+                return snapshot, size
+
+        try:
+            return await self.schedule_cache.get_or_load(key, load)
+        except CircuitOpenError:
+            # Expired snapshots are kept until evicted; better stale data than none during an outage
+            stale = self.schedule_cache.get_stale(key)
+            if stale is None:
+                raise
+            logger.warning(f"Serving stale schedule snapshot for company {company_id} while its circuit is open")
+            return stale
+
+    async def _fetch_schedules_page(self, company_id: str, params: dict, auth_token: str | None = None) -> dict | None:
+        """GET one page from /schedules/paged; returns the PagedResultDto body or None on 404"""
+        body, _ = await self._http_get_json(f"/api/companies/{company_id}/schedules/paged", params=params, auth_token=auth_token)
+        return body
+
+    async def _iter_schedule_pages(self, company_id: str, filters: dict, auth_token: str | None = None,
+                                   page_size: int = PAGED_PAGE_SIZE, start_page: int = 1):
+        """Async iterator over /schedules/paged bodies.
+
+        Page N+1 is requested as soon as page N arrives, so the upstream fetch
+        overlaps with whatever the caller does with page N. An empty page, or
+        one shorter than the page size the API reports, is the last.
+        """
+        page = start_page
+        pending = asyncio.ensure_future(
+            self._fetch_schedules_page(company_id, {**filters, "page": page, "pageSize": page_size}, auth_token)
+        )
+        try:
+            while pending is not None:
+                body = await pending
+                pending = None
+                if body is None:
+                    return
+                items = body.get("items") or []
+                total_pages = body.get("totalPages")
+                if total_pages is None:
+                    total_pages = math.ceil((body.get("totalCount") or 0) / page_size)
+                if items and len(items) >= (body.get("pageSize") or page_size) and page < total_pages:
+                    page += 1
+                    pending = asyncio.ensure_future(
+                        self._fetch_schedules_page(company_id, {**filters, "page": page, "pageSize": page_size}, auth_token)
+                    )
+                yield body
+        finally:
+            if pending is not None and not pending.done():
+                pending.cancel()
+
+    async def _get_employee_schedules_paged(self, company_id: str, person_id: str, auth_token: str | None = None) -> list | None:
+        """Collect one employee's schedules via the personId-filtered paged endpoint; None if the company is unknown"""
+        if not person_id.isdigit():
+            # personId is an int upstream; nothing can match and the API would reject the filter
+            return []
+        schedules = None
+        async for body in self._iter_schedule_pages(company_id, {"personId": person_id}, auth_token=auth_token):
+            if schedules is None:
+                schedules = []
+            schedules.extend(body.get("items") or [])
+        return schedules
+
+    def invalidate_company_cache(self, company_id: str) -> int:
+        """Drop every cached snapshot for a company, across token scopes"""
+        company_id = str(company_id)
+        prefix = f"/api/companies/{company_id}/"
+        self.conditional_store.discard_where(lambda key: key[0].startswith(prefix))
+        dropped = self.schedule_cache.invalidate_where(lambda key: key[0] == company_id)
+        self._publish_company_change(company_id)
+        return dropped
+
+    async def _company_generation(self, company_id: str) -> int:
+        """Shared-cache generation of a company's snapshots (always 0 without a shared cache).
+
+        Re-read from the backend at most every CACHE_SYNC_MS, which bounds how long
+        another process's invalidation can go unnoticed here.
+        """
+        if self.shared_cache is None:
+            return 0
+        now = time.monotonic()
+        known = self._generations.get(company_id)
+        if known is not None and known[1] > now:
+            return known[0]
+        generation = await self.shared_cache.generation(company_id)
+        if generation is None:
+            # Backend unavailable: keep using what this process last saw
+            generation = known[0] if known is not None else 0
+        if len(self._generations) >= 10000:
+            self._generations.clear()
+        self._generations[company_id] = (generation, now + CACHE_SYNC_MS / 1000.0)
+        return generation
+
+    async def _share_snapshot(self, key: tuple, snapshot: CompanySnapshot):
+        packed = await self.offloader.run(pack_schedules, snapshot.schedules, offload=len(snapshot) >= OFFLOAD_MIN_ROWS)
+        await self.shared_cache.set(_shared_snapshot_key(key), packed, SCHEDULE_CACHE_TTL)
+
+    def _publish_company_change(self, company_id: str):
+        """Tell the other processes sharing the cache that a company's snapshots changed"""
+        if self.shared_cache is None:
+            return
+        self._spawn(self._bump_company(company_id))
+
+    async def _bump_company(self, company_id: str):
+        generation = await self.shared_cache.bump(company_id)
+        if generation is None:
+            return
+        self._generations[company_id] = (generation, time.monotonic() + CACHE_SYNC_MS / 1000.0)
+        # A fetch that was in flight during the bump stored its snapshot under the old generation
+        self.schedule_cache.invalidate_where(lambda k: k[0] == company_id and k[2] < generation)
+
+    async def _http_get_json(self, path: str, params: dict | None = None, auth_token: str | None = None,
+                             parse=json_codec.loads, allow_stale: bool = True) -> tuple:
+        """GET and parse a JSON body, revalidating previously parsed bodies.
+
+        Sends If-None-Match/If-Modified-Since when validators are known; a 304
+        returns the cached parsed value. When the API sends no validators, a
+        200 whose body hashes the same as last time also skips parse().
+        Returns (value, body_size); value is None on 404. While the route's
+        circuit breaker is open the last parsed value is returned instead,
+        if there is one and allow_stale is set.
+        """
+        token = auth_token or API_AUTH_TOKEN
+        endpoint = _endpoint_label(path)
+        key = (path, tuple(sorted((params or {}).items())), _token_scope(token))
+        store = self.conditional_store if CONDITIONAL_REQUESTS else None
+        # Plain JSON bodies (people, paged schedules) and their validators are shared with other processes
+        shared = self.shared_cache if store is not None and parse is json_codec.loads else None
+        if shared is not None:
+            # Company generation in the key, so bodies predating an invalidation are never adopted elsewhere
+            company = _COMPANY_PATH.match(path)
+            generation = await self._company_generation(company.group(1)) if company else 0
+            shared_key = "conditional:" + hashlib.blake2b(repr((key, generation)).encode("utf-8"), digest_size=16).hexdigest()
+            if key not in store:
+                packed = await shared.get(shared_key)
+                if packed is not None:
+                    store.adopt(key, unpack_value(packed))
+
+        headers = store.headers_for(key, endpoint) if store else {}
+        try:
+            response = await self._http_get(path, params=params, auth_token=token, headers=headers)
+        except CircuitOpenError:
+            cached = store.stale(key, endpoint) if store and allow_stale else None
+            if cached is None:
+                raise
+            logger.warning(f"Serving stale {endpoint} response while its circuit is open")
+            return cached
+        if response.status_code == 304:
+            cached = store.not_modified(key, endpoint) if store else None
+            if cached is not None:
+                return cached
+            # Validators outlived their cached body; fetch unconditionally
+            response = await self._http_get(path, params=params, auth_token=token)
+
+        if response.status_code == 404:
+            if store:
+                store.discard(key)
+            return None, 0
+        response.raise_for_status()
+
+        body = response.content
+        self.m_upstream_bytes.observe(len(body), endpoint)
+        offload = len(body) >= OFFLOAD_MIN_BYTES
+        if store is None:
+            return await self.offloader.run(parse, body, offload=offload), len(body)
+        digest = hashlib.blake2b(body, digest_size=16).digest()
+        value = store.unchanged(key, digest, endpoint)
+        fresh = value is None
+        if fresh:
+            value = await self.offloader.run(parse, body, offload=offload)
+        store.store(key, endpoint, value, len(body), response.headers, digest)
+        if fresh and shared is not None:
+            await shared.set(shared_key, pack_value(store.export(key)), CACHE_SHARED_CONDITIONAL_TTL)
+        return value, len(body)
+
+    async def _http_stream_json_batches(self, path: str, decode, build, params: dict | None = None,
+                                        auth_token: str | None = None) -> tuple:
+        """Conditional, retrying streaming GET for endpoints that return a JSON array of objects.
+
+        Rows are decoded by decode() in batches as the body arrives (see
+        iter_json_array_batches), so peak memory is the decoded rows plus the
+        undecoded tail of the body, never the whole raw body. Once the body is
+        complete, build(rows) makes the value. Validators are sent as in
+        _http_get_json: a 304, or a 200 whose body hashes the same as last
+        time, returns the previously built value instead. Attempts are hedged
+        on their response headers (see _open_stream). Returns
+        (value, body_size); value is None on 404.
+        """
+        client = await self._get_http_client()
+        token = auth_token or API_AUTH_TOKEN
+        endpoint = _endpoint_label(path)
+        key = (path, tuple(sorted((params or {}).items())), _token_scope(token))
+        store = self.conditional_store if CONDITIONAL_REQUESTS else None
+        auth = {"Authorization": f"Bearer {token}"} if token else {}
+
+        async def send(conditional: bool):
+            headers = {**(store.headers_for(key, endpoint) if store and conditional else {}), **auth}
+            resp = await self._open_stream(client, path, params, headers)
+            try:
+                if resp.status_code in (304, 404):
+                    return resp.status_code, None, 0, b"", resp.headers
+                if 500 <= resp.status_code < 600:
+                    logger.warning(f"Server error {resp.status_code} on GET {path}")
+                resp.raise_for_status()
+
+                digest = hashlib.blake2b(digest_size=16)
+                bytes_read = 0
+
+                async def hashed_chunks():
+                    nonlocal bytes_read
+                    async for chunk in resp.aiter_bytes():
+                        bytes_read += len(chunk)
+                        digest.update(chunk)
+                        yield chunk
+
+                rows = []
+                async for batch in iter_json_array_batches(hashed_chunks(), decode):
+                    rows.extend(batch)
+                return resp.status_code, rows, bytes_read, digest.digest(), resp.headers
+            finally:
+                await resp.aclose()
+
+        status, rows, size, digest, headers = await self._call_upstream(path, lambda: send(True))
+        if status == 304:
+            cached = store.not_modified(key, endpoint) if store else None
+            if cached is not None:
+                return cached
+            # Validators outlived their cached value; fetch unconditionally
+            status, rows, size, digest, headers = await self._call_upstream(path, lambda: send(False))
+        if status == 404:
+            if store:
+                store.discard(key)
+            return None, 0
+
+        self.m_upstream_bytes.observe(size, endpoint)
+        value = store.unchanged(key, digest, endpoint) if store else None
+        if value is None:
+            value = await self.offloader.run(build, rows, offload=len(rows) >= OFFLOAD_MIN_ROWS)
+        if store:
+            store.store(key, endpoint, value, size, headers, digest)
+        return value, size
+
+    def _handle_webhook(self, payload: dict, delivery_id: bytes) -> dict:
+        """Queue the cache invalidations implied by a WebhookPayloadDto; duplicate deliveries are ignored.
+
+        The .NET WebhookService only emits employee.created/updated and
+        location.created/updated; those drop the company's cached people or
+        location bodies. Anything else drops everything cached for the company.
+        Schedule edits send no webhook upstream, so cached schedule snapshots
+        still age out by SCHEDULE_CACHE_TTL alone.
+        """
+        now = time.monotonic()
+        while self._webhook_seen and next(iter(self._webhook_seen.values())) <= now:
+            self._webhook_seen.popitem(last=False)
+        if delivery_id in self._webhook_seen:
+            self.webhook_stats["duplicates"] += 1
+            return {"status": "duplicate"}
+        self._webhook_seen[delivery_id] = now + WEBHOOK_DEDUPE_SECONDS
+
+        event_type = str(payload.get("eventType") or "")
+        data = payload.get("data") if isinstance(payload.get("data"), dict) else {}
+        company_id = data.get("companyId") or payload.get("companyId")
+        if not company_id:
+            raise ValueError("companyId is required in the webhook data")
+        company_id = str(company_id)
+        entity = event_type.partition(".")[0]
+
+        if entity == "employee":
+            self._pending_invalidations.setdefault(company_id, set()).add("people")
+        elif entity == "location":
+            self._pending_invalidations.setdefault(company_id, set()).add("locations")
+        else:
+            self._pending_invalidations.setdefault(company_id, set()).add("all")
+
+        if WEBHOOK_COALESCE_SECONDS <= 0:
+            self._flush_invalidations()
+        elif self._invalidation_handle is None:
+            loop = asyncio.get_running_loop()
+            self._invalidation_handle = loop.call_later(WEBHOOK_COALESCE_SECONDS, self._flush_invalidations)
+        return {"status": "accepted", "event_type": event_type, "company_id": company_id}
+
+    def _flush_invalidations(self):
+        """Apply every invalidation queued during the coalescing window in one pass"""
+        self._invalidation_handle = None
+        pending, self._pending_invalidations = self._pending_invalidations, {}
+        self.webhook_stats["flushes"] += 1
+
+        for company_id, scopes in pending.items():
+            prefix = f"/api/companies/{company_id}/"
+            if "all" in scopes:
+                self.invalidate_company_cache(company_id)
+            else:
+                for scope in scopes:
+                    self.conditional_store.discard_where(lambda key: key[0].startswith(prefix + scope))
+            self.webhook_stats["invalidations"] += 1
 
     def _setup_handlers(self):
         """Setup MCP handlers"""
@@ -150,7 +1070,8 @@ class ShiftWorkServer:
                         "type": "object",
                         "properties": {
                             "company_id": {"type": "string", "description": "The unique identifier for the company"},
-                            "person_id": {"type": "string", "description": "The unique identifier for the employee"}
+                            "person_id": {"type": "string", "description": "The unique identifier for the employee"},
+                            "timeout_seconds": {"type": "number", "description": "Optional deadline for this call, in seconds"}
                         },
                         "required": ["company_id", "person_id"]
                     }
@@ -172,7 +1093,40 @@ class ShiftWorkServer:
                         "properties": {
                             "company_id": {"type": "string", "description": "The unique identifier for the company"},
                             "start_date": {"type": "string", "description": "Optional ISO date/time for range start"},
-                            "end_date": {"type": "string", "description": "Optional ISO date/time for range end"}
+                            "end_date": {"type": "string", "description": "Optional ISO date/time for range end"},
+                            "timeout_seconds": {"type": "number", "description": "Optional deadline for this call, in seconds"}
+                        },
+                        "required": ["company_id"]
+                    }
+                ),
+                Tool(
+                    name="get_schedules_paged",
+                    description="Retrieve a paginated, filtered list of schedules. Preferred over get_employee_schedules for large datasets.",
+                    inputSchema={
+                        "type": "object",
+                        "properties": {
+                            "company_id": {"type": "string", "description": "Company ID"},
+                            "person_id": {"type": "integer", "description": "Filter by person (optional)"},
+                            "location_id": {"type": "integer", "description": "Filter by location (optional)"},
+                            "start_date": {"type": "string", "description": "ISO date start of range (optional)"},
+                            "end_date": {"type": "string", "description": "ISO date end of range (optional)"},
+                            "search_query": {"type": "string", "description": "Free-text search (optional)"},
+                            "page": {"type": "integer", "description": "Page number (default 1)"},
+                            "page_size": {"type": "integer", "description": "Page size (default 200, max 1000)"},
+                            "include_voided": {"type": "boolean", "description": "Include voided schedules (default false)"},
+                            "timeout_seconds": {"type": "number", "description": "Optional deadline for this call, in seconds"}
+                        },
+                        "required": ["company_id"]
+                    }
+                ),
+                Tool(
+                    name="get_company_regional_settings",
+                    description="Get a company's language, time zone, first day of week, date/time formats and currency symbol",
+                    inputSchema={
+                        "type": "object",
+                        "properties": {
+                            "company_id": {"type": "string", "description": "The unique identifier for the company"},
+                            "timeout_seconds": {"type": "number", "description": "Optional deadline for this call, in seconds"}
                         },
                         "required": ["company_id"]
                     }
@@ -187,27 +1141,136 @@ class ShiftWorkServer:
         @self.server.call_tool()
         async def call_tool(name: str, arguments: dict) -> List[TextContent]:
             logger.info(f"Tool called: {name}")
+            arguments = dict(arguments or {})
             try:
-                if name == "ping":
-                    return [TextContent(type="text", text="pong - server is running")]
-
-                elif name == "get_employee_schedules":
-                    result = await self._get_employee_schedules_impl(arguments)
-                    return [TextContent(type="text", text=json.dumps(result))]
-
-                elif name == "get_people_with_unpublished_schedules":
-                    result = await self._get_people_with_unpublished_schedules_impl(arguments)
-                    return [TextContent(type="text", text=json.dumps(result))]
-
-                else:
-                    logger.warning(f"Unknown tool requested: {name}")
-                    return [TextContent(type="text", text=f"Unknown tool: {name}")]
-
+                async with self._tool_metrics(name, "mcp"), \
+                        deadline_scope(_tool_timeout(name, arguments.pop("timeout_seconds", None))):
+                    if name == "ping":
+                        return [TextContent(type="text", text="pong - server is running")]
+
+                    elif name == "get_employee_schedules":
+                        result = await self._get_employee_schedules_impl(arguments)
+                        return [TextContent(type="text", text=await self._encode_str(result))]
+
+                    elif name == "get_people_with_unpublished_schedules":
+                        result = await self._get_people_with_unpublished_schedules_impl(arguments)
+                        return [TextContent(type="text", text=await self._encode_str(result))]
+
+                    elif name == "get_schedules_paged":
+                        result = await self._get_schedules_paged_impl(arguments)
+                        return [TextContent(type="text", text=await self._encode_str(result))]
+
+                    elif name == "get_company_regional_settings":
+                        result = await self._get_company_regional_settings_impl(arguments)
+                        return [TextContent(type="text", text=await self._encode_str(result))]
+
+                    else:
+                        logger.warning(f"Unknown tool requested: {name}")
+                        return [TextContent(type="text", text=f"Unknown tool: {name}")]
+
+            except TimeoutError:
+                logger.warning(f"Deadline exceeded for tool {name}")
+                return [TextContent(type="text", text="Deadline exceeded")]
+            except ValueError as e:
+                # Bad arguments (including timeout_seconds); the messages are our own validation errors
+                return [TextContent(type="text", text=f"Invalid argument: {e}")]
             except Exception as e:
                 # Log internal error with stack trace but return a safe message to caller
                 logger.error(f"Tool error for {name}: {e}", exc_info=True)
                 return [TextContent(type="text", text="Server error")]
 
+    async def _encode(self, data, rows: int) -> bytes:
+        """json_codec.dumps, on a worker thread when the payload has at least OFFLOAD_MIN_ROWS rows"""
+        return await self.offloader.run(json_codec.dumps, data, offload=rows >= OFFLOAD_MIN_ROWS)
+
+    async def _encode_str(self, result: dict) -> str:
+        return (await self._encode(result, _result_rows(result))).decode("utf-8")
+
+    async def _execute_tool(self, tool_name: str, arguments: dict, auth_token: str | None = None,
+                            timeout: float | str | None = None) -> dict:
+        """Dispatch an HTTP tool call under its deadline.
+
+        timeout: caller-requested seconds (e.g. from X-Request-Timeout); a
+        timeout_seconds argument may shorten it further. Raises LookupError for
+        unknown tools and TimeoutError when the deadline passes.
+        """
+        arguments = dict(arguments)
+        async with self._tool_metrics(tool_name, "http"), \
+                deadline_scope(_tool_timeout(tool_name, timeout, arguments.pop("timeout_seconds", None))):
+            if tool_name == "ping":
+                return {"message": "pong - server is running"}
+            elif tool_name == "get_employee_schedules":
+                return await self._get_employee_schedules_impl(arguments, auth_token=auth_token)
+            elif tool_name == "get_people_with_unpublished_schedules":
+                return await self._get_people_with_unpublished_schedules_impl(arguments, auth_token=auth_token)
+            elif tool_name == "get_schedules_paged":
+                return await self._get_schedules_paged_impl(arguments, auth_token=auth_token)
+            elif tool_name == "get_company_regional_settings":
+                return await self._get_company_regional_settings_impl(arguments, auth_token=auth_token)
+            raise LookupError(f"Unknown tool: {tool_name}")
+
+    async def _execute_tool_batch(self, calls: list, auth_token: str | None = None,
+                                  max_concurrency: int = BATCH_MAX_CONCURRENCY, timeout: float | None = None) -> list:
+        """Run tool calls concurrently; returns one result/error entry per call, in order.
+
+        Calls with the same tool name and arguments run once and share the
+        result. Calls against the same company share a schedule fetch through
+        the snapshot cache's single-flight loading. Each call runs under its
+        own per-tool deadline, further bounded by timeout for the whole batch.
+        """
+        semaphore = asyncio.Semaphore(max_concurrency)
+        unique: Dict[tuple, asyncio.Task] = {}
+        loop = asyncio.get_running_loop()
+        batch_deadline = None if timeout is None else loop.time() + timeout
+
+        async def run(tool_name: str, arguments: dict) -> dict:
+            async with semaphore:
+                try:
+                    if batch_deadline is None:
+                        result = await self._execute_tool(tool_name, arguments, auth_token=auth_token)
+                    else:
+                        # The call's own deadline applies too; whichever is sooner wins
+                        async with deadline_scope(batch_deadline - loop.time()):
+                            result = await self._execute_tool(tool_name, arguments, auth_token=auth_token)
+                    return {"ok": True, "result": result}
+                except TimeoutError:
+                    return {"ok": False, "status": 504, "error": "Deadline exceeded"}
+                except LookupError as e:
+                    return {"ok": False, "status": 404, "error": str(e)}
+                except ValueError as e:
+                    return {"ok": False, "status": 400, "error": str(e)}
+                except Exception as e:
+                    logger.error(f"Batch tool error for {tool_name}: {e}", exc_info=True)
+                    return {"ok": False, "status": 500, "error": "Internal server error"}
+
+        entries = []
+        for call in calls:
+            if not isinstance(call, dict):
+                entries.append((None, None))
+                continue
+            tool_name = call.get("tool_name") or call.get("name")
+            arguments = call.get("arguments") or {}
+            if not tool_name or not isinstance(arguments, dict):
+                entries.append((tool_name, None))
+                continue
+            # A per-call timeout does not change the result, so it is not part of the dedupe key
+            key = (tool_name, json.dumps({k: v for k, v in arguments.items() if k != "timeout_seconds"}, sort_keys=True, default=str))
+            if key not in unique:
+                unique[key] = asyncio.ensure_future(run(tool_name, arguments))
+            entries.append((tool_name, unique[key]))
+
+        if unique:
+            await asyncio.gather(*unique.values())
+
+        results = []
+        for index, (tool_name, task) in enumerate(entries):
+            if task is None:
+                outcome = {"ok": False, "status": 400, "error": "tool_name and object arguments are required"}
+            else:
+                outcome = task.result()
+            results.append({"index": index, "tool_name": tool_name, **outcome})
+        return results
+
     async def _get_employee_schedules_impl(self, arguments: dict, auth_token: str | None = None) -> dict:
         """Implementation for getting employee schedules"""
         company_id = arguments.get("company_id")
@@ -220,9 +1283,15 @@ class ShiftWorkServer:
             # Normalize types to string when filtering
             person_id_str = str(person_id)
 
-            response = await self._http_get(f"/api/companies/{company_id}/schedules", auth_token=auth_token)
+            if EMPLOYEE_SCHEDULES_PAGED:
+                employee_schedules = await self._get_employee_schedules_paged(company_id, person_id_str, auth_token=auth_token)
+            else:
+                # With SCHEDULE_CACHE_TTL=0 the snapshot is not kept, but concurrent calls still share its fetch
+                snapshot = await self._get_company_snapshot(company_id, auth_token=auth_token)
+                # Index lookup; person ids are normalized to string when the snapshot is built
+                employee_schedules = snapshot.by_person(person_id_str) if snapshot is not None else None
 
-            if response.status_code == 404:
+            if employee_schedules is None:
                 return {
                     "company_id": company_id,
                     "person_id": person_id_str,
@@ -231,15 +1300,6 @@ class ShiftWorkServer:
                     "schedules": []
                 }
 
-            response.raise_for_status()
-            all_schedules = response.json()
-
-            # Filter for employee; normalize schedule person ids to string
-            employee_schedules = [
-                s for s in all_schedules
-                if str(s.get("personId")) == person_id_str
-            ]
-
             return {
                 "company_id": company_id,
                 "person_id": person_id_str,
@@ -255,6 +1315,56 @@ class ShiftWorkServer:
             logger.error("API error while getting schedules", exc_info=True)
             raise RuntimeError("API error")
 
+    async def _get_schedules_paged_impl(self, arguments: dict, auth_token: str | None = None) -> dict:
+        """Implementation for one page of filtered schedules from /schedules/paged"""
+        company_id = arguments.get("company_id")
+        if not company_id:
+            raise ValueError("company_id is required")
+
+        try:
+            page = max(int(arguments.get("page") or 1), 1)
+            page_size = min(max(int(arguments.get("page_size") or PAGED_PAGE_SIZE), 1), 1000)
+        except (TypeError, ValueError):
+            raise ValueError("page and page_size must be integers")
+
+        params = {"page": page, "pageSize": page_size}
+        for arg, param in (("person_id", "personId"), ("location_id", "locationId"), ("start_date", "startDate"),
+                           ("end_date", "endDate"), ("search_query", "searchQuery")):
+            value = arguments.get(arg)
+            if value is not None and value != "":
+                params[param] = value
+        if arguments.get("include_voided"):
+            params["includeVoided"] = "true"
+
+        try:
+            body = await self._fetch_schedules_page(company_id, params, auth_token=auth_token)
+            if body is None:
+                return {
+                    "company_id": company_id,
+                    "error": f"Company {company_id} not found",
+                    "items": [],
+                    "total_count": 0,
+                    "page": page,
+                    "page_size": page_size,
+                    "total_pages": 0
+                }
+
+            return {
+                "company_id": company_id,
+                "items": body.get("items") or [],
+                "total_count": body.get("totalCount", 0),
+                "page": body.get("page", page),
+                "page_size": body.get("pageSize", page_size),
+                "total_pages": body.get("totalPages", 0),
+                "timestamp": datetime.now().isoformat()
+            }
+        except httpx.RequestError:
+            logger.error("Network error when contacting API", exc_info=True)
+            raise RuntimeError("Network error: is the API server reachable?")
+        except Exception:
+            logger.error("API error while getting paged schedules", exc_info=True)
+            raise RuntimeError("API error")
+
     async def _get_people_with_unpublished_schedules_impl(self, arguments: dict, auth_token: str | None = None) -> dict:
         """Implementation for listing people with unpublished schedules"""
         company_id = arguments.get("company_id")
@@ -271,14 +1381,11 @@ class ShiftWorkServer:
             if end_date:
                 params["endDate"] = end_date
 
-            response = await self._http_get(f"/api/companies/{company_id}/people/unpublished-schedules", params=params, auth_token=auth_token)
+            people, _ = await self._http_get_json(f"/api/companies/{company_id}/people/unpublished-schedules", params=params, auth_token=auth_token)
 
-            if response.status_code == 404:
+            if people is None:
                 return {"company_id": company_id, "total_people": 0, "people": [], "message": "No people with unpublished schedules found"}
 
-            response.raise_for_status()
-            people = response.json()
-
             return {
                 "company_id": company_id,
                 "total_people": len(people),
@@ -292,10 +1399,58 @@ class ShiftWorkServer:
             logger.error("API error while getting unpublished schedules", exc_info=True)
             raise RuntimeError("API error")
 
+    async def _get_company_regional_settings_impl(self, arguments: dict, auth_token: str | None = None) -> dict:
+        """Implementation for a company's regional settings (language, time zone, formats)"""
+        company_id = arguments.get("company_id")
+        if not company_id:
+            raise ValueError("company_id is required")
+
+        try:
+            settings, _ = await self._http_get_json(f"/api/companies/{company_id}/settings", auth_token=auth_token)
+
+            if settings is None:
+                return {"company_id": company_id, "error": "Company settings not found"}
+
+            return {
+                "company_id": company_id,
+                "settings": {field: settings.get(field) for field in REGIONAL_SETTINGS_FIELDS},
+                "timestamp": datetime.now().isoformat()
+            }
+        except httpx.RequestError:
+            logger.error("Network error when contacting API", exc_info=True)
+            raise RuntimeError("Network error: is the API server reachable?")
+        except Exception:
+            logger.error("API error while getting company settings", exc_info=True)
+            raise RuntimeError("API error")
+
     def _setup_http_routes(self):
         """Setup HTTP routes with optional auth and tightened CORS"""
         self.routes = web.RouteTableDef()
 
+        # Metrics middleware (outermost, so auth failures and shed requests are counted too)
+        @web.middleware
+        async def metrics_middleware(request, handler):
+            resource = request.match_info.route.resource
+            route = resource.canonical if resource is not None else "<unmatched>"
+            started = time.perf_counter()
+            status = 500
+            response = None
+            try:
+                response = await handler(request)
+                status = response.status
+                return response
+            except web.HTTPException as e:
+                status = e.status
+                raise
+            finally:
+                self.m_http_requests.inc(route, request.method, str(status))
+                self.m_http_duration.observe(time.perf_counter() - started, route)
+                if response is not None:
+                    # Streamed responses have already been written; plain ones are sent after the middleware returns
+                    size = response.body_length if response.prepared else response.content_length
+                    if size:
+                        self.m_http_response_bytes.observe(size, route)
+
         # Authentication middleware
         @web.middleware
         async def auth_middleware(request, handler):
@@ -323,28 +1478,87 @@ class ShiftWorkServer:
                 })
             return await handler(request)
 
+        # Helper to extract the Bearer token from an incoming request
+        def _extract_token(req) -> str | None:
+            auth = req.headers.get('Authorization', '')
+            if auth.startswith('Bearer '):
+                return auth.split(' ', 1)[1].strip()
+            return None
+
+        # Admission control middleware (runs after auth, so rejected credentials never take a slot)
+        @web.middleware
+        async def admission_middleware(request, handler):
+            if not ADMISSION_CONTROL or request.path in ADMISSION_EXEMPT_PATHS or request.method == "OPTIONS":
+                return await handler(request)
+            resource = request.match_info.route.resource
+            # Unmatched paths share one limiter so arbitrary URLs cannot create new ones
+            limiter = self.admission.limiter(resource.canonical if resource is not None else "<unmatched>")
+            # Fair share is per API token, falling back to the client address for anonymous callers
+            caller = _token_scope(_extract_token(request)) or (request.remote or "")
+            try:
+                await limiter.acquire(caller)
+            except Overloaded as e:
+                logger.warning(f"Shedding {request.method} {request.path}: {e.reason}")
+                response = _http_error_response("Server overloaded, retry later", status=503)
+                response.headers["Retry-After"] = str(e.retry_after)
+                return response
+            started = time.monotonic()
+            try:
+                return await handler(request)
+            finally:
+                limiter.release(time.monotonic() - started)
+
         # Health check endpoint
         @self.routes.get('/health')
         async def health_check(request):
-            return web.json_response({
+            return _json_response({
                 "status": "healthy",
                 "timestamp": datetime.now().isoformat(),
                 "service": "shiftwork-mcp-server",
-                "version": "1.0.0"
+                "version": "1.0.0",
+                "worker": {"slot": self.worker.slot, "pid": os.getpid()} if self.worker else None,
+                "cache": {
+                    "schedules": self.schedule_cache.stats(),
+                    "conditional": self.conditional_store.stats(),
+                    "shared": self.shared_cache.stats() if self.shared_cache else {"backend": "memory"}
+                },
+                "webhooks": dict(self.webhook_stats),
+                "admission": {"enabled": ADMISSION_CONTROL, "routes": self.admission.stats()},
+                "event_loop": {"enabled": LOOP_MONITOR, **self.loop_monitor.stats()},
+                "offload": {**self.offloader.stats(), "min_bytes": OFFLOAD_MIN_BYTES, "min_rows": OFFLOAD_MIN_ROWS},
+                "upstream_pool": {
+                    **self.pool_stats.stats(),
+                    "http2": HTTPX_HTTP2 and HTTP2_AVAILABLE,
+                    "max_connections": HTTPX_MAX_CONNECTIONS,
+                    "max_keepalive_connections": HTTPX_MAX_KEEPALIVE_CONNECTIONS,
+                    "keepalive_expiry_seconds": HTTPX_KEEPALIVE_EXPIRY
+                },
+                "retry_budget": self.retry_budget.stats(),
+                "circuit_breakers": {label: breaker.stats() for label, breaker in self.breakers.items()},
+                "hedging": {
+                    "enabled": HEDGE_REQUESTS,
+                    "percentile": HEDGE_PERCENTILE,
+                    **self.hedge_stats,
+                    "budget": self.hedge_budget.stats(),
+                    "delays_ms": {
+                        label: round(1000 * max(delay, HEDGE_MIN_DELAY), 3)
+                        for label, delay in ((label, t.percentile(HEDGE_PERCENTILE)) for label, t in self.latencies.items())
+                        if delay is not None
+                    }
+                }
             })
 
+        # Prometheus scrape endpoint
+        @self.routes.get('/metrics')
+        async def metrics_endpoint(request):
+            text = await self._group_metrics() if self.worker else self.metrics.render()
+            return web.Response(body=text.encode("utf-8"), headers={"Content-Type": metrics.CONTENT_TYPE})
+
         # Ping endpoint
         @self.routes.get('/ping')
         @self.routes.post('/ping')
         async def ping_endpoint(request):
-            return web.json_response({"message": "pong - server is running", "timestamp": datetime.now().isoformat()})
-
-        # Helper to extract the Bearer token from an incoming request
-        def _extract_token(req) -> str | None:
-            auth = req.headers.get('Authorization', '')
-            if auth.startswith('Bearer '):
-                return auth.split(' ', 1)[1].strip()
-            return None
+            return _json_response({"message": "pong - server is running", "timestamp": datetime.now().isoformat()})
 
         # Get employee schedules endpoint
         @self.routes.get('/api/employees/{company_id}/{person_id}/schedules')
@@ -352,13 +1566,16 @@ class ShiftWorkServer:
             company_id = request.match_info['company_id']
             person_id = request.match_info['person_id']
             try:
-                result = await self._get_employee_schedules_impl(
-                    {"company_id": company_id, "person_id": person_id},
-                    auth_token=_extract_token(request),
-                )
-                return web.json_response(result)
+                async with deadline_scope(_tool_timeout("get_employee_schedules", request.headers.get(DEADLINE_HEADER))):
+                    result = await self._get_employee_schedules_impl(
+                        {"company_id": company_id, "person_id": person_id},
+                        auth_token=_extract_token(request),
+                    )
+                return await _stream_json_response(request, result, "schedules")
             except ValueError as e:
                 return _http_error_response(str(e), status=400)
+            except TimeoutError:
+                return _http_error_response("Deadline exceeded", status=504)
             except Exception as e:
                 logger.error(f"HTTP endpoint error: {e}", exc_info=True)
                 return _http_error_response("Internal server error", status=500)
@@ -368,12 +1585,16 @@ class ShiftWorkServer:
         async def post_schedules_endpoint(request):
             try:
                 data = await request.json()
-                result = await self._get_employee_schedules_impl(data, auth_token=_extract_token(request))
-                return web.json_response(result)
+                timeout = _tool_timeout("get_employee_schedules", request.headers.get(DEADLINE_HEADER))
+                async with deadline_scope(timeout):
+                    result = await self._get_employee_schedules_impl(data, auth_token=_extract_token(request))
+                return await _stream_json_response(request, result, "schedules")
             except json.JSONDecodeError:
                 return _http_error_response("Invalid JSON in request body", status=400)
             except ValueError as e:
                 return _http_error_response(str(e), status=400)
+            except TimeoutError:
+                return _http_error_response("Deadline exceeded", status=504)
             except Exception as e:
                 logger.error(f"HTTP POST endpoint error: {e}", exc_info=True)
                 return _http_error_response("Internal server error", status=500)
@@ -386,13 +1607,17 @@ class ShiftWorkServer:
             end_date = request.query.get('endDate')
 
             try:
-                result = await self._get_people_with_unpublished_schedules_impl(
-                    {"company_id": company_id, "start_date": start_date, "end_date": end_date},
-                    auth_token=_extract_token(request),
-                )
-                return web.json_response(result)
+                timeout = _tool_timeout("get_people_with_unpublished_schedules", request.headers.get(DEADLINE_HEADER))
+                async with deadline_scope(timeout):
+                    result = await self._get_people_with_unpublished_schedules_impl(
+                        {"company_id": company_id, "start_date": start_date, "end_date": end_date},
+                        auth_token=_extract_token(request),
+                    )
+                return await _stream_json_response(request, result, "people")
             except ValueError as e:
                 return _http_error_response(str(e), status=400)
+            except TimeoutError:
+                return _http_error_response("Deadline exceeded", status=504)
             except Exception as e:
                 logger.error(f"HTTP endpoint error: {e}", exc_info=True)
                 return _http_error_response("Internal server error", status=500)
@@ -401,11 +1626,13 @@ class ShiftWorkServer:
         @self.routes.get('/api/tools')
         async def list_tools_endpoint(request):
             tools = [
-                {"name": "get_employee_schedules", "description": "Get all schedules for a specific employee", "parameters": {"company_id": "string (required)", "person_id": "string (required)"}},
-                {"name": "get_people_with_unpublished_schedules", "description": "List people who have unpublished schedules", "parameters": {"company_id": "string (required)", "start_date": "string (optional, ISO date/time)", "end_date": "string (optional, ISO date/time)"}},
+                {"name": "get_employee_schedules", "description": "Get all schedules for a specific employee", "parameters": {"company_id": "string (required)", "person_id": "string (required)", "timeout_seconds": "number (optional)"}},
+                {"name": "get_people_with_unpublished_schedules", "description": "List people who have unpublished schedules", "parameters": {"company_id": "string (required)", "start_date": "string (optional, ISO date/time)", "end_date": "string (optional, ISO date/time)", "timeout_seconds": "number (optional)"}},
+                {"name": "get_schedules_paged", "description": "Paginated, filtered schedules (preferred for large datasets)", "parameters": {"company_id": "string (required)", "person_id": "integer (optional)", "location_id": "integer (optional)", "start_date": "string (optional, ISO date)", "end_date": "string (optional, ISO date)", "search_query": "string (optional)", "page": "integer (optional, default 1)", "page_size": "integer (optional, default 200, max 1000)", "include_voided": "boolean (optional)", "timeout_seconds": "number (optional)"}},
+                {"name": "get_company_regional_settings", "description": "A company's language, time zone and date/time formats", "parameters": {"company_id": "string (required)", "timeout_seconds": "number (optional)"}},
                 {"name": "ping", "description": "Test server connectivity", "parameters": {}}
             ]
-            return web.json_response({"tools": tools, "total_tools": len(tools), "timestamp": datetime.now().isoformat()})
+            return _json_response({"tools": tools, "total_tools": len(tools), "timestamp": datetime.now().isoformat()})
 
         # Generic tool execution endpoint
         @self.routes.post('/api/tools/execute')
@@ -425,16 +1652,18 @@ class ShiftWorkServer:
                     "remote": request.remote
                 })
 
-                if tool_name == "ping":
-                    result = {"message": "pong - server is running"}
-                elif tool_name == "get_employee_schedules":
-                    result = await self._get_employee_schedules_impl(arguments, auth_token=_extract_token(request))
-                elif tool_name == "get_people_with_unpublished_schedules":
-                    result = await self._get_people_with_unpublished_schedules_impl(arguments, auth_token=_extract_token(request))
-                else:
-                    return _http_error_response(f"Unknown tool: {tool_name}", status=404)
+                try:
+                    result = await self._execute_tool(
+                        tool_name, arguments, auth_token=_extract_token(request), timeout=request.headers.get(DEADLINE_HEADER)
+                    )
+                except LookupError as e:
+                    return _http_error_response(str(e), status=404)
+                except TimeoutError:
+                    return _http_error_response("Deadline exceeded", status=504)
 
-                return web.json_response({"tool_name": tool_name, "result": result, "timestamp": datetime.now().isoformat()})
+                return _json_response(await self._encode(
+                    {"tool_name": tool_name, "result": result, "timestamp": datetime.now().isoformat()}, _result_rows(result)
+                ))
 
             except json.JSONDecodeError:
                 return _http_error_response("Invalid JSON in request body", status=400)
@@ -444,8 +1673,95 @@ class ShiftWorkServer:
                 logger.error(f"Tool execution error: {e}", exc_info=True)
                 return _http_error_response("Internal server error", status=500)
 
+        # Batch tool execution endpoint
+        @self.routes.post('/api/tools/execute_batch')
+        async def execute_tool_batch_endpoint(request):
+            try:
+                data = await request.json()
+                calls = data.get("calls") if isinstance(data, dict) else None
+
+                if not isinstance(calls, list) or not calls:
+                    return _http_error_response("calls must be a non-empty list", status=400)
+                if len(calls) > BATCH_MAX_ITEMS:
+                    return _http_error_response(f"At most {BATCH_MAX_ITEMS} calls per batch", status=400)
+
+                try:
+                    max_concurrency = int(data.get("max_concurrency") or BATCH_MAX_CONCURRENCY)
+                except (TypeError, ValueError):
+                    return _http_error_response("max_concurrency must be an integer", status=400)
+                # Callers may lower the cap but never raise it above the server limit
+                max_concurrency = min(max(max_concurrency, 1), BATCH_MAX_CONCURRENCY)
+
+                timeout = request.headers.get(DEADLINE_HEADER)
+                try:
+                    timeout = _tool_timeout(None, timeout) if timeout else None
+                except ValueError as e:
+                    return _http_error_response(str(e), status=400)
+
+                _log_audit_event("TOOL_EXECUTE_BATCH", {
+                    "tools": [c.get("tool_name") or c.get("name") for c in calls if isinstance(c, dict)],
+                    "count": len(calls),
+                    "remote": request.remote
+                })
+
+                results = await self._execute_tool_batch(
+                    calls, auth_token=_extract_token(request), max_concurrency=max_concurrency, timeout=timeout
+                )
+                succeeded = sum(1 for r in results if r["ok"])
+                return _json_response(await self._encode({
+                    "results": results,
+                    "total": len(results),
+                    "succeeded": succeeded,
+                    "failed": len(results) - succeeded,
+                    "timestamp": datetime.now().isoformat()
+                }, sum(_result_rows(r.get("result")) for r in results)))
+
+            except json.JSONDecodeError:
+                return _http_error_response("Invalid JSON in request body", status=400)
+            except Exception as e:
+                logger.error(f"Batch execution error: {e}", exc_info=True)
+                return _http_error_response("Internal server error", status=500)
+
+        # Webhook receiver for .NET API data-change notifications (HMAC-authenticated, not bearer)
+        @self.routes.post('/webhooks/shiftwork')
+        async def shiftwork_webhook_endpoint(request):
+            if not WEBHOOK_SECRET_KEY:
+                return _http_error_response("Webhook receiver not configured", status=503)
+
+            body = await request.read()
+            if not _verify_webhook_signature(body, request.headers.get("X-ShiftWork-Signature")):
+                self.webhook_stats["rejected"] += 1
+                _log_audit_event("WEBHOOK_REJECTED", {
+                    "reason": "invalid_signature",
+                    "path": request.path,
+                    "remote": request.remote
+                })
+                return _http_error_response("Unauthorized", status=401)
+
+            try:
+                payload = json_codec.loads(body)
+            except ValueError:
+                return _http_error_response("Invalid JSON in request body", status=400)
+            if not isinstance(payload, dict):
+                return _http_error_response("Webhook payload must be a JSON object", status=400)
+
+            self.webhook_stats["received"] += 1
+            try:
+                # Retried deliveries carry byte-identical bodies, so the body digest is the idempotency key
+                result = self._handle_webhook(payload, hashlib.sha256(body).digest())
+            except ValueError as e:
+                return _http_error_response(str(e), status=400)
+
+            _log_audit_event("WEBHOOK_RECEIVED", {
+                "event_type": payload.get("eventType"),
+                "status": result["status"],
+                "remote": request.remote
+            })
+            return _json_response({**result, "timestamp": datetime.now().isoformat()},
+                                  status=200 if result["status"] == "duplicate" else 202)
+
         # Build app and apply middleware + routes
-        self.http_app = web.Application(middlewares=[auth_middleware])
+        self.http_app = web.Application(middlewares=[metrics_middleware, auth_middleware, admission_middleware])
         self.http_app.add_routes(self.routes)
 
     async def _create_http_app(self):
@@ -473,19 +1789,82 @@ class ShiftWorkServer:
         """Run HTTP server (bind to configured host)"""
         try:
             app = await self._create_http_app()
-            runner = web.AppRunner(app)
+            runner = web.AppRunner(app, shutdown_timeout=GRACEFUL_SHUTDOWN_SECONDS)
             await runner.setup()
 
-            site = web.TCPSite(runner, LISTEN_HOST, self.http_port)
+            if self.worker is None:
+                site = web.TCPSite(runner, LISTEN_HOST, self.http_port)
+            elif self.worker.sock is not None:
+                site = web.SockSite(runner, self.worker.sock)
+            else:
+                # Every worker binds the port; the kernel balances connections between them
+                site = web.TCPSite(runner, LISTEN_HOST, self.http_port, reuse_port=True)
             await site.start()
-
-            logger.info(f"HTTP server started on http://{LISTEN_HOST}:{self.http_port}")
+            if LOOP_MONITOR:
+                self.loop_monitor.start()
+            if self.worker is not None:
+                await self._start_worker_metrics()
+                self.worker.ready.set()
+
+            logger.info(f"HTTP server started on http://{LISTEN_HOST}:{self.http_port}"
+                        + (f" (worker {self.worker.slot}, pid {os.getpid()})" if self.worker else ""))
             return runner
 
         except Exception as e:
             logger.error(f"Failed to start HTTP server: {e}", exc_info=True)
             raise
 
+    async def _start_worker_metrics(self):
+        """Serve this worker's own metrics on its Unix socket, for peers assembling /metrics"""
+        labels = {"worker": str(self.worker.slot)}
+
+        async def own_metrics(request):
+            return web.Response(body=metrics.with_labels(self.metrics.render(), labels).encode("utf-8"),
+                                headers={"Content-Type": metrics.CONTENT_TYPE})
+
+        app = web.Application()
+        app.router.add_get("/metrics", own_metrics)
+        self._metrics_runner = web.AppRunner(app, access_log=None)
+        await self._metrics_runner.setup()
+        # Bind under a private name, then rename over the slot's socket so a
+        # replacement worker takes over from the one it replaces atomically
+        path = self.worker.metrics_socket
+        staging = f"{path}.{os.getpid()}"
+        await web.UnixSite(self._metrics_runner, staging).start()
+        os.replace(staging, path)
+        self._metrics_socket_inode = os.stat(path).st_ino
+
+    async def _stop_worker_metrics(self):
+        if self._metrics_runner is None:
+            return
+        await self._metrics_runner.cleanup()
+        self._metrics_runner = None
+        path = self.worker.metrics_socket
+        try:
+            # Leave the socket alone if a replacement worker has already taken it over
+            if os.stat(path).st_ino == self._metrics_socket_inode:
+                os.unlink(path)
+        except OSError:
+            pass
+
+    async def _group_metrics(self) -> str:
+        """This worker's metrics merged with every peer's, each sample labelled with its worker"""
+        own = metrics.with_labels(self.metrics.render(), {"worker": str(self.worker.slot)})
+
+        async def fetch(path: str) -> str:
+            transport = httpx.AsyncHTTPTransport(uds=path)
+            async with httpx.AsyncClient(transport=transport, timeout=WORKER_METRICS_TIMEOUT) as client:
+                response = await client.get("http://worker/metrics")
+                response.raise_for_status()
+                return response.text
+
+        peers = self.worker.peer_sockets()
+        texts = await asyncio.gather(*(fetch(path) for path in peers), return_exceptions=True)
+        for path, text in zip(peers, texts):
+            if isinstance(text, Exception):
+                logger.warning(f"Could not collect metrics from {os.path.basename(path)}: {text!r}")
+        return metrics.merge([own] + [text for text in texts if isinstance(text, str)])
+
     async def run_mcp_server(self):
         logger.info("Starting MCP Server (stdio mode)...")
         try:
@@ -516,6 +1895,10 @@ class ShiftWorkServer:
             logger.error(f"Server error: {e}", exc_info=True)
             raise
         finally:
+            self.loop_monitor.stop()
+            self.offloader.shutdown()
+            if self.shared_cache:
+                await self.shared_cache.close()
             if self.http_client:
                 await self.http_client.aclose()
             if hasattr(self, 'http_runner') and http_runner:
@@ -523,31 +1906,63 @@ class ShiftWorkServer:
 
     async def run_http_only(self):
         logger.info(f"Starting HTTP-only ShiftWork Server on port {self.http_port}...")
+        http_runner = None
         try:
             http_runner = await self.run_http_server()
             logger.info("HTTP server running. Press Ctrl+C to stop.")
-            while True:
-                await asyncio.sleep(1)
+            # SIGTERM (docker stop, or the worker supervisor) stops accepting and drains in-flight requests
+            stopping = asyncio.Event()
+            try:
+                asyncio.get_running_loop().add_signal_handler(signal.SIGTERM, stopping.set)
+            except NotImplementedError:  # pragma: no cover - Windows
+                pass
+            await stopping.wait()
+            logger.info("SIGTERM received; draining in-flight requests")
         except KeyboardInterrupt:
             logger.info("HTTP server stopped by user")
         except Exception as e:
             logger.error(f"HTTP server error: {e}", exc_info=True)
             raise
         finally:
-            if self.http_client:
-                await self.http_client.aclose()
+            # Drain first: requests still in flight need the upstream client and the worker pool
             if http_runner:
                 await http_runner.cleanup()
+            await self._stop_worker_metrics()
+            self.loop_monitor.stop()
+            self.offloader.shutdown()
+            if self.shared_cache:
+                await self.shared_cache.close()
+            if self.http_client:
+                await self.http_client.aclose()
+
+def _run_worker(args, context: WorkerContext):
+    """Entry point of one --workers process"""
+    asyncio.run(ShiftWorkServer(http_port=args.port, worker=context).run_http_only())
 
-async def main():
+def _parse_args(argv=None):
     import argparse
 
     parser = argparse.ArgumentParser(description='ShiftWork MCP Server')
     parser.add_argument('--port', type=int, default=LISTEN_PORT, help='HTTP server port (default: 8080)')
     parser.add_argument('--mode', choices=['http', 'mcp', 'both'], default='http', help='Server mode: http (HTTP only), mcp (MCP only), both (default: http)')
-
-    args = parser.parse_args()
-
+    parser.add_argument('--workers', type=int, default=WORKERS, help='HTTP worker processes sharing the port (default: 1, or WORKERS); http mode only')
+
+    args = parser.parse_args(argv)
+    if args.workers > 1 and args.mode != 'http':
+        parser.error('--workers requires --mode http')
+    return args
+
+def run_workers(args) -> int:
+    """Supervise args.workers HTTP worker processes until SIGTERM/SIGINT"""
+    supervisor = Supervisor(
+        args.workers, lambda context: _run_worker(args, context),
+        host=LISTEN_HOST, port=args.port, shutdown_timeout=GRACEFUL_SHUTDOWN_SECONDS,
+    )
+    return supervisor.run()
+
+async def main(args=None):
+    if args is None:
+        args = _parse_args()
     server = ShiftWorkServer(http_port=args.port)
 
     try:
@@ -564,8 +1979,11 @@ async def main():
         sys.exit(1)
 
 if __name__ == "__main__":
+    _args = _parse_args()
+    if _args.workers > 1:
+        sys.exit(run_workers(_args))
     try:
-        asyncio.run(main())
+        asyncio.run(main(_args))
     except KeyboardInterrupt:
         print("Server interrupted")
     except Exception as e:
@@ -2,19 +2,30 @@
 """
 Fixed HTTP SMTP Client for ShiftWork Server
 Windows-compatible version with email import fixes
+
+Emails go out through smtp_pool.SMTPPool: authenticated SMTP connections are
+kept open and reused across messages, and sending never blocks the event loop.
+Bulk runs (bulk_email.run_bulk) handle many recipients concurrently, paced to
+the provider's send rate, with per-recipient retries and a result report.
+With an email_queue.EmailQueue, rendered messages are stored durably first and
+sent by drain workers, so an interrupted run resumes without resending or
+re-fetching anything.
 """
 
 import asyncio
 import json
 import logging
-import smtplib
-import ssl
 import sys
 from datetime import datetime
-from typing import Dict, List, Optional
+from typing import Callable, Dict, List, Optional, Union
 from dataclasses import dataclass
 import httpx
 
+from bulk_email import BulkReport, RecipientResult, TokenBucket, run_bulk
+from email_queue import EmailQueue, QueuedEmail, drain, idempotency_key
+from email_templates import EmailView, ScheduleEmailTemplates, templates_for
+from smtp_pool import SMTPError, SMTPPool
+
 # Try different email import approaches for Windows compatibility
 try:
     from email.mime.text import MIMEText
@@ -35,6 +46,9 @@ except ImportError:
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
+# Schedule pages requested per execute_batch call when prefetching a company (server BATCH_MAX_ITEMS is 200)
+COMPANY_PAGES_PER_BATCH = 20
+
 @dataclass
 class EmailConfig:
     """Email configuration settings"""
@@ -43,6 +57,21 @@ class EmailConfig:
     sender_email: str
     sender_password: str
     use_tls: bool = True
+    # Implicit TLS from the first byte (port 465) instead of STARTTLS
+    use_ssl: bool = False
+    # Authenticated connections kept open for reuse, and when to recycle them
+    pool_size: int = 4
+    max_messages_per_connection: int = 100
+    idle_timeout: float = 30.0
+    timeout: float = 30.0
+    # Provider send limit for bulk runs: messages per second, and how many may go at once
+    send_rate: float = 5.0
+    send_burst: int = 5
+    # Default email language, and whether to add an HTML alternative to the plain text
+    locale: str = "en"
+    html_email: bool = True
+    # Use each company's DefaultLanguage setting when a request names no locale; `locale` is the fallback
+    company_locale: bool = True
 
 @dataclass
 class ScheduleEmailData:
@@ -52,6 +81,8 @@ class ScheduleEmailData:
     recipient_email: str
     employee_name: Optional[str] = None
     schedules: Optional[List[Dict]] = None
+    # Email language, e.g. "es-MX"; when unset, the company's language (or EmailConfig.locale) is filled in
+    locale: Optional[str] = None
 
 class HTTPShiftWorkClient:
     """HTTP client to interact with the ShiftWork server"""
@@ -151,6 +182,65 @@ class HTTPShiftWorkClient:
             logger.error(f"Failed to execute tool {tool_name}: {e}")
             raise
     
+    async def execute_tools_batch(self, calls: List[dict], max_concurrency: Optional[int] = None) -> dict:
+        """Execute several tools in one request via /api/tools/execute_batch"""
+        await self._ensure_client()
+        try:
+            url = f"{self.base_url}/api/tools/execute_batch"
+            payload = {"calls": calls}
+            if max_concurrency:
+                payload["max_concurrency"] = max_concurrency
+            response = await self.client.post(url, json=payload)
+            response.raise_for_status()
+            return response.json()
+        except Exception as e:
+            logger.error(f"Failed to execute tool batch: {e}")
+            raise
+    
+    async def get_company_schedules(self, company_id: str, start_date: Optional[str] = None,
+                                    end_date: Optional[str] = None, page_size: int = 1000) -> Optional[List[dict]]:
+        """Get all of a company's non-voided schedules, optionally within a date window
+        
+        Page 1 gives the page count; the remaining pages are requested through
+        execute_batch, COMPANY_PAGES_PER_BATCH at a time. Pages that fail inside
+        a batch are retried on their own so errors surface as HTTP errors.
+        Returns None only when the server reports the company as not found; a
+        company without schedules gives an empty list (the paged endpoint
+        answers it with an empty page, where the full list answers 404).
+        """
+        # Voided schedules are left out, as by the per-employee endpoint
+        arguments = {"company_id": company_id, "page_size": page_size}
+        if start_date:
+            arguments["start_date"] = start_date
+        if end_date:
+            arguments["end_date"] = end_date
+        
+        first = (await self.execute_tool("get_schedules_paged", {**arguments, "page": 1}))["result"]
+        if "error" in first:
+            return None
+        schedules = list(first.get("items") or [])
+        total_pages = first.get("total_pages") or 1
+        
+        for start in range(2, total_pages + 1, COMPANY_PAGES_PER_BATCH):
+            pages = range(start, min(start + COMPANY_PAGES_PER_BATCH, total_pages + 1))
+            batch = await self.execute_tools_batch(
+                [{"tool_name": "get_schedules_paged", "arguments": {**arguments, "page": page}} for page in pages]
+            )
+            for page, entry in zip(pages, batch["results"]):
+                if entry.get("ok"):
+                    result = entry["result"]
+                else:
+                    result = (await self.execute_tool("get_schedules_paged", {**arguments, "page": page}))["result"]
+                schedules.extend(result.get("items") or [])
+        return schedules
+    
+    async def get_company_locale(self, company_id: str) -> Optional[str]:
+        """The company's DefaultLanguage setting (e.g. "es-MX"); None if the company has no settings"""
+        result = (await self.execute_tool("get_company_regional_settings", {"company_id": company_id}))["result"]
+        if "error" in result:
+            return None
+        return (result.get("settings") or {}).get("defaultLanguage") or None
+    
     async def list_tools(self) -> dict:
         """List available tools"""
         await self._ensure_client()
@@ -174,6 +264,21 @@ class HTTPScheduleEmailer:
     def __init__(self, email_config: EmailConfig, server_url: str = "http://localhost:8080"):
         self.config = email_config
         self.http_client = HTTPShiftWorkClient(server_url)
+        # company_id -> lookup of its DefaultLanguage, shared by every email to that company
+        self._company_locales: Dict[str, asyncio.Future] = {}
+        self.smtp_pool = SMTPPool(
+            email_config.smtp_server,
+            email_config.smtp_port,
+            username=email_config.sender_email if email_config.sender_password else None,
+            password=email_config.sender_password or None,
+            sender=email_config.sender_email,
+            starttls=email_config.use_tls and not email_config.use_ssl,
+            implicit_tls=email_config.use_ssl,
+            pool_size=email_config.pool_size,
+            max_messages_per_connection=email_config.max_messages_per_connection,
+            idle_timeout=email_config.idle_timeout,
+            timeout=email_config.timeout,
+        )
         
         if not EMAIL_IMPORTS_OK:
             logger.warning("Email functionality disabled due to import issues")
@@ -194,56 +299,45 @@ class HTTPScheduleEmailer:
             logger.error(f"Failed to initialize HTTP client: {e}")
             return False
     
+    def _email_view(self, email_data: ScheduleEmailData) -> EmailView:
+        """What the email templates need from a request"""
+        return EmailView(
+            company_id=email_data.company_id,
+            person_id=email_data.person_id,
+            recipient=email_data.recipient_email,
+            employee=email_data.employee_name or email_data.person_id,
+            sender=self.config.sender_email,
+            schedules=email_data.schedules,
+            error=getattr(email_data, 'error', None),
+        )
+    
+    def _templates(self, email_data: ScheduleEmailData) -> ScheduleEmailTemplates:
+        return templates_for(email_data.locale or self.config.locale)
+    
+    async def _company_locale(self, company_id: str) -> Optional[str]:
+        """The company's language, looked up once per company; None (use config.locale) if it cannot be loaded"""
+        task = self._company_locales.get(company_id)
+        if task is None:
+            task = self._company_locales[company_id] = asyncio.ensure_future(
+                self.http_client.get_company_locale(company_id)
+            )
+        try:
+            return await asyncio.shield(task)
+        except Exception as e:
+            # Not remembered, so the next email asks again; the email itself still goes out
+            if self._company_locales.get(company_id) is task:
+                del self._company_locales[company_id]
+            logger.warning(f"Could not load the language of company {company_id}, using {self.config.locale}: {e}")
+            return None
+    
+    async def _fill_locale(self, email_data: ScheduleEmailData):
+        """Set email_data.locale from the company's settings unless the request already names one"""
+        if email_data.locale is None and self.config.company_locale:
+            email_data.locale = await self._company_locale(str(email_data.company_id))
+    
     def _create_simple_email_body(self, email_data: ScheduleEmailData) -> str:
         """Create plain text email body"""
-        if email_data.schedules and len(email_data.schedules) > 0:
-            schedule_count = len(email_data.schedules)
-            body = f"""Subject: Work Schedule for {email_data.employee_name or email_data.person_id}
-From: {self.config.sender_email}
-To: {email_data.recipient_email}
-
-Hello,
-
-Here is the work schedule information for employee {email_data.employee_name or email_data.person_id}:
-
-Company ID: {email_data.company_id}
-Employee ID: {email_data.person_id}
-Total Schedules: {schedule_count}
-
-Schedule Details:
-"""
-            
-            for i, schedule in enumerate(email_data.schedules, 1):
-                body += f"\n--- Schedule {i} ---\n"
-                for key, value in schedule.items():
-                    body += f"{key}: {value}\n"
-                body += "\n"
-            
-            body += f"""
-This email was generated automatically on {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}.
-
-Best regards,
-ShiftWork Schedule System
-"""
-        else:
-            error_msg = ""
-            if hasattr(email_data, 'error') and email_data.error:
-                error_msg = f"\n\nError: {email_data.error}"
-            
-            body = f"""Subject: Work Schedule for {email_data.employee_name or email_data.person_id}
-From: {self.config.sender_email}
-To: {email_data.recipient_email}
-
-Hello,
-
-No schedules found for employee {email_data.employee_name or email_data.person_id} in company {email_data.company_id}.{error_msg}
-
-This email was generated automatically on {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}.
-
-Best regards,
-ShiftWork Schedule System
-"""
-        return body
+        return self._templates(email_data).render_raw(self._email_view(email_data))
     
     def _create_schedule_email(self, email_data: ScheduleEmailData):
         """Create email message with schedule information"""
@@ -251,119 +345,74 @@ ShiftWork Schedule System
             return self._create_simple_email_body(email_data)
         
         try:
-            msg = MIMEMultipart()
+            templates = self._templates(email_data)
+            view = self._email_view(email_data)
+            
+            # Plain text plus an HTML alternative; mail clients show the richest one they support
+            msg = MIMEMultipart('alternative') if self.config.html_email else MIMEMultipart()
             msg['From'] = self.config.sender_email
             msg['To'] = email_data.recipient_email
-            msg['Subject'] = f"Work Schedule for {email_data.employee_name or email_data.person_id}"
+            msg['Subject'] = templates.subject(view)
             
-            # Create email body
-            if email_data.schedules and len(email_data.schedules) > 0:
-                schedule_count = len(email_data.schedules)
-                body = f"""Hello,
-
-Here is the work schedule information for employee {email_data.employee_name or email_data.person_id}:
-
-Company ID: {email_data.company_id}
-Employee ID: {email_data.person_id}
-Total Schedules: {schedule_count}
-
-Schedule Details:
-"""
-                
-                for i, schedule in enumerate(email_data.schedules, 1):
-                    body += f"\n--- Schedule {i} ---\n"
-                    for key, value in schedule.items():
-                        body += f"{key}: {value}\n"
-                    body += "\n"
-                
-                body += f"""
-This email was generated automatically on {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}.
-
-Best regards,
-ShiftWork Schedule System
-"""
-            else:
-                error_msg = ""
-                if hasattr(email_data, 'error') and email_data.error:
-                    error_msg = f"\n\nError: {email_data.error}"
-                
-                body = f"""Hello,
-
-No schedules found for employee {email_data.employee_name or email_data.person_id} in company {email_data.company_id}.{error_msg}
-
-This email was generated automatically on {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}.
-
-Best regards,
-ShiftWork Schedule System
-"""
-            
-            msg.attach(MIMEText(body, 'plain'))
+            msg.attach(MIMEText(templates.render_text(view), 'plain'))
+            if self.config.html_email:
+                msg.attach(MIMEText(templates.render_html(view), 'html'))
             return msg
             
         except Exception as e:
             logger.error(f"Failed to create MIME message: {e}")
             return self._create_simple_email_body(email_data)
     
+    async def _fetch_schedules(self, email_data: ScheduleEmailData, use_post: bool = False):
+        """Fill email_data.schedules (and .error) from the HTTP server; raises on failure"""
+        logger.info(f"Fetching schedules for employee {email_data.person_id} in company {email_data.company_id}")
+        
+        if use_post:
+            schedule_result = await self.http_client.get_employee_schedules_post(
+                email_data.company_id, 
+                email_data.person_id
+            )
+        else:
+            schedule_result = await self.http_client.get_employee_schedules(
+                email_data.company_id, 
+                email_data.person_id
+            )
+        
+        # Update email data with fetched schedules
+        email_data.schedules = schedule_result.get("schedules", [])
+        
+        # Handle error case
+        if "error" in schedule_result:
+            email_data.error = schedule_result["error"]
+            logger.warning(f"API returned error: {schedule_result['error']}")
+    
     async def send_schedule_email(self, email_data: ScheduleEmailData, use_post: bool = False) -> bool:
         """Fetch schedules and send email"""
         try:
-            # Get schedules from HTTP server
-            logger.info(f"Fetching schedules for employee {email_data.person_id} in company {email_data.company_id}")
-            
-            if use_post:
-                schedule_result = await self.http_client.get_employee_schedules_post(
-                    email_data.company_id, 
-                    email_data.person_id
-                )
-            else:
-                schedule_result = await self.http_client.get_employee_schedules(
-                    email_data.company_id, 
-                    email_data.person_id
-                )
-            
-            # Update email data with fetched schedules
-            email_data.schedules = schedule_result.get("schedules", [])
-            
-            # Handle error case
-            if "error" in schedule_result:
-                email_data.error = schedule_result["error"]
-                logger.warning(f"API returned error: {schedule_result['error']}")
+            await self._fetch_schedules(email_data, use_post)
+            await self._fill_locale(email_data)
             
             # Create and send email
             message = self._create_schedule_email(email_data)
-            return self._send_smtp_email(message, email_data.recipient_email)
+            return await self._send_smtp_email(message, email_data.recipient_email)
             
         except Exception as e:
             logger.error(f"Failed to send schedule email: {e}")
             return False
     
-    def _send_smtp_email(self, message, recipient_email: str) -> bool:
-        """Send email via SMTP - compatible with both MIME and simple text"""
+    async def _send_smtp_email(self, message, recipient_email: str) -> bool:
+        """Send email on a pooled SMTP connection - compatible with both MIME and simple text"""
         try:
-            # Create SMTP session
-            if self.config.use_tls:
-                context = ssl.create_default_context()
-                server = smtplib.SMTP(self.config.smtp_server, self.config.smtp_port)
-                server.starttls(context=context)
-            else:
-                server = smtplib.SMTP(self.config.smtp_server, self.config.smtp_port)
+            # MIME messages are serialized by the pool; simple text is sent as-is
+            if not (EMAIL_IMPORTS_OK and hasattr(message, 'as_bytes')):
+                message = str(message)
             
-            # Login
-            server.login(self.config.sender_email, self.config.sender_password)
-            
-            # Send email - handle both MIME and simple text
-            if EMAIL_IMPORTS_OK and hasattr(message, 'as_string'):
-                text = message.as_string()
-            else:
-                text = str(message)
-            
-            server.sendmail(self.config.sender_email, recipient_email, text)
-            server.quit()
+            await self.smtp_pool.send_message(message, self.config.sender_email, [recipient_email])
             
             logger.info(f"Email sent successfully to {recipient_email}")
             return True
             
-        except Exception as e:
+        except (SMTPError, ValueError) as e:
             logger.error(f"Failed to send email via SMTP: {e}")
             return False
     
@@ -380,16 +429,149 @@ ShiftWork Schedule System
     
     async def send_bulk_schedule_emails(self, email_requests: List[ScheduleEmailData]) -> Dict[str, bool]:
         """Send multiple schedule emails"""
-        results = {}
+        report = await self.run_bulk_schedule_emails(email_requests)
+        return report.as_results()
+    
+    async def _prefetch_company(self, company_id: str, start_date: Optional[str],
+                                end_date: Optional[str]) -> Optional[Dict[str, List[dict]]]:
+        """One company's schedules partitioned by personId; None if the company is unknown"""
+        logger.info(f"Prefetching schedules for company {company_id}")
+        schedules = await self.http_client.get_company_schedules(company_id, start_date, end_date)
+        if schedules is None:
+            return None
+        by_person: Dict[str, List[dict]] = {}
+        for schedule in schedules:
+            by_person.setdefault(str(schedule.get("personId")), []).append(schedule)
+        return by_person
+    
+    async def run_bulk_schedule_emails(self, email_requests: List[ScheduleEmailData], use_post: bool = False,
+                                       concurrency: int = 16, max_attempts: int = 4,
+                                       progress: Optional[Callable[[BulkReport, RecipientResult], None]] = None,
+                                       prefetch: bool = True, start_date: Optional[str] = None,
+                                       end_date: Optional[str] = None,
+                                       queue: Optional[EmailQueue] = None) -> BulkReport:
+        """Send schedule emails to many recipients concurrently and report per-recipient results.
         
+        Up to `concurrency` recipients are fetched and rendered at once; sends
+        are paced by config.send_rate/send_burst and share the SMTP pool.
+        With prefetch, each company's schedules (within start_date/end_date, if
+        given) are downloaded once and split by employee, instead of once per
+        recipient; without it, or when the gateway has no get_schedules_paged
+        tool, every recipient is fetched on its own.
+        With a queue, rendered messages are stored in it rather than sent (a
+        (company, person, schedule version) already queued or sent is skipped);
+        drain_email_queue() delivers them.
+        """
+        # Recipients of the same company run together, so its schedules can be dropped once they are done
+        email_requests = sorted(email_requests, key=lambda email_data: str(email_data.company_id))
+        remaining: Dict[str, int] = {}
         for email_data in email_requests:
-            key = f"{email_data.person_id}@{email_data.company_id}"
-            results[key] = await self.send_schedule_email(email_data)
-            
-            # Small delay between emails
-            await asyncio.sleep(1)
+            remaining[str(email_data.company_id)] = remaining.get(str(email_data.company_id), 0) + 1
+        companies: Dict[str, asyncio.Future] = {}
+        
+        async def company_schedules(company_id: str) -> Optional[Dict[str, List[dict]]]:
+            # Single flight per company; a failed prefetch is started again by the next retry
+            task = companies.get(company_id)
+            if task is None or (task.done() and (task.cancelled() or task.exception() is not None)):
+                task = companies[company_id] = asyncio.ensure_future(
+                    self._prefetch_company(company_id, start_date, end_date)
+                )
+            return await asyncio.shield(task)
+        
+        paged_tool = [True]
+        
+        async def fetch(email_data: ScheduleEmailData):
+            company_id = str(email_data.company_id)
+            if not paged_tool[0]:
+                return await self._fetch_schedules(email_data, use_post)
+            try:
+                by_person = await company_schedules(company_id)
+            except httpx.HTTPStatusError as e:
+                if e.response.status_code != 404:
+                    raise
+                # A gateway without get_schedules_paged: every recipient is fetched on its own
+                if paged_tool[0]:
+                    logger.warning(f"Company prefetch unavailable ({e}); fetching each employee's schedules instead")
+                    paged_tool[0] = False
+                return await self._fetch_schedules(email_data, use_post)
+            if by_person is None:
+                email_data.schedules = []
+                email_data.error = f"Company {company_id} not found"
+            else:
+                email_data.schedules = by_person.get(str(email_data.person_id), [])
+        
+        def prepared(email_data: ScheduleEmailData):
+            # Once per recipient, after its last prepare attempt; retries still find the company's schedules
+            company_id = str(email_data.company_id)
+            remaining[company_id] -= 1
+            if remaining[company_id] == 0:
+                companies.pop(company_id, None)
+        
+        async def prepare(email_data: ScheduleEmailData):
+            if prefetch:
+                await fetch(email_data)
+            else:
+                await self._fetch_schedules(email_data, use_post)
+            await self._fill_locale(email_data)
+            if queue is not None and await queue.contains(
+                    idempotency_key(email_data.company_id, email_data.person_id, email_data.schedules)):
+                return None  # already queued or sent; nothing to render
+            message = self._create_schedule_email(email_data)
+            # Simple text fallback is sent as-is
+            return message if EMAIL_IMPORTS_OK and hasattr(message, 'as_bytes') else str(message)
+        
+        async def send(email_data: ScheduleEmailData, message):
+            await self.smtp_pool.send_message(message, self.config.sender_email, [email_data.recipient_email])
+        
+        async def enqueue(email_data: ScheduleEmailData, message):
+            key = idempotency_key(email_data.company_id, email_data.person_id, email_data.schedules)
+            if message is None:
+                logger.info(f"Schedule email {key} already queued or sent; skipping")
+                return
+            data = message.as_bytes() if not isinstance(message, str) else message.encode("utf-8")
+            if not await queue.enqueue(key, email_data.recipient_email, self.config.sender_email, data):
+                logger.info(f"Schedule email {key} already queued or sent; skipping")
+        
+        return await run_bulk(
+            email_requests,
+            key=lambda email_data: f"{email_data.person_id}@{email_data.company_id}",
+            prepare=prepare,
+            send=send if queue is None else enqueue,
+            limiter=TokenBucket(self.config.send_rate, self.config.send_burst) if queue is None else None,
+            concurrency=concurrency,
+            max_attempts=max_attempts,
+            progress=progress,
+            prepared=prepared if prefetch else None,
+        )
+    
+    async def drain_email_queue(self, queue: EmailQueue, workers: int = 4,
+                                wait_for_retries: bool = True) -> Dict[str, int]:
+        """Send everything waiting in the queue (also what an interrupted run left behind)"""
+        async def send(email: QueuedEmail):
+            await self.smtp_pool.send_message(email.message, email.sender, [email.recipient])
+        
+        counts = await drain(
+            queue, send, workers=workers,
+            limiter=TokenBucket(self.config.send_rate, self.config.send_burst),
+            wait_for_retries=wait_for_retries,
+        )
+        logger.info(f"Email queue drained: {counts}; queue now {await queue.stats()}")
+        return counts
+    
+    async def send_queued_schedule_emails(self, email_requests: List[ScheduleEmailData], queue: Union[EmailQueue, str],
+                                          workers: int = 4, **options) -> dict:
+        """Queue schedule emails for every request, then deliver the queue.
         
-        return results
+        Safe to run again after a crash: sent messages are not sent again,
+        queued ones are sent without being fetched or rendered again.
+        queue may be an open EmailQueue, or the path of one to open (and close
+        again when done). Options are passed on to run_bulk_schedule_emails.
+        """
+        if isinstance(queue, str):
+            async with EmailQueue(queue) as opened:
+                return await self.send_queued_schedule_emails(email_requests, opened, workers, **options)
+        report = await self.run_bulk_schedule_emails(email_requests, queue=queue, **options)
+        return {"queued": report.summary(), "delivery": await self.drain_email_queue(queue, workers)}
     
     async def get_server_info(self) -> dict:
         """Get information about available tools and server status"""
@@ -408,6 +590,7 @@ ShiftWork Schedule System
     
     async def cleanup(self):
         """Cleanup resources"""
+        await self.smtp_pool.close()
         await self.http_client.close()
 
 # Example usage with better error handling
@@ -0,0 +1,97 @@
+#!/usr/bin/env python3
+"""
+Pluggable JSON serialization for the ShiftWork gateway
+
+Uses msgspec when installed, then orjson, then the stdlib json module.
+msgspec comes first because it also encodes schedule_record.Schedule
+structs natively; other backends go through their to_dict().
+Set JSON_BACKEND=orjson|msgspec|json to force a backend. All backends
+encode datetime/date values as ISO 8601 strings and produce UTF-8 bytes,
+so responses can be written without an intermediate str.
+"""
+
+import json
+import logging
+import os
+from datetime import date, datetime
+from decimal import Decimal
+from typing import Any, Callable, Optional
+from uuid import UUID
+
+logger = logging.getLogger(__name__)
+
+try:
+    import orjson
+except ImportError:  # pragma: no cover - optional dependency
+    orjson = None
+
+try:
+    import msgspec
+except ImportError:  # pragma: no cover - optional dependency
+    msgspec = None
+
+
+def _default(obj: Any) -> Any:
+    """Fallback conversions for types the stdlib encoder does not know"""
+    if isinstance(obj, (datetime, date)):
+        return obj.isoformat()
+    if isinstance(obj, (Decimal, UUID)):
+        return str(obj)
+    if isinstance(obj, (set, frozenset, tuple)):
+        return list(obj)
+    if hasattr(obj, "to_dict"):
+        return obj.to_dict()
+    raise TypeError(f"Object of type {type(obj).__name__} is not JSON serializable")
+
+
+def _stdlib_dumps(obj: Any) -> bytes:
+    return json.dumps(obj, default=_default, ensure_ascii=False).encode("utf-8")
+
+
+def _stdlib_loads(data) -> Any:
+    return json.loads(data)
+
+
+def select_backend(requested: Optional[str] = None):
+    """Return (name, dumps, loads) for the requested backend, or the fastest available one"""
+    available = {"json": (_stdlib_dumps, _stdlib_loads)}
+    if msgspec is not None:
+        encoder = msgspec.json.Encoder(enc_hook=_default)
+        decoder = msgspec.json.Decoder()
+
+        def msgspec_dumps(obj: Any) -> bytes:
+            try:
+                return encoder.encode(obj)
+            except (TypeError, OverflowError):
+                # e.g. non-str dict keys or out-of-range ints
+                return _stdlib_dumps(obj)
+
+        available["msgspec"] = (msgspec_dumps, decoder.decode)
+    if orjson is not None:
+        def orjson_dumps(obj: Any) -> bytes:
+            try:
+                return orjson.dumps(obj, default=_default, option=orjson.OPT_NON_STR_KEYS)
+            except TypeError:
+                # orjson rejects integers wider than 64 bits
+                return _stdlib_dumps(obj)
+
+        available["orjson"] = (orjson_dumps, orjson.loads)
+
+    if requested:
+        if requested in available:
+            return (requested,) + available[requested]
+        logger.warning(f"JSON_BACKEND={requested} is not available; falling back")
+    for name in ("msgspec", "orjson", "json"):
+        if name in available:
+            return (name,) + available[name]
+
+
+dumps: Callable[[Any], bytes]
+loads: Callable[[Any], Any]
+BACKEND, dumps, loads = select_backend(os.environ.get("JSON_BACKEND", "").strip().lower() or None)
+logger.info(f"JSON backend: {BACKEND}")
+
+
+def dumps_str(obj: Any) -> str:
+    """Encode to str, for APIs such as MCP TextContent that need text"""
+    return dumps(obj).decode("utf-8")
@@ -0,0 +1,154 @@
+#!/usr/bin/env python3
+"""
+Incremental JSON array parsing for large upstream payloads
+
+iter_json_array() consumes an async iterator of byte chunks (e.g. httpx's
+response.aiter_bytes()) holding a top-level JSON array and yields its elements
+one at a time. Only the unparsed tail of the body is buffered, so a caller that
+keeps a subset of the elements never holds the whole raw body or the whole
+parsed list in memory.
+
+iter_json_array_batches() does the same for arrays of objects without building
+intermediate Python values: each batch of complete elements received so far
+is handed to a decoder (e.g. msgspec decoding straight into typed records).
+"""
+
+import codecs
+import json
+import re
+from typing import Any, AsyncIterator, Callable, List
+
+_WS = re.compile(r"[ \t\n\r]*")
+_WS_BYTES = re.compile(rb"[ \t\n\r]*")
+_NUMBER_END = " \t\n\r,]"
+
+_START, _FIRST, _VALUE, _SEP, _DONE = range(5)
+
+# Where one object element ends and the next begins; only a candidate until decoding confirms it
+_OBJECT_GAP = re.compile(rb"}[ \t\n\r]*,[ \t\n\r]*{")
+_MAX_CUT_TRIES = 4
+
+
+class _ArrayScanner:
+    """Push parser for the elements of a single top-level JSON array"""
+
+    def __init__(self):
+        self._decoder = json.JSONDecoder()
+        self._buf = ""
+        self._pos = 0
+        self._state = _START
+
+    @property
+    def done(self) -> bool:
+        return self._state == _DONE
+
+    def feed(self, text: str, final: bool = False) -> List[Any]:
+        # Drop the consumed prefix once per chunk rather than once per element
+        buf = self._buf = self._buf[self._pos:] + text
+        pos = 0
+        n = len(buf)
+        items = []
+        while True:
+            pos = _WS.match(buf, pos).end()
+            if pos >= n:
+                break
+            ch = buf[pos]
+            if self._state == _START:
+                if ch != "[":
+                    raise ValueError("Expected a JSON array")
+                self._state = _FIRST
+                pos += 1
+            elif self._state == _SEP:
+                if ch == ",":
+                    self._state = _VALUE
+                elif ch == "]":
+                    self._state = _DONE
+                else:
+                    raise ValueError(f"Unexpected character {ch!r} in JSON array")
+                pos += 1
+            elif self._state == _DONE:
+                raise ValueError("Unexpected data after JSON array")
+            else:
+                if ch == "]" and self._state == _FIRST:
+                    self._state = _DONE
+                    pos += 1
+                    continue
+                try:
+                    value, end = self._decoder.raw_decode(buf, pos)
+                except json.JSONDecodeError:
+                    if final:
+                        raise
+                    break  # element is incomplete; wait for more data
+                if ch not in '{["' and (end == n or buf[end] not in _NUMBER_END):
+                    # A bare number such as "-1" may continue in the next chunk
+                    if final:
+                        raise ValueError("Malformed number in JSON array")
+                    break
+                items.append(value)
+                self._state = _SEP
+                pos = end
+        self._pos = pos
+        return items
+
+
+async def iter_json_array(chunks: AsyncIterator[bytes]) -> AsyncIterator[Any]:
+    """Yield each element of the JSON array carried by an async stream of byte chunks"""
+    scanner = _ArrayScanner()
+    utf8 = codecs.getincrementaldecoder("utf-8")()
+    async for chunk in chunks:
+        for item in scanner.feed(utf8.decode(chunk)):
+            yield item
+    for item in scanner.feed(utf8.decode(b"", final=True), final=True):
+        yield item
+    if not scanner.done:
+        raise ValueError("Truncated JSON array")
+
+
+def _decode_complete(buf: bytearray, decode: Callable[[bytes], List[Any]]):
+    """Decode the longest run of whole elements at the start of buf; returns (items, bytes consumed)"""
+    gaps = list(_OBJECT_GAP.finditer(buf))
+    for gap in reversed(gaps[-_MAX_CUT_TRIES:]):
+        try:
+            items = decode(b"[" + bytes(buf[:gap.start() + 1]) + b"]")
+        except ValueError:
+            continue  # the "},{" was inside a string or a nested array
+        return items, gap.end() - 1
+    return None, 0
+
+
+async def iter_json_array_batches(chunks: AsyncIterator[bytes],
+                                  decode: Callable[[bytes], List[Any]]) -> AsyncIterator[List[Any]]:
+    """Yield the elements of a JSON array of objects, streamed as byte chunks, in decoded batches.
+
+    decode() receives a complete JSON array holding the elements that have
+    fully arrived and returns them decoded. The body is cut only between
+    objects, and a cut is kept only if decode() accepts the result, so a
+    "},{" inside a string or nested array is never taken for a boundary.
+    Raises ValueError for a body that is not a JSON array, or is malformed
+    or truncated.
+    """
+    buf = bytearray()
+    started = False
+    async for chunk in chunks:
+        buf += chunk
+        if not started:
+            start = _WS_BYTES.match(buf).end()
+            if start == len(buf):
+                continue
+            if buf[start] != ord("["):
+                raise ValueError("Expected a JSON array")
+            del buf[:start + 1]
+            started = True
+        items, consumed = _decode_complete(buf, decode)
+        if consumed:
+            del buf[:consumed]
+            if items:
+                yield items
+    if not started:
+        raise ValueError("Expected a JSON array")
+    try:
+        items = decode(b"[" + bytes(buf))
+    except ValueError as e:
+        raise ValueError(f"Malformed or truncated JSON array: {e}") from e
+    if items:
+        yield items
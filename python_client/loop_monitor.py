@@ -0,0 +1,109 @@
+#!/usr/bin/env python3
+"""
+Event-loop lag monitor and blocked-loop detector
+
+- A heartbeat task sleeps for `interval` and records how late the loop woke it
+  (scheduling lag); recent samples give p50/p90/p99 for /health and /metrics
+- A watchdog thread checks the heartbeat; when the loop has not run it for longer
+  than `block_threshold`, it logs the loop thread's current stack, i.e. the
+  callback that is blocking (a large json.dumps, synchronous SMTP, ...)
+
+The watchdog only reads a timestamp and, on a stall, one frame stack, so the
+monitor costs a timer wake-up per interval on the loop itself.
+"""
+
+import asyncio
+import logging
+import sys
+import threading
+import time
+import traceback
+from typing import Callable, Optional
+
+from resilience import LatencyTracker
+
+logger = logging.getLogger(__name__)
+
+
+class LoopMonitor:
+    """Heartbeat task plus watchdog thread for one event loop; start() from inside the loop"""
+
+    def __init__(self, interval: float = 0.1, block_threshold: float = 0.25,
+                 observe: Optional[Callable[[float], None]] = None, sample_size: int = 1200):
+        self.interval = interval
+        self.block_threshold = block_threshold
+        # Optional hook that receives every lag sample, e.g. a metrics histogram
+        self.observe = observe
+        self._lags = LatencyTracker(sample_size=sample_size, min_samples=1)
+        self._last_beat = time.monotonic()
+        self._task: Optional[asyncio.Task] = None
+        self._watchdog: Optional[threading.Thread] = None
+        self._stopped = threading.Event()
+        self._loop_thread_id: Optional[int] = None
+        self.max_lag = 0.0
+        self.stalls = 0
+        self.longest_stall = 0.0
+
+    def start(self):
+        """Start the heartbeat on the running loop and the watchdog thread"""
+        if self._task is not None:
+            return
+        self._loop_thread_id = threading.get_ident()
+        self._last_beat = time.monotonic()
+        self._stopped.clear()
+        self._task = asyncio.ensure_future(self._heartbeat())
+        if self.block_threshold > 0:
+            self._watchdog = threading.Thread(target=self._watch, name="loop-watchdog", daemon=True)
+            self._watchdog.start()
+
+    def stop(self):
+        self._stopped.set()
+        if self._task is not None:
+            self._task.cancel()
+            self._task = None
+
+    async def _heartbeat(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            started = loop.time()
+            await asyncio.sleep(self.interval)
+            self._last_beat = time.monotonic()
+            lag = max(loop.time() - started - self.interval, 0.0)
+            self._lags.record(lag)
+            self.max_lag = max(self.max_lag, lag)
+            if self.observe is not None:
+                self.observe(lag)
+
+    def _watch(self):
+        reported_beat = None
+        while not self._stopped.wait(self.block_threshold / 2):
+            beat = self._last_beat
+            blocked = time.monotonic() - beat - self.interval
+            if blocked < self.block_threshold:
+                continue
+            self.longest_stall = max(self.longest_stall, blocked)
+            if reported_beat == beat:
+                continue  # this stall was already logged
+            reported_beat = beat
+            self.stalls += 1
+            frame = sys._current_frames().get(self._loop_thread_id)
+            stack = "".join(traceback.format_stack(frame)) if frame is not None else "<unavailable>\n"
+            logger.warning(
+                f"Event loop blocked for {blocked * 1000:.0f} ms (threshold {self.block_threshold * 1000:.0f} ms); "
+                f"loop thread stack:\n{stack}"
+            )
+
+    def percentile(self, pct: float) -> float:
+        return self._lags.percentile(pct) or 0.0
+
+    def stats(self) -> dict:
+        return {
+            "lag_p50_ms": round(self.percentile(50) * 1000, 3),
+            "lag_p90_ms": round(self.percentile(90) * 1000, 3),
+            "lag_p99_ms": round(self.percentile(99) * 1000, 3),
+            "lag_max_ms": round(self.max_lag * 1000, 3),
+            "stalls": self.stalls,
+            "longest_stall_ms": round(self.longest_stall * 1000, 3),
+            "interval_ms": round(self.interval * 1000, 3),
+            "block_threshold_ms": round(self.block_threshold * 1000, 3),
+        }
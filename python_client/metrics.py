@@ -0,0 +1,188 @@
+#!/usr/bin/env python3
+"""
+Minimal Prometheus text-format metrics for the ShiftWork gateway
+
+- Counter and Histogram with fixed label names; an update is a dict lookup plus
+  (for histograms) a bisect, so instrumenting the request path costs microseconds
+- GaugeFunction reads its values from a callback at scrape time, for numbers the
+  gateway already tracks (cache stats, pool usage, admission queues)
+- Registry.render() produces the text exposition format served on /metrics
+- with_labels() and merge() combine the output of several worker processes into
+  one exposition, each sample labelled with the worker it came from (samples of
+  the same series are summed)
+
+No prometheus_client dependency; the output follows text format 0.0.4.
+"""
+
+from bisect import bisect_left
+from collections import OrderedDict
+from typing import Callable, Dict, Iterable, List, Mapping, Sequence, Tuple
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+# Seconds; covers sub-millisecond cache hits up to slow upstream fan-outs
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+# Bytes; 256 B to 64 MiB in powers of four
+SIZE_BUCKETS = tuple(256 * 4 ** i for i in range(10))
+LAG_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0)
+
+LabelValues = Tuple[str, ...]
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _labels(names: Sequence[str], values: Sequence[str], extra: str = "") -> str:
+    parts = [f'{name}="{_escape(str(value))}"' for name, value in zip(names, values)]
+    if extra:
+        parts.append(extra)
+    return "{" + ",".join(parts) + "}" if parts else ""
+
+
+def _number(value: float) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    if value == float("-inf"):
+        return "-Inf"
+    if value != value:
+        return "NaN"
+    if float(value).is_integer():
+        return str(int(value))
+    return repr(float(value))
+
+
+class Counter:
+    def __init__(self, name: str, help: str, labelnames: Sequence[str] = ()):
+        self.name = name
+        self.help = help
+        self.labelnames = tuple(labelnames)
+        self._values: Dict[LabelValues, float] = {}
+
+    def inc(self, *labelvalues: str, amount: float = 1.0):
+        self._values[labelvalues] = self._values.get(labelvalues, 0.0) + amount
+
+    def collect(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} counter"]
+        for values, total in list(self._values.items()):
+            lines.append(f"{self.name}{_labels(self.labelnames, values)} {_number(total)}")
+        return lines
+
+
+class Histogram:
+    def __init__(self, name: str, help: str, labelnames: Sequence[str] = (), buckets: Sequence[float] = LATENCY_BUCKETS):
+        self.name = name
+        self.help = help
+        self.labelnames = tuple(labelnames)
+        self.buckets = tuple(sorted(buckets))
+        # labels -> [per-bucket counts (+Inf last), sum]
+        self._series: Dict[LabelValues, list] = {}
+
+    def observe(self, value: float, *labelvalues: str):
+        series = self._series.get(labelvalues)
+        if series is None:
+            series = self._series[labelvalues] = [[0] * (len(self.buckets) + 1), 0.0]
+        series[0][bisect_left(self.buckets, value)] += 1
+        series[1] += value
+
+    def collect(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} histogram"]
+        for values, (counts, total) in list(self._series.items()):
+            cumulative = 0
+            for bound, count in zip(self.buckets + (float("inf"),), counts):
+                cumulative += count
+                le = 'le="' + _number(bound) + '"'
+                lines.append(f"{self.name}_bucket{_labels(self.labelnames, values, le)} {cumulative}")
+            lines.append(f"{self.name}_sum{_labels(self.labelnames, values)} {_number(total)}")
+            lines.append(f"{self.name}_count{_labels(self.labelnames, values)} {cumulative}")
+        return lines
+
+
+class GaugeFunction:
+    """Gauge (or counter, with kind="counter") whose samples come from a callback at scrape time"""
+
+    def __init__(self, name: str, help: str, labelnames: Sequence[str],
+                 read: Callable[[], Iterable[Tuple[LabelValues, float]]], kind: str = "gauge"):
+        self.name = name
+        self.help = help
+        self.labelnames = tuple(labelnames)
+        self.read = read
+        self.kind = kind
+
+    def collect(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} {self.kind}"]
+        for values, value in self.read():
+            lines.append(f"{self.name}{_labels(self.labelnames, values)} {_number(value)}")
+        return lines
+
+
+class Registry:
+    def __init__(self):
+        self._metrics: list = []
+
+    def register(self, metric):
+        self._metrics.append(metric)
+        return metric
+
+    def counter(self, name: str, help: str, labelnames: Sequence[str] = ()) -> Counter:
+        return self.register(Counter(name, help, labelnames))
+
+    def histogram(self, name: str, help: str, labelnames: Sequence[str] = (),
+                  buckets: Sequence[float] = LATENCY_BUCKETS) -> Histogram:
+        return self.register(Histogram(name, help, labelnames, buckets))
+
+    def gauge_function(self, name: str, help: str, labelnames: Sequence[str],
+                       read: Callable[[], Iterable[Tuple[LabelValues, float]]], kind: str = "gauge") -> GaugeFunction:
+        return self.register(GaugeFunction(name, help, labelnames, read, kind))
+
+    def render(self) -> str:
+        lines: List[str] = []
+        for metric in self._metrics:
+            lines.extend(metric.collect())
+        return "\n".join(lines) + "\n"
+
+
+def with_labels(text: str, labels: Mapping[str, str]) -> str:
+    """Add constant labels to every sample line of a rendered exposition"""
+    extra = ",".join(f'{name}="{_escape(str(value))}"' for name, value in labels.items())
+    if not extra:
+        return text
+    lines = []
+    for line in text.splitlines():
+        if line and not line.startswith("#"):
+            # The metric name ends at the first "{" (existing labels) or space (no labels)
+            brace, space = line.find("{"), line.find(" ")
+            if brace != -1 and brace < space:
+                line = f"{line[:brace + 1]}{extra},{line[brace + 1:]}"
+            else:
+                line = f"{line[:space]}{{{extra}}}{line[space:]}"
+        lines.append(line)
+    return "\n".join(lines) + "\n"
+
+
+def merge(texts: Iterable[str]) -> str:
+    """Merge expositions that share metric families into one, keeping each family's samples together.
+
+    A series that appears in several inputs (the same name and labels, e.g. two
+    generations of one worker slot during a rolling restart) is summed, so the
+    result never repeats a series.
+    """
+    families: "OrderedDict[str, list]" = OrderedDict()  # name -> [header lines, {series: value}]
+    for text in texts:
+        current = None
+        for line in text.splitlines():
+            if line.startswith("# HELP ") or line.startswith("# TYPE "):
+                name = line.split(" ", 3)[2]
+                family = families.setdefault(name, [[], OrderedDict()])
+                if len(family[0]) < 2 and line not in family[0]:
+                    family[0].append(line)
+                current = family
+            elif line and not line.startswith("#") and current is not None:
+                series, _, value = line.rpartition(" ")
+                samples = current[1]
+                samples[series] = samples.get(series, 0.0) + float(value)
+    lines: List[str] = []
+    for header, samples in families.values():
+        lines.extend(header)
+        lines.extend(f"{series} {_number(value)}" for series, value in samples.items())
+    return "\n".join(lines) + "\n"
@@ -0,0 +1,101 @@
+#!/usr/bin/env python3
+"""
+Worker-thread offload for CPU-heavy steps of the ShiftWork gateway
+
+- Offloader.run(): calls a function on a dedicated thread pool when the caller
+  says its input is large, inline otherwise (a pool hop costs ~50 us, more than
+  parsing or encoding a small payload)
+- Used for parsing large upstream bodies, building snapshot indexes and encoding
+  large tool results; inputs and outputs are handed over as bytes/objects
+  without copying, since the workers share the process
+- Stats (tasks, queue wait, busy time) are reported on /health and /metrics
+
+What this buys is a responsive loop, not more CPU: the pool shares the
+process's GIL, so a gateway process still does about one core's worth of
+parsing and encoding. Pure-Python work (index building, the stdlib JSON
+fallback) yields the GIL every few milliseconds, which lets the loop keep
+serving requests in between; a single msgspec/orjson call holds it until it
+returns. For throughput across cores run several processes (--workers).
+There is no process-pool mode: every offloaded step produces or consumes
+in-process objects (snapshots, Schedule records), and pickling them across a
+process boundary costs about as much as the decode or pack it would move.
+"""
+
+import asyncio
+import logging
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Optional
+
+logger = logging.getLogger(__name__)
+
+
+class Offloader:
+    """Thread pool for CPU-bound steps; max_workers <= 0 runs everything inline"""
+
+    def __init__(self, max_workers: int, observe: Optional[Callable[[float], None]] = None):
+        self.max_workers = max(max_workers, 0)
+        # Optional hook that receives every task's run time, e.g. a metrics histogram
+        self.observe = observe
+        self._executor: Optional[ThreadPoolExecutor] = None
+        self.offloaded = 0
+        self.inline = 0
+        self.in_flight = 0
+        self.queue_wait_total = 0.0
+        self.queue_wait_max = 0.0
+        self.busy_total = 0.0
+
+    @property
+    def enabled(self) -> bool:
+        return self.max_workers > 0
+
+    def _pool(self) -> ThreadPoolExecutor:
+        if self._executor is None:
+            self._executor = ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix="offload")
+        return self._executor
+
+    async def run(self, fn: Callable[..., Any], *args, offload: bool = True) -> Any:
+        """Return fn(*args), computed on the pool if offload is set and the pool is enabled"""
+        if not offload or not self.enabled:
+            self.inline += 1
+            return fn(*args)
+        submitted = time.perf_counter()
+        timing = {}
+
+        def call():
+            started = time.perf_counter()
+            try:
+                return fn(*args)
+            finally:
+                timing["wait"] = started - submitted
+                timing["busy"] = time.perf_counter() - started
+
+        self.offloaded += 1
+        self.in_flight += 1
+        try:
+            return await asyncio.get_running_loop().run_in_executor(self._pool(), call)
+        finally:
+            self.in_flight -= 1
+            # Absent if the caller was cancelled before the worker picked the task up
+            if timing:
+                self.queue_wait_total += timing["wait"]
+                self.queue_wait_max = max(self.queue_wait_max, timing["wait"])
+                self.busy_total += timing["busy"]
+                if self.observe is not None:
+                    self.observe(timing["busy"])
+
+    def shutdown(self):
+        if self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = None
+
+    def stats(self) -> dict:
+        return {
+            "workers": self.max_workers,
+            "offloaded": self.offloaded,
+            "inline": self.inline,
+            "in_flight": self.in_flight,
+            "queue_wait_avg_ms": round(1000 * self.queue_wait_total / self.offloaded, 3) if self.offloaded else 0.0,
+            "queue_wait_max_ms": round(1000 * self.queue_wait_max, 3),
+            "busy_seconds": round(self.busy_total, 6),
+        }
@@ -0,0 +1,210 @@
+#!/usr/bin/env python3
+"""
+Retry and failure isolation for calls from the gateway to the .NET API
+
+- RetryBudget: retries across all routes are capped at a percentage of recent
+  requests, so a slow upstream sees a bounded amplification instead of a retry storm
+- full_jitter_backoff(): "full jitter" exponential backoff, random in [0, min(cap, base * 2^n)]
+- CircuitBreaker: per-route closed/open/half-open breaker; while open, calls fail
+  fast with CircuitOpenError and callers may serve stale cached data instead
+- LatencyTracker: recent per-route latencies, used to pick the hedging delay
+- deadline_scope(): per-request deadline carried in a context variable, so every
+  upstream call made on behalf of a tool call can see how much time is left
+"""
+
+import asyncio
+import logging
+import random
+import time
+from collections import deque
+from contextlib import asynccontextmanager
+from contextvars import ContextVar
+from typing import Optional
+
+import httpx
+
+logger = logging.getLogger(__name__)
+
+
+class CircuitOpenError(httpx.TransportError):
+    """Raised instead of contacting an upstream route whose circuit breaker is open"""
+
+
+# Event-loop time by which the current tool call must finish; None when unbounded
+_deadline: ContextVar[Optional[float]] = ContextVar("deadline", default=None)
+
+
+def deadline_remaining() -> Optional[float]:
+    """Seconds left before the current deadline, or None if there is none"""
+    at = _deadline.get()
+    return None if at is None else at - asyncio.get_running_loop().time()
+
+
+@asynccontextmanager
+async def deadline_scope(seconds: float):
+    """Run the body under a deadline `seconds` from now, or the enclosing one if sooner.
+
+    Raises TimeoutError once it passes. The body is cancelled, so upstream
+    requests still in flight are abandoned and their connections released.
+    Tasks started inside the body inherit the deadline.
+    """
+    loop = asyncio.get_running_loop()
+    at = loop.time() + seconds
+    outer = _deadline.get()
+    if outer is not None:
+        at = min(at, outer)
+    token = _deadline.set(at)
+    try:
+        async with asyncio.timeout_at(at):
+            yield
+    finally:
+        _deadline.reset(token)
+
+
+def full_jitter_backoff(attempt: int, base: float, cap: float) -> float:
+    """Sleep before retry number `attempt` (1-based): uniform in [0, min(cap, base * 2^(attempt-1))]"""
+    return random.uniform(0, min(cap, base * (2 ** (attempt - 1))))
+
+
+class RetryBudget:
+    """Sliding-window retry budget shared by every upstream route.
+
+    A retry is allowed while retries in the last `window` seconds stay below
+    `percent`% of requests in the same window, plus a floor of
+    `min_per_second` retries per second so a quiet gateway can still retry.
+    A separate instance caps hedged requests the same way.
+    """
+
+    def __init__(self, percent: float, min_per_second: float, window: float = 10.0):
+        self.ratio = max(percent, 0.0) / 100.0
+        self.window = max(int(window), 1)
+        self.min_retries = max(min_per_second, 0.0) * self.window
+        # [second, requests, retries] per wall-clock second in the window
+        self._buckets: deque = deque()
+        self.retries = 0
+        self.exhausted = 0
+
+    def _current(self) -> list:
+        second = int(time.monotonic())
+        while self._buckets and self._buckets[0][0] <= second - self.window:
+            self._buckets.popleft()
+        if not self._buckets or self._buckets[-1][0] != second:
+            self._buckets.append([second, 0, 0])
+        return self._buckets[-1]
+
+    def record_request(self):
+        self._current()[1] += 1
+
+    def try_acquire(self) -> bool:
+        """Spend one retry from the budget; False means the caller should give up now"""
+        bucket = self._current()
+        requests = sum(b[1] for b in self._buckets)
+        retries = sum(b[2] for b in self._buckets)
+        if retries < self.min_retries + self.ratio * requests:
+            bucket[2] += 1
+            self.retries += 1
+            return True
+        self.exhausted += 1
+        return False
+
+    def stats(self) -> dict:
+        self._current()
+        return {
+            "percent": round(self.ratio * 100, 2),
+            "window_seconds": self.window,
+            "window_requests": sum(b[1] for b in self._buckets),
+            "window_retries": sum(b[2] for b in self._buckets),
+            "retries": self.retries,
+            "exhausted": self.exhausted,
+        }
+
+
+class LatencyTracker:
+    """Rolling sample of recent request latencies for one route"""
+
+    def __init__(self, sample_size: int = 256, min_samples: int = 20):
+        self._samples: deque = deque(maxlen=max(sample_size, 1))
+        self.min_samples = min_samples
+
+    def record(self, seconds: float):
+        self._samples.append(seconds)
+
+    def percentile(self, pct: float) -> Optional[float]:
+        """The pct-th percentile latency in seconds, or None until min_samples have been seen"""
+        if len(self._samples) < self.min_samples:
+            return None
+        ordered = sorted(self._samples)
+        index = min(len(ordered) - 1, max(0, round(pct / 100.0 * len(ordered)) - 1))
+        return ordered[index]
+
+
+class CircuitBreaker:
+    """Consecutive-failure circuit breaker for one upstream route.
+
+    Opens after `failure_threshold` failures in a row. After `reset_timeout`
+    seconds one probe request is let through (half-open); its success closes
+    the breaker and its failure re-opens it for another `reset_timeout`.
+    """
+
+    CLOSED = "closed"
+    OPEN = "open"
+    HALF_OPEN = "half_open"
+
+    def __init__(self, name: str, failure_threshold: int, reset_timeout: float):
+        self.name = name
+        self.failure_threshold = max(failure_threshold, 1)
+        self.reset_timeout = reset_timeout
+        self._state = self.CLOSED
+        self._opened_at = 0.0
+        self._probe_in_flight = False
+        self.consecutive_failures = 0
+        self.opens = 0
+        self.rejected = 0
+
+    @property
+    def state(self) -> str:
+        if self._state == self.OPEN and time.monotonic() - self._opened_at >= self.reset_timeout:
+            self._state = self.HALF_OPEN
+            self._probe_in_flight = False
+        return self._state
+
+    def allow(self) -> bool:
+        """Whether a request may be sent now; in half-open state only one probe at a time"""
+        state = self.state
+        if state == self.CLOSED:
+            return True
+        if state == self.HALF_OPEN and not self._probe_in_flight:
+            self._probe_in_flight = True
+            return True
+        self.rejected += 1
+        return False
+
+    def record_success(self):
+        if self._state != self.CLOSED:
+            logger.info(f"Circuit for {self.name} closed")
+        self._state = self.CLOSED
+        self._probe_in_flight = False
+        self.consecutive_failures = 0
+
+    def record_failure(self):
+        self.consecutive_failures += 1
+        if self._state == self.HALF_OPEN or (
+            self._state == self.CLOSED and self.consecutive_failures >= self.failure_threshold
+        ):
+            logger.warning(f"Circuit for {self.name} opened after {self.consecutive_failures} consecutive failures")
+            self._state = self.OPEN
+            self._opened_at = time.monotonic()
+            self._probe_in_flight = False
+            self.opens += 1
+
+    def release(self):
+        """Forget an in-flight probe that ended without a verdict (e.g. the caller was cancelled)"""
+        self._probe_in_flight = False
+
+    def stats(self) -> dict:
+        return {
+            "state": self.state,
+            "consecutive_failures": self.consecutive_failures,
+            "opens": self.opens,
+            "rejected": self.rejected,
+        }
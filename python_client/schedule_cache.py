@@ -0,0 +1,337 @@
+#!/usr/bin/env python3
+"""
+In-process snapshot cache for the ShiftWork HTTP gateway
+
+- TTL-based expiry per entry
+- Bounded memory: LRU eviction by entry count and approximate payload bytes
+- Single-flight loading: concurrent misses for the same key share one upstream fetch
+- Expired entries stay until evicted so they can be served stale while the upstream is down
+- Hit/miss/coalesced/eviction counters for the /health endpoint
+- CompanySnapshot: a company's schedule list with secondary indexes built once per load
+- ConditionalStore: ETag/Last-Modified validators and content hashes per upstream URL
+"""
+
+import asyncio
+import logging
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Any, Awaitable, Callable, Dict, Hashable, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+# A loader returns (value, approximate_size_in_bytes). A value of None is
+# returned to callers but never stored (e.g. upstream 404).
+Loader = Callable[[], Awaitable[Tuple[Any, int]]]
+
+
+@dataclass
+class _CacheEntry:
+    value: Any
+    size: int
+    expires_at: float
+
+
+class SnapshotCache:
+    """Per-key snapshot cache with TTL, LRU eviction and single-flight loading"""
+
+    def __init__(self, ttl: float, max_entries: int, max_bytes: int, name: str = "cache"):
+        self.name = name
+        self.ttl = ttl
+        self.max_entries = max(1, max_entries)
+        self.max_bytes = max(1, max_bytes)
+        self._entries: "OrderedDict[Hashable, _CacheEntry]" = OrderedDict()
+        self._inflight: Dict[Hashable, asyncio.Task] = {}
+        self._bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.coalesced = 0
+        self.evictions = 0
+        self.stale_served = 0
+
+    def get(self, key: Hashable) -> Optional[Any]:
+        """Return a fresh cached value without loading, or None"""
+        entry = self._entries.get(key)
+        if entry is None or entry.expires_at <= time.monotonic():
+            return None
+        self._entries.move_to_end(key)
+        return entry.value
+
+    def get_stale(self, key: Hashable) -> Optional[Any]:
+        """Return the cached value for key even if it has expired, or None"""
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        self.stale_served += 1
+        return entry.value
+
+    async def get_or_load(self, key: Hashable, loader: Loader) -> Any:
+        """Return the cached value for key, loading it at most once concurrently"""
+        value = self.get(key)
+        if value is not None:
+            self.hits += 1
+            return value
+
+        task = self._inflight.get(key)
+        if task is not None:
+            self.coalesced += 1
+        else:
+            self.misses += 1
+            task = asyncio.ensure_future(self._load(key, loader))
+            task.add_done_callback(_consume_exception)
+            self._inflight[key] = task
+        # Shield so one cancelled caller does not abort the fetch shared by the others
+        return await asyncio.shield(task)
+
+    async def _load(self, key: Hashable, loader: Loader) -> Any:
+        try:
+            value, size = await loader()
+            # Skip storing if the key was invalidated while the load was in flight
+            if value is not None and self.ttl > 0 and self._inflight.get(key) is asyncio.current_task():
+                self._store(key, value, size)
+            return value
+        finally:
+            if self._inflight.get(key) is asyncio.current_task():
+                del self._inflight[key]
+
+    def put(self, key: Hashable, value: Any, size: int):
+        """Store a value directly, outside of get_or_load"""
+        self._store(key, value, size)
+
+    def _store(self, key: Hashable, value: Any, size: int):
+        if key in self._entries:
+            self._remove(key)
+        size = max(0, int(size))
+        if size > self.max_bytes:
+            logger.warning(f"{self.name}: entry {key!r} ({size} bytes) exceeds cache budget; not cached")
+            return
+        self._entries[key] = _CacheEntry(value=value, size=size, expires_at=time.monotonic() + self.ttl)
+        self._bytes += size
+        while len(self._entries) > self.max_entries or self._bytes > self.max_bytes:
+            oldest = next(iter(self._entries))
+            self._remove(oldest)
+            self.evictions += 1
+
+    def _remove(self, key: Hashable):
+        entry = self._entries.pop(key, None)
+        if entry is not None:
+            self._bytes -= entry.size
+
+    def invalidate(self, key: Hashable):
+        """Drop a cached entry and detach any in-flight load for it"""
+        self._remove(key)
+        self._inflight.pop(key, None)
+
+    def invalidate_where(self, predicate: Callable[[Hashable], bool]) -> int:
+        """Drop every entry whose key matches predicate; returns the number dropped"""
+        keys = [k for k in list(self._entries) + list(self._inflight) if predicate(k)]
+        for key in set(keys):
+            self.invalidate(key)
+        return len(set(keys))
+
+    def clear(self):
+        self._entries.clear()
+        self._inflight.clear()
+        self._bytes = 0
+
+    def stats(self) -> dict:
+        lookups = self.hits + self.misses + self.coalesced
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "coalesced": self.coalesced,
+            "evictions": self.evictions,
+            "stale_served": self.stale_served,
+            "hit_ratio": round(self.hits / lookups, 4) if lookups else 0.0,
+            "entries": len(self._entries),
+            "bytes": self._bytes,
+            "inflight": len(self._inflight),
+            "ttl_seconds": self.ttl,
+            "max_entries": self.max_entries,
+            "max_bytes": self.max_bytes,
+        }
+
+
+def _consume_exception(task: asyncio.Task):
+    # Mark exceptions as retrieved when every waiter was cancelled
+    if not task.cancelled():
+        task.exception()
+
+
+class CompanySnapshot:
+    """A company's schedules plus personId/locationId/areaId/status indexes.
+
+    Built in full before it is stored in the cache, so a refresh swaps the list
+    and all of its indexes in a single reference assignment.
+    """
+
+    INDEXED_FIELDS = {
+        "person": "personId",
+        "location": "locationId",
+        "area": "areaId",
+        "status": "status",
+    }
+
+    __slots__ = ("schedules", "loaded_at", "_indexes")
+
+    def __init__(self, schedules: List[dict]):
+        self.schedules = schedules
+        self.loaded_at = time.time()
+        indexes: Dict[str, Dict[str, List[dict]]] = {name: {} for name in self.INDEXED_FIELDS}
+        fields = list(self.INDEXED_FIELDS.items())
+        for schedule in schedules:
+            for name, field in fields:
+                # Normalize to string so "6" and 6 hit the same bucket
+                indexes[name].setdefault(str(schedule.get(field)), []).append(schedule)
+        self._indexes = indexes
+
+    def __len__(self) -> int:
+        return len(self.schedules)
+
+    def lookup(self, index: str, value: Any) -> List[dict]:
+        """Return a copy of the schedules whose indexed field equals value"""
+        return list(self._indexes[index].get(str(value), ()))
+
+    def by_person(self, person_id: Any) -> List[dict]:
+        return self.lookup("person", person_id)
+
+    def by_location(self, location_id: Any) -> List[dict]:
+        return self.lookup("location", location_id)
+
+    def filter(self, person_id: Any = None, location_id: Any = None,
+               area_id: Any = None, status: Any = None) -> List[dict]:
+        """Intersect indexed filters, scanning only the smallest matching bucket"""
+        criteria = {
+            name: str(value)
+            for name, value in (("person", person_id), ("location", location_id),
+                                ("area", area_id), ("status", status))
+            if value is not None
+        }
+        if not criteria:
+            return list(self.schedules)
+        buckets = {name: self._indexes[name].get(value, ()) for name, value in criteria.items()}
+        smallest = min(buckets, key=lambda name: len(buckets[name]))
+        rest = [(self.INDEXED_FIELDS[name], value) for name, value in criteria.items() if name != smallest]
+        return [
+            s for s in buckets[smallest]
+            if all(str(s.get(field)) == value for field, value in rest)
+        ]
+
+    def people(self) -> List[str]:
+        return list(self._indexes["person"])
+
+
+@dataclass
+class _Validated:
+    value: Any
+    size: int
+    etag: Optional[str]
+    last_modified: Optional[str]
+    digest: bytes
+
+
+class ConditionalStore:
+    """Parsed upstream bodies keyed by URL, with the validators needed to revalidate them.
+
+    headers_for() returns If-None-Match/If-Modified-Since for a key. After the
+    request, not_modified() (on 304) or unchanged() (same content hash on 200)
+    hand back the previously parsed value, so the body is neither downloaded
+    nor parsed again. Savings are counted per endpoint label.
+    """
+
+    def __init__(self, max_entries: int, max_bytes: int):
+        # Validators never expire on their own; LRU bounds keep memory in check
+        self._cache = SnapshotCache(ttl=float("inf"), max_entries=max_entries, max_bytes=max_bytes, name="conditional_cache")
+        self._endpoints: Dict[str, Dict[str, int]] = {}
+
+    def _counters(self, endpoint: str) -> Dict[str, int]:
+        counters = self._endpoints.get(endpoint)
+        if counters is None:
+            counters = self._endpoints[endpoint] = {
+                "requests": 0, "not_modified": 0, "unchanged": 0, "stale": 0, "bytes_downloaded": 0, "bytes_saved": 0,
+            }
+        return counters
+
+    def headers_for(self, key: Hashable, endpoint: str) -> Dict[str, str]:
+        self._counters(endpoint)["requests"] += 1
+        entry = self._cache.get(key)
+        headers = {}
+        if entry is not None:
+            if entry.etag:
+                headers["If-None-Match"] = entry.etag
+            if entry.last_modified:
+                headers["If-Modified-Since"] = entry.last_modified
+        return headers
+
+    def not_modified(self, key: Hashable, endpoint: str) -> Optional[Tuple[Any, int]]:
+        """(value, size) to reuse after a 304, or None if nothing is cached for key"""
+        entry = self._cache.get(key)
+        if entry is None:
+            return None
+        counters = self._counters(endpoint)
+        counters["not_modified"] += 1
+        counters["bytes_saved"] += entry.size
+        return entry.value, entry.size
+
+    def unchanged(self, key: Hashable, digest: bytes, endpoint: str) -> Optional[Any]:
+        """Previously parsed value if a 200 body hashes the same as last time"""
+        entry = self._cache.get(key)
+        if entry is None or entry.digest != digest:
+            return None
+        self._counters(endpoint)["unchanged"] += 1
+        return entry.value
+
+    def stale(self, key: Hashable, endpoint: str) -> Optional[Tuple[Any, int]]:
+        """(value, size) last fetched for key, to serve while the upstream is unavailable"""
+        entry = self._cache.get(key)
+        if entry is None:
+            return None
+        self._counters(endpoint)["stale"] += 1
+        return entry.value, entry.size
+
+    def store(self, key: Hashable, endpoint: str, value: Any, size: int, headers, digest: bytes):
+        self._counters(endpoint)["bytes_downloaded"] += size
+        self._cache.put(key, _Validated(
+            value=value,
+            size=size,
+            etag=headers.get("ETag"),
+            last_modified=headers.get("Last-Modified"),
+            digest=digest,
+        ), size)
+
+    def __contains__(self, key: Hashable) -> bool:
+        return self._cache.get(key) is not None
+
+    def export(self, key: Hashable) -> Optional[Dict[str, Any]]:
+        """Plain-data copy of the entry for key, for sharing with other processes via adopt()"""
+        entry = self._cache.get(key)
+        if entry is None:
+            return None
+        return {"value": entry.value, "size": entry.size, "etag": entry.etag,
+                "last_modified": entry.last_modified, "digest": entry.digest.hex()}
+
+    def adopt(self, key: Hashable, state: Dict[str, Any]):
+        """Store an entry exported by another process; it is revalidated like one fetched here"""
+        size = int(state["size"])
+        self._cache.put(key, _Validated(
+            value=state["value"],
+            size=size,
+            etag=state.get("etag"),
+            last_modified=state.get("last_modified"),
+            digest=bytes.fromhex(state["digest"]),
+        ), size)
+
+    def discard(self, key: Hashable):
+        self._cache.invalidate(key)
+
+    def discard_where(self, predicate: Callable[[Hashable], bool]) -> int:
+        return self._cache.invalidate_where(predicate)
+
+    def stats(self) -> dict:
+        cache = self._cache.stats()
+        return {
+            "entries": cache["entries"],
+            "bytes": cache["bytes"],
+            "evictions": cache["evictions"],
+            "endpoints": {name: dict(counters) for name, counters in self._endpoints.items()},
+        }
@@ -0,0 +1,234 @@
+#!/usr/bin/env python3
+"""
+Compact typed schedule records for cached company snapshots
+
+Schedule mirrors the .NET ScheduleDto. With msgspec installed it is a
+gc-free msgspec.Struct decoded straight from the upstream response bytes;
+otherwise it is a __slots__ class built from parsed dicts. Either way a row
+costs a fraction of a 23-key dict, repeated low-cardinality strings
+(status, companyId, timeZone, ...) are interned, and the rarely read
+description/settings fields stay as raw JSON until accessed.
+
+Records expose get(camelCaseKey) so dict-based filtering code keeps working,
+and to_dict() for encoders that do not understand them. Fields that are not
+part of ScheduleDto are dropped.
+
+pack_schedules()/unpack_schedules() give a compact positional form (MessagePack
+with msgspec, JSON arrays without it) for caches shared between processes.
+"""
+
+import json
+import sys
+from typing import Any, Dict, List, Optional, Union
+
+try:
+    import msgspec
+except ImportError:  # pragma: no cover - optional dependency
+    msgspec = None
+
+# True when decode_schedules() decodes records directly from bytes without intermediate dicts
+DECODES_FROM_BYTES = msgspec is not None
+
+# (attribute, upstream camelCase key) in ScheduleDto order
+FIELDS = [
+    ("schedule_id", "scheduleId"),
+    ("name", "name"),
+    ("company_id", "companyId"),
+    ("person_id", "personId"),
+    ("crew_id", "crewId"),
+    ("task_shift_id", "taskShiftId"),
+    ("location_id", "locationId"),
+    ("area_id", "areaId"),
+    ("start_date", "startDate"),
+    ("end_date", "endDate"),
+    ("description", "description"),
+    ("status", "status"),
+    ("settings", "settings"),
+    ("updated_by", "updatedBy"),
+    ("created_by", "createdBy"),
+    ("updated_at", "updatedAt"),
+    ("created_at", "createdAt"),
+    ("external_code", "externalCode"),
+    ("time_zone", "timeZone"),
+    ("color", "color"),
+    ("type", "type"),
+    ("voided_by", "voidedBy"),
+    ("voided_at", "voidedAt"),
+]
+_ATTR_BY_KEY = {key: attr for attr, key in FIELDS}
+LAZY_FIELDS = ("description", "settings")
+_INTERNED = ("company_id", "status", "updated_by", "created_by", "time_zone", "color", "type", "voided_by")
+
+Id = Union[int, str, None]
+
+
+def _intern(value: Any) -> Any:
+    return sys.intern(value) if type(value) is str else value
+
+
+if msgspec is not None:
+    _NULL = msgspec.Raw(b"null")
+    _decode_raw = msgspec.json.decode
+
+    class Schedule(msgspec.Struct, gc=False):
+        """One ScheduleDto row; description/settings are kept as raw JSON"""
+
+        schedule_id: Id = msgspec.field(default=None, name="scheduleId")
+        name: Optional[str] = None
+        company_id: Id = msgspec.field(default=None, name="companyId")
+        person_id: Id = msgspec.field(default=None, name="personId")
+        crew_id: Id = msgspec.field(default=None, name="crewId")
+        task_shift_id: Id = msgspec.field(default=None, name="taskShiftId")
+        location_id: Id = msgspec.field(default=None, name="locationId")
+        area_id: Id = msgspec.field(default=None, name="areaId")
+        start_date: Optional[str] = msgspec.field(default=None, name="startDate")
+        end_date: Optional[str] = msgspec.field(default=None, name="endDate")
+        description_raw: msgspec.Raw = msgspec.field(default=_NULL, name="description")
+        status: Optional[str] = None
+        settings_raw: msgspec.Raw = msgspec.field(default=_NULL, name="settings")
+        updated_by: Optional[str] = msgspec.field(default=None, name="updatedBy")
+        created_by: Optional[str] = msgspec.field(default=None, name="createdBy")
+        updated_at: Optional[str] = msgspec.field(default=None, name="updatedAt")
+        created_at: Optional[str] = msgspec.field(default=None, name="createdAt")
+        external_code: Optional[str] = msgspec.field(default=None, name="externalCode")
+        time_zone: Optional[str] = msgspec.field(default=None, name="timeZone")
+        color: Optional[str] = None
+        type: Optional[str] = None
+        voided_by: Optional[str] = msgspec.field(default=None, name="voidedBy")
+        voided_at: Optional[str] = msgspec.field(default=None, name="voidedAt")
+
+        @property
+        def description(self) -> Any:
+            return _decode_raw(self.description_raw)
+
+        @property
+        def settings(self) -> Any:
+            return _decode_raw(self.settings_raw)
+
+        @classmethod
+        def from_dict(cls, data: Dict[str, Any]) -> "Schedule":
+            fields = {}
+            for key, value in data.items():
+                attr = _ATTR_BY_KEY.get(key)
+                if attr in LAZY_FIELDS:
+                    fields[f"{attr}_raw"] = msgspec.Raw(msgspec.json.encode(value))
+                elif attr is not None:
+                    fields[attr] = _intern(value) if attr in _INTERNED else value
+            return cls(**fields)
+
+        def get(self, key: str, default: Any = None) -> Any:
+            attr = _ATTR_BY_KEY.get(key)
+            return getattr(self, attr) if attr is not None else default
+
+        def to_dict(self) -> Dict[str, Any]:
+            return {key: getattr(self, attr) for attr, key in FIELDS}
+
+    _list_decoder = msgspec.json.Decoder(List[Schedule])
+
+    def _compact(record: "Schedule"):
+        # Decoded Raw values reference the whole response buffer; copy them so it can be freed
+        if record.description_raw is not _NULL:
+            record.description_raw = record.description_raw.copy()
+        if record.settings_raw is not _NULL:
+            record.settings_raw = record.settings_raw.copy()
+        for attr in _INTERNED:
+            value = getattr(record, attr)
+            if type(value) is str:
+                setattr(record, attr, sys.intern(value))
+
+    def decode_schedules(data: bytes) -> List["Schedule"]:
+        """Decode an upstream JSON array of ScheduleDto straight into records"""
+        records = _list_decoder.decode(data)
+        for record in records:
+            _compact(record)
+        return records
+
+    # Packed rows are positional arrays in Schedule field order; raw JSON fields travel as bin
+    _ATTRS = [f"{attr}_raw" if attr in LAZY_FIELDS else attr for attr, _ in FIELDS]
+    _RAW_POSITIONS = [(i, a) for i, a in enumerate(_ATTRS) if a.endswith("_raw")]
+    _INTERNED_POSITIONS = [i for i, a in enumerate(_ATTRS) if a in _INTERNED]
+    _Packed = msgspec.defstruct(
+        "_Packed", [(a, bytes if a.endswith("_raw") else Any) for a in _ATTRS], array_like=True, gc=False
+    )
+    _packed_decoder = msgspec.msgpack.Decoder(List[_Packed])
+    _astuple = msgspec.structs.astuple
+
+    def pack_schedules(records: List["Schedule"]) -> bytes:
+        """MessagePack form of records: one positional array per row, no field names"""
+        rows = []
+        for record in records:
+            values = list(_astuple(record))
+            for i, _ in _RAW_POSITIONS:
+                values[i] = bytes(values[i])
+            rows.append(values)
+        return msgspec.msgpack.encode(rows)
+
+    def unpack_schedules(data) -> List["Schedule"]:
+        """Records from pack_schedules() output; data may be any bytes-like buffer and is not retained"""
+        records = []
+        for packed in _packed_decoder.decode(data):
+            values = list(_astuple(packed))
+            for i in _INTERNED_POSITIONS:
+                if type(values[i]) is str:
+                    values[i] = sys.intern(values[i])
+            record = Schedule(*values)
+            for i, attr in _RAW_POSITIONS:
+                setattr(record, attr, msgspec.Raw(values[i]))
+            records.append(record)
+        return records
+
+else:
+
+    class Schedule:
+        """One ScheduleDto row; description/settings are kept as raw JSON text"""
+
+        __slots__ = tuple(attr if attr not in LAZY_FIELDS else f"{attr}_raw" for attr, _ in FIELDS)
+
+        def __init__(self, **fields):
+            for attr in self.__slots__:
+                setattr(self, attr, fields.get(attr, "null" if attr.endswith("_raw") else None))
+
+        @property
+        def description(self) -> Any:
+            return json.loads(self.description_raw)
+
+        @property
+        def settings(self) -> Any:
+            return json.loads(self.settings_raw)
+
+        @classmethod
+        def from_dict(cls, data: Dict[str, Any]) -> "Schedule":
+            record = cls.__new__(cls)
+            for attr, key in FIELDS:
+                value = data.get(key)
+                if attr in LAZY_FIELDS:
+                    setattr(record, f"{attr}_raw", json.dumps(value))
+                else:
+                    setattr(record, attr, _intern(value) if attr in _INTERNED else value)
+            return record
+
+        def get(self, key: str, default: Any = None) -> Any:
+            attr = _ATTR_BY_KEY.get(key)
+            return getattr(self, attr) if attr is not None else default
+
+        def to_dict(self) -> Dict[str, Any]:
+            return {key: getattr(self, attr) for attr, key in FIELDS}
+
+    def decode_schedules(data: bytes) -> List["Schedule"]:
+        """Decode an upstream JSON array of ScheduleDto into records"""
+        return [Schedule.from_dict(row) for row in json.loads(data)]
+
+    def pack_schedules(records: List["Schedule"]) -> bytes:
+        """JSON arrays of field values in __slots__ order (no msgspec for MessagePack)"""
+        return json.dumps([[getattr(r, attr) for attr in Schedule.__slots__] for r in records],
+                          separators=(",", ":")).encode("utf-8")
+
+    def unpack_schedules(data) -> List["Schedule"]:
+        """Records from pack_schedules() output; data may be any bytes-like buffer"""
+        records = []
+        for values in json.loads(bytes(data)):
+            record = Schedule.__new__(Schedule)
+            for attr, value in zip(Schedule.__slots__, values):
+                setattr(record, attr, _intern(value) if attr in _INTERNED else value)
+            records.append(record)
+        return records
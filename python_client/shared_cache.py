@@ -0,0 +1,415 @@
+#!/usr/bin/env python3
+"""
+Cache tier shared by gateway processes (--workers) and replicas
+
+- MmapBackend: one memory-mapped file per entry in a tmpfs directory
+  (/dev/shm by default) for workers on the same host. Writers publish with an
+  atomic rename, and readers map the file, so reads take no lock and make
+  no copy
+- RedisBackend: a minimal RESP2 client (GET/SET PX/INCR/DEL) with a small
+  connection pool, for any Redis-compatible server shared by several hosts
+- SharedCache: key namespacing, per-company generation counters (bumped on
+  invalidation so every process drops its in-process copy) and error
+  isolation; a failing backend is counted and treated as a miss, never as a
+  failed request
+
+Values are bytes. Callers store compact binary encodings: packed Schedule
+rows (schedule_record.pack_schedules) or MessagePack documents (pack_value),
+so a process filling its in-process cache from here does not parse JSON.
+"""
+
+import asyncio
+import hashlib
+import json
+import logging
+import mmap
+import os
+import struct
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Optional
+from urllib.parse import unquote, urlparse
+
+try:
+    import fcntl
+except ImportError:  # pragma: no cover - Windows
+    fcntl = None
+
+try:
+    import msgspec
+except ImportError:  # pragma: no cover - optional dependency
+    msgspec = None
+
+logger = logging.getLogger(__name__)
+
+
+def pack_value(value: Any) -> bytes:
+    """Compact encoding for plain JSON-like values (MessagePack with msgspec, JSON otherwise)"""
+    if msgspec is not None:
+        return msgspec.msgpack.encode(value)
+    return json.dumps(value, separators=(",", ":")).encode("utf-8")
+
+
+def unpack_value(data) -> Any:
+    if msgspec is not None:
+        return msgspec.msgpack.decode(data)
+    return json.loads(bytes(data))
+
+
+class SharedCacheError(Exception):
+    """A backend could not complete an operation"""
+
+
+class MmapBackend:
+    """Entries as memory-mapped files in a directory shared by same-host processes.
+
+    Each file holds an 8-byte expiry (wall-clock seconds, big-endian double)
+    followed by the value. Counters are small files updated under flock.
+    When the directory grows past max_bytes, expired entries and then the
+    least recently written ones are removed.
+
+    open/write/flock/rename and the sweep's directory scan run on a small
+    thread pool of their own, never on the event loop; flock in particular
+    can wait on another process. Sweeps are started in the background and
+    at most one runs at a time.
+    """
+
+    name = "mmap"
+    _HEADER = struct.Struct(">d")
+
+    def __init__(self, directory: str, max_bytes: int, io_threads: int = 4):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        os.makedirs(directory, exist_ok=True)
+        self._written_since_sweep = 0
+        self._executor = ThreadPoolExecutor(max_workers=max(io_threads, 1), thread_name_prefix="shared-cache")
+        self._sweeping: Optional[asyncio.Future] = None
+
+    def _path(self, key: str, suffix: str = ".v") -> str:
+        return os.path.join(self.directory, hashlib.blake2b(key.encode("utf-8"), digest_size=16).hexdigest() + suffix)
+
+    async def _run(self, fn: Callable[..., Any], *args) -> Any:
+        return await asyncio.get_running_loop().run_in_executor(self._executor, fn, *args)
+
+    async def get(self, key: str) -> Optional[memoryview]:
+        return await self._run(self._read, key)
+
+    async def set(self, key: str, value: bytes, ttl: float):
+        await self._run(self._write, key, value, ttl)
+        self._written_since_sweep += len(value)
+        if self._written_since_sweep >= self.max_bytes // 8 and (self._sweeping is None or self._sweeping.done()):
+            self._written_since_sweep = 0
+            # Not awaited: the entry is already published, and the caller should not wait on a directory scan
+            self._sweeping = asyncio.get_running_loop().run_in_executor(self._executor, self._sweep)
+
+    async def delete(self, key: str):
+        await self._run(self._delete, key)
+
+    async def incr(self, key: str) -> int:
+        return await self._run(self._incr, key)
+
+    async def get_int(self, key: str) -> int:
+        return await self._run(self._read_int, key)
+
+    def _read(self, key: str) -> Optional[memoryview]:
+        try:
+            with open(self._path(key), "rb") as f:
+                mapped = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        except (FileNotFoundError, ValueError):  # ValueError: empty file
+            return None
+        except OSError as e:
+            raise SharedCacheError(str(e)) from e
+        # The mapping outlives the file handle; a concurrent replace does not affect it
+        try:
+            (expires_at,) = self._HEADER.unpack_from(mapped)
+        except (struct.error, ValueError):
+            # Shorter than the header: truncated or not written by us; a miss, not an error
+            expires_at = None
+        # NaN (garbage in the header) compares false, so it is treated as expired too
+        if expires_at is None or not expires_at > time.time():
+            mapped.close()
+            return None
+        return memoryview(mapped)[self._HEADER.size:]
+
+    def _write(self, key: str, value: bytes, ttl: float):
+        path = self._path(key)
+        fd, staging = tempfile.mkstemp(dir=self.directory, suffix=".tmp")
+        try:
+            with os.fdopen(fd, "wb") as f:
+                f.write(self._HEADER.pack(time.time() + ttl))
+                f.write(value)
+            os.replace(staging, path)
+        except OSError as e:
+            try:
+                os.unlink(staging)
+            except OSError:
+                pass
+            raise SharedCacheError(str(e)) from e
+
+    def _delete(self, key: str):
+        try:
+            os.unlink(self._path(key))
+        except FileNotFoundError:
+            pass
+
+    def _incr(self, key: str) -> int:
+        if fcntl is None:  # pragma: no cover - Windows
+            raise SharedCacheError("counters need fcntl")
+        try:
+            with open(self._path(key, ".n"), "a+b") as f:
+                fcntl.flock(f, fcntl.LOCK_EX)
+                f.seek(0)
+                value = int(f.read() or b"0") + 1
+                f.seek(0)
+                f.truncate()
+                f.write(str(value).encode("ascii"))
+                return value
+        except (OSError, ValueError) as e:
+            raise SharedCacheError(str(e)) from e
+
+    def _read_int(self, key: str) -> int:
+        try:
+            with open(self._path(key, ".n"), "rb") as f:
+                return int(f.read() or b"0")
+        except FileNotFoundError:
+            return 0
+        except (OSError, ValueError) as e:
+            raise SharedCacheError(str(e)) from e
+
+    def _sweep(self):
+        now = time.time()
+        files = []
+        total = 0
+        try:
+            entries = list(os.scandir(self.directory))
+        except OSError as e:
+            logger.warning(f"Shared cache (mmap) sweep of {self.directory} failed: {e}")
+            return
+        for entry in entries:
+            if not entry.name.endswith(".v"):
+                continue
+            try:
+                with open(entry.path, "rb") as f:
+                    (expires_at,) = self._HEADER.unpack(f.read(self._HEADER.size))
+                stat = entry.stat()
+            except (OSError, struct.error):
+                continue
+            if not expires_at > now:  # expired, or a NaN header
+                self._unlink(entry.path)
+            else:
+                files.append((stat.st_mtime, stat.st_size, entry.path))
+                total += stat.st_size
+        for _, size, path in sorted(files):
+            if total <= self.max_bytes:
+                break
+            self._unlink(path)
+            total -= size
+
+    @staticmethod
+    def _unlink(path: str):
+        try:
+            os.unlink(path)
+        except OSError:
+            pass
+
+    async def close(self):
+        if self._sweeping is not None:
+            await self._sweeping
+        self._executor.shutdown(wait=False)
+
+
+class RedisBackend:
+    """Minimal asyncio RESP2 client for Redis-compatible servers"""
+
+    name = "redis"
+
+    def __init__(self, url: str, pool_size: int = 8, timeout: float = 1.0):
+        parsed = urlparse(url)
+        if parsed.scheme not in ("redis", ""):
+            raise ValueError(f"Unsupported cache URL scheme: {parsed.scheme}")
+        self.host = parsed.hostname or "localhost"
+        self.port = parsed.port or 6379
+        self.password = unquote(parsed.password) if parsed.password else None
+        self.username = unquote(parsed.username) if parsed.username else None
+        self.db = int(parsed.path.lstrip("/") or 0)
+        self.timeout = timeout
+        self._idle: asyncio.Queue = asyncio.Queue()
+        self._slots = asyncio.Semaphore(max(pool_size, 1))
+
+    async def _connect(self):
+        reader, writer = await asyncio.open_connection(self.host, self.port)
+        connection = (reader, writer)
+        if self.password:
+            auth = ("AUTH", self.username, self.password) if self.username else ("AUTH", self.password)
+            await self._roundtrip(connection, *auth)
+        if self.db:
+            await self._roundtrip(connection, "SELECT", self.db)
+        return connection
+
+    @staticmethod
+    def _encode(*args) -> bytes:
+        parts = [b"*%d\r\n" % len(args)]
+        for arg in args:
+            if not isinstance(arg, (bytes, bytearray, memoryview)):
+                arg = str(arg).encode("utf-8")
+            parts.append(b"$%d\r\n" % len(arg))
+            parts.append(bytes(arg))
+            parts.append(b"\r\n")
+        return b"".join(parts)
+
+    async def _read_reply(self, reader: asyncio.StreamReader):
+        line = await reader.readuntil(b"\r\n")
+        kind, rest = line[:1], line[1:-2]
+        if kind == b"+":
+            return rest.decode("utf-8")
+        if kind == b"-":
+            raise SharedCacheError(rest.decode("utf-8", "replace"))
+        if kind == b":":
+            return int(rest)
+        if kind == b"$":
+            length = int(rest)
+            if length < 0:
+                return None
+            return (await reader.readexactly(length + 2))[:-2]
+        if kind == b"*":
+            length = int(rest)
+            return None if length < 0 else [await self._read_reply(reader) for _ in range(length)]
+        raise SharedCacheError(f"Unexpected reply from cache server: {line[:32]!r}")
+
+    async def _roundtrip(self, connection, *args):
+        reader, writer = connection
+        writer.write(self._encode(*args))
+        await writer.drain()
+        return await self._read_reply(reader)
+
+    async def _command(self, *args):
+        async with self._slots:
+            connection = None
+            try:
+                async with asyncio.timeout(self.timeout):
+                    connection = self._idle.get_nowait() if not self._idle.empty() else await self._connect()
+                    reply = await self._roundtrip(connection, *args)
+            except SharedCacheError:
+                # A server error reply leaves the connection usable
+                if connection is not None:
+                    self._idle.put_nowait(connection)
+                raise
+            except (OSError, EOFError, asyncio.IncompleteReadError, asyncio.LimitOverrunError, TimeoutError) as e:
+                if connection is not None:
+                    connection[1].close()
+                raise SharedCacheError(f"{type(e).__name__}: {e}") from e
+            except BaseException:
+                # Cancelled mid-command: the reply may still arrive, so the connection cannot be reused
+                if connection is not None:
+                    connection[1].close()
+                raise
+            self._idle.put_nowait(connection)
+            return reply
+
+    async def get(self, key: str) -> Optional[bytes]:
+        return await self._command("GET", key)
+
+    async def set(self, key: str, value: bytes, ttl: float):
+        await self._command("SET", key, value, "PX", max(int(ttl * 1000), 1))
+
+    async def delete(self, key: str):
+        await self._command("DEL", key)
+
+    async def incr(self, key: str) -> int:
+        return await self._command("INCR", key)
+
+    async def get_int(self, key: str) -> int:
+        value = await self._command("GET", key)
+        return int(value) if value is not None else 0
+
+    async def close(self):
+        while not self._idle.empty():
+            self._idle.get_nowait()[1].close()
+
+
+class SharedCache:
+    """Namespaced access to a backend, with generation counters and error isolation"""
+
+    def __init__(self, backend, prefix: str = "shiftwork:"):
+        self.backend = backend
+        self.prefix = prefix
+        self.hits = 0
+        self.misses = 0
+        self.writes = 0
+        self.errors = 0
+        self.bytes_read = 0
+        self.bytes_written = 0
+
+    def _failed(self, operation: str, key: str, error: Exception):
+        self.errors += 1
+        logger.warning(f"Shared cache ({self.backend.name}) {operation} failed for {key}: {error}")
+
+    async def get(self, key: str):
+        """Bytes-like value, or None on a miss or backend error"""
+        try:
+            value = await self.backend.get(self.prefix + key)
+        except SharedCacheError as e:
+            self._failed("get", key, e)
+            return None
+        if value is None:
+            self.misses += 1
+            return None
+        self.hits += 1
+        self.bytes_read += len(value)
+        return value
+
+    async def set(self, key: str, value: bytes, ttl: float):
+        if ttl <= 0:
+            return
+        try:
+            await self.backend.set(self.prefix + key, value, ttl)
+        except SharedCacheError as e:
+            self._failed("set", key, e)
+            return
+        self.writes += 1
+        self.bytes_written += len(value)
+
+    async def generation(self, scope: str) -> Optional[int]:
+        """Current generation of scope (e.g. a company id), or None if the backend is unavailable"""
+        try:
+            return await self.backend.get_int(f"{self.prefix}gen:{scope}")
+        except SharedCacheError as e:
+            self._failed("generation", scope, e)
+            return None
+
+    async def bump(self, scope: str) -> Optional[int]:
+        """Start a new generation for scope, orphaning every entry keyed by the old one"""
+        try:
+            return await self.backend.incr(f"{self.prefix}gen:{scope}")
+        except SharedCacheError as e:
+            self._failed("bump", scope, e)
+            return None
+
+    async def close(self):
+        await self.backend.close()
+
+    def stats(self) -> dict:
+        lookups = self.hits + self.misses
+        return {
+            "backend": self.backend.name,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_ratio": round(self.hits / lookups, 4) if lookups else 0.0,
+            "writes": self.writes,
+            "errors": self.errors,
+            "bytes_read": self.bytes_read,
+            "bytes_written": self.bytes_written,
+        }
+
+
+def build_shared_cache(backend: str, *, mmap_dir: str, mmap_max_bytes: int, redis_url: str,
+                       redis_pool_size: int, timeout: float) -> Optional[SharedCache]:
+    """SharedCache for CACHE_BACKEND; None for the in-process ("memory") default"""
+    if backend in ("", "memory"):
+        return None
+    if backend == "mmap":
+        return SharedCache(MmapBackend(mmap_dir, mmap_max_bytes))
+    if backend == "redis":
+        return SharedCache(RedisBackend(redis_url, pool_size=redis_pool_size, timeout=timeout))
+    raise ValueError(f"Unknown CACHE_BACKEND: {backend!r} (expected memory, mmap or redis)")
@@ -0,0 +1,399 @@
+#!/usr/bin/env python3
+"""
+Asyncio SMTP client with a pool of authenticated connections
+
+- SMTPPool keeps up to pool_size connections open, each already through
+  EHLO, STARTTLS and AUTH, and hands them to concurrent send_message() calls;
+  a connection is retired after max_messages_per_connection messages or
+  idle_timeout seconds unused
+- With the server's PIPELINING extension, MAIL FROM, every RCPT TO and DATA
+  go out in one write and their replies are read back together (RFC 2920)
+- A 421 reply (the server closing the channel) or a dropped connection
+  discards that connection and the message is retried once on a fresh one
+- Nothing blocks the event loop: no smtplib, no thread hop per message
+
+No aiosmtplib dependency; the client covers the subset of RFC 5321 used for
+submission (EHLO/HELO, STARTTLS, AUTH PLAIN/LOGIN, MAIL/RCPT/DATA, RSET, QUIT).
+"""
+
+import asyncio
+import base64
+import logging
+import re
+import socket
+import ssl
+import time
+from collections import deque
+from email.message import Message
+from email.policy import SMTP as SMTP_POLICY
+from email.utils import getaddresses
+from typing import Dict, List, Optional, Sequence, Tuple, Union
+
+logger = logging.getLogger(__name__)
+
+_LINE_END = re.compile(rb"\r\n|\r|\n")
+_LEADING_DOT = re.compile(rb"^\.", re.MULTILINE)
+
+
+class SMTPError(Exception):
+    """Base class for SMTP delivery failures"""
+
+
+class SMTPReplyError(SMTPError):
+    """The server answered a command with an error code"""
+
+    def __init__(self, code: int, message: str, command: str = ""):
+        super().__init__(f"{code} {message}" + (f" (after {command})" if command else ""))
+        self.code = code
+        self.message = message
+        self.command = command
+
+    @property
+    def transient(self) -> bool:
+        """4xx replies mean "try again later"; 5xx are permanent"""
+        return 400 <= self.code < 500
+
+
+class SMTPConnectionError(SMTPError):
+    """The connection could not be opened or was lost mid-conversation"""
+
+
+class SMTPRecipientsRefused(SMTPError):
+    """Every recipient of a message was rejected"""
+
+    def __init__(self, refused: Dict[str, Tuple[int, str]]):
+        super().__init__(f"All recipients refused: {refused}")
+        self.refused = refused
+
+    @property
+    def transient(self) -> bool:
+        return all(400 <= code < 500 for code, _ in self.refused.values())
+
+
+def _quote_address(address: str) -> str:
+    return address if address.startswith("<") else f"<{address}>"
+
+
+def _data_payload(message: Union[Message, str, bytes]) -> bytes:
+    """Message as DATA payload: CRLF line endings, leading dots doubled, terminated by CRLF.CRLF"""
+    if isinstance(message, Message):
+        data = message.as_bytes(policy=SMTP_POLICY)
+    elif isinstance(message, str):
+        data = message.encode("utf-8")
+    else:
+        data = bytes(message)
+    data = _LEADING_DOT.sub(b"..", _LINE_END.sub(b"\r\n", data))
+    if not data.endswith(b"\r\n"):
+        data += b"\r\n"
+    return data + b".\r\n"
+
+
+def _envelope_recipients(message: Union[Message, str, bytes]) -> List[str]:
+    if not isinstance(message, Message):
+        return []
+    fields = message.get_all("To", []) + message.get_all("Cc", []) + message.get_all("Bcc", [])
+    return [address for _, address in getaddresses(fields) if address]
+
+
+class SMTPConnection:
+    """One authenticated SMTP session"""
+
+    def __init__(self, host: str, port: int, *, username: Optional[str] = None, password: Optional[str] = None,
+                 starttls: bool = True, implicit_tls: bool = False, ssl_context: Optional[ssl.SSLContext] = None,
+                 timeout: float = 30.0, local_hostname: Optional[str] = None):
+        self.host = host
+        self.port = port
+        self.username = username
+        self.password = password
+        self.starttls = starttls
+        self.implicit_tls = implicit_tls
+        self.ssl_context = ssl_context
+        self.timeout = timeout
+        self.local_hostname = local_hostname or socket.gethostname()
+        self.extensions: Dict[str, str] = {}
+        self.messages_sent = 0
+        self.last_used = time.monotonic()
+        # False once the session can no longer be trusted (lost, 421, cancelled mid-command)
+        self.usable = False
+        self._reader: Optional[asyncio.StreamReader] = None
+        self._writer: Optional[asyncio.StreamWriter] = None
+
+    def _tls_context(self) -> ssl.SSLContext:
+        if self.ssl_context is None:
+            self.ssl_context = ssl.create_default_context()
+        return self.ssl_context
+
+    async def connect(self):
+        try:
+            async with asyncio.timeout(self.timeout):
+                self._reader, self._writer = await asyncio.open_connection(
+                    self.host, self.port,
+                    ssl=self._tls_context() if self.implicit_tls else None,
+                    server_hostname=self.host if self.implicit_tls else None,
+                )
+                self._expect(await self._read_reply(), 220, "connect")
+                await self._ehlo()
+                if self.starttls and not self.implicit_tls:
+                    if "starttls" not in self.extensions:
+                        raise SMTPError(f"{self.host} does not offer STARTTLS")
+                    self._expect(await self._command("STARTTLS"), 220, "STARTTLS")
+                    await self._writer.start_tls(self._tls_context(), server_hostname=self.host)
+                    # Capabilities may change once the channel is encrypted
+                    await self._ehlo()
+                if self.username:
+                    await self._login()
+        except BaseException as e:
+            self.abort()
+            if isinstance(e, (OSError, EOFError, asyncio.IncompleteReadError, TimeoutError)):
+                raise SMTPConnectionError(f"Could not connect to {self.host}:{self.port}: {type(e).__name__}: {e}") from e
+            raise
+        self.usable = True
+        self.last_used = time.monotonic()
+
+    async def _read_reply(self) -> Tuple[int, str]:
+        lines = []
+        while True:
+            line = await self._reader.readline()
+            if not line:
+                raise SMTPConnectionError("Connection closed by server")
+            line = line.rstrip(b"\r\n")
+            if len(line) < 3 or not line[:3].isdigit():
+                raise SMTPConnectionError(f"Malformed reply from server: {line[:64]!r}")
+            lines.append(line[4:].decode("utf-8", "replace"))
+            if line[3:4] != b"-":
+                return int(line[:3]), "\n".join(lines)
+
+    async def _command(self, line: str) -> Tuple[int, str]:
+        self._writer.write(line.encode("utf-8") + b"\r\n")
+        await self._writer.drain()
+        return await self._read_reply()
+
+    def _expect(self, reply: Tuple[int, str], expected: int, command: str):
+        code, message = reply
+        if code == 421:
+            # Service closing the channel; nothing more can be sent on it
+            self.usable = False
+        if code != expected:
+            raise SMTPReplyError(code, message, command)
+
+    async def _ehlo(self):
+        code, message = await self._command(f"EHLO {self.local_hostname}")
+        if code != 250:
+            self._expect(await self._command(f"HELO {self.local_hostname}"), 250, "HELO")
+            self.extensions = {}
+            return
+        self.extensions = {}
+        for line in message.split("\n")[1:]:
+            keyword, _, params = line.partition(" ")
+            self.extensions[keyword.lower()] = params
+
+    async def _login(self):
+        mechanisms = self.extensions.get("auth", "").upper().split()
+        if "PLAIN" in mechanisms or not mechanisms:
+            token = base64.b64encode(f"\0{self.username}\0{self.password}".encode("utf-8")).decode("ascii")
+            self._expect(await self._command(f"AUTH PLAIN {token}"), 235, "AUTH")
+        elif "LOGIN" in mechanisms:
+            self._expect(await self._command("AUTH LOGIN"), 334, "AUTH")
+            user = base64.b64encode(self.username.encode("utf-8")).decode("ascii")
+            self._expect(await self._command(user), 334, "AUTH")
+            password = base64.b64encode(self.password.encode("utf-8")).decode("ascii")
+            self._expect(await self._command(password), 235, "AUTH")
+        else:
+            raise SMTPError(f"No supported AUTH mechanism offered by {self.host}: {mechanisms}")
+
+    async def send(self, sender: str, recipients: Sequence[str], payload: bytes) -> Dict[str, Tuple[int, str]]:
+        """Deliver one message; returns the refused recipients (like smtplib.sendmail)"""
+        try:
+            async with asyncio.timeout(self.timeout):
+                refused = await self._transaction(sender, recipients, payload)
+        except SMTPReplyError:
+            if self.usable:
+                await self._reset()
+            raise
+        except SMTPRecipientsRefused:
+            await self._reset()
+            raise
+        except (OSError, EOFError, asyncio.IncompleteReadError, TimeoutError) as e:
+            self.abort()
+            raise SMTPConnectionError(f"{type(e).__name__}: {e}") from e
+        except BaseException:
+            # Cancelled mid-transaction: replies may still be in flight
+            self.abort()
+            raise
+        self.messages_sent += 1
+        self.last_used = time.monotonic()
+        return refused
+
+    async def _transaction(self, sender: str, recipients: Sequence[str], payload: bytes) -> Dict[str, Tuple[int, str]]:
+        commands = [f"MAIL FROM:{_quote_address(sender)}"] + [f"RCPT TO:{_quote_address(r)}" for r in recipients]
+        names = ["MAIL FROM"] + ["RCPT TO"] * len(recipients) + ["DATA"]
+        pipelined = "pipelining" in self.extensions
+        if pipelined:
+            self._writer.write(b"".join(c.encode("utf-8") + b"\r\n" for c in commands + ["DATA"]))
+            await self._writer.drain()
+        replies = []
+        for command in commands + ["DATA"]:
+            if not pipelined:
+                if command == "DATA" and not (replies[0][0] == 250 and any(code in (250, 251) for code, _ in replies[1:])):
+                    replies.append((503, "not sent"))
+                    break
+                reply = await self._command(command)
+            else:
+                reply = await self._read_reply()
+            if reply[0] == 421:
+                # The server closes the channel after a 421, so no further replies will come
+                self._expect(reply, 250, names[len(replies)])
+            replies.append(reply)
+            if not pipelined and replies[0][0] != 250:
+                break
+
+        self._expect(replies[0], 250, "MAIL FROM")
+        refused = {
+            recipient: reply
+            for recipient, reply in zip(recipients, replies[1:-1])
+            if reply[0] not in (250, 251)
+        }
+        data_reply = replies[-1]
+        if len(refused) == len(recipients):
+            if data_reply[0] == 354:
+                # Pipelined DATA was accepted although nobody will receive it; end it empty
+                self._writer.write(b".\r\n")
+                await self._writer.drain()
+                await self._read_reply()
+            raise SMTPRecipientsRefused(refused)
+        self._expect(data_reply, 354, "DATA")
+        self._writer.write(payload)
+        await self._writer.drain()
+        self._expect(await self._read_reply(), 250, "end of DATA")
+        return refused
+
+    async def _reset(self):
+        try:
+            async with asyncio.timeout(self.timeout):
+                code, _ = await self._command("RSET")
+            if code != 250:
+                self.usable = False
+        except Exception:
+            self.abort()
+
+    async def quit(self):
+        if self._writer is None:
+            return
+        if self.usable:
+            try:
+                async with asyncio.timeout(min(self.timeout, 5.0)):
+                    await self._command("QUIT")
+            except Exception:
+                pass
+        self.abort()
+
+    def abort(self):
+        self.usable = False
+        if self._writer is not None:
+            self._writer.close()
+            self._writer = None
+            self._reader = None
+
+
+class SMTPPool:
+    """Up to pool_size reusable SMTP sessions shared by concurrent senders"""
+
+    def __init__(self, host: str, port: int, *, username: Optional[str] = None, password: Optional[str] = None,
+                 sender: Optional[str] = None, starttls: bool = True, implicit_tls: bool = False,
+                 ssl_context: Optional[ssl.SSLContext] = None, pool_size: int = 4,
+                 max_messages_per_connection: int = 100, idle_timeout: float = 30.0, timeout: float = 30.0):
+        self.host = host
+        self.port = port
+        self.sender = sender or username
+        self.pool_size = max(pool_size, 1)
+        self.max_messages_per_connection = max(max_messages_per_connection, 1)
+        self.idle_timeout = idle_timeout
+        self._connection_options = dict(
+            username=username, password=password, starttls=starttls, implicit_tls=implicit_tls,
+            ssl_context=ssl_context, timeout=timeout,
+        )
+        self._idle: deque = deque()
+        self._slots = asyncio.Semaphore(self.pool_size)
+        self.sent = 0
+        self.failed = 0
+        self.connections_opened = 0
+        self.reconnects = 0
+
+    async def _acquire(self) -> SMTPConnection:
+        now = time.monotonic()
+        while self._idle:
+            connection = self._idle.pop()
+            if connection.usable and now - connection.last_used < self.idle_timeout:
+                return connection
+            await connection.quit()
+        connection = SMTPConnection(self.host, self.port, **self._connection_options)
+        await connection.connect()
+        self.connections_opened += 1
+        return connection
+
+    async def _release(self, connection: SMTPConnection):
+        if connection.usable and connection.messages_sent < self.max_messages_per_connection:
+            self._idle.append(connection)
+        else:
+            await connection.quit()
+
+    async def send_message(self, message: Union[Message, str, bytes], sender: Optional[str] = None,
+                           recipients: Optional[Sequence[str]] = None) -> Dict[str, Tuple[int, str]]:
+        """Send a message (email Message, or raw RFC 5322 text) on a pooled connection.
+
+        Recipients default to the message's To/Cc/Bcc headers. Returns the
+        recipients the server refused while accepting the others; raises
+        SMTPError subclasses when the message was not accepted at all.
+        """
+        sender = sender or self.sender
+        recipients = list(recipients) if recipients else _envelope_recipients(message)
+        if not sender or not recipients:
+            raise ValueError("A sender and at least one recipient are required")
+        payload = _data_payload(message)
+        async with self._slots:
+            for attempt in range(2):
+                try:
+                    connection = await self._acquire()
+                except SMTPError:
+                    self.failed += 1
+                    raise
+                reused = connection.messages_sent > 0
+                try:
+                    refused = await connection.send(sender, recipients, payload)
+                except SMTPReplyError as e:
+                    await self._release(connection)
+                    if e.code == 421 and attempt == 0:
+                        self.reconnects += 1
+                        logger.info("SMTP server closed the session (421); retrying on a new connection")
+                        continue
+                    self.failed += 1
+                    raise
+                except SMTPConnectionError as e:
+                    # A pooled session may have been dropped by the server while idle
+                    if reused and attempt == 0:
+                        self.reconnects += 1
+                        logger.info(f"Pooled SMTP connection lost ({e}); retrying on a new connection")
+                        continue
+                    self.failed += 1
+                    raise
+                except SMTPError:
+                    await self._release(connection)
+                    self.failed += 1
+                    raise
+                await self._release(connection)
+                self.sent += 1
+                return refused
+
+    async def close(self):
+        while self._idle:
+            await self._idle.pop().quit()
+
+    def stats(self) -> dict:
+        return {
+            "pool_size": self.pool_size,
+            "idle": len(self._idle),
+            "sent": self.sent,
+            "failed": self.failed,
+            "connections_opened": self.connections_opened,
+            "reconnects": self.reconnects,
+        }
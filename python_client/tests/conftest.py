@@ -0,0 +1,20 @@
+"""Shared pytest setup: the modules under test live one directory up and are imported as top-level modules"""
+
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import pytest
+
+
+@pytest.fixture
+async def server():
+    """A ShiftWorkServer that is never started; tests drive its methods directly"""
+    from http_mcp_server import ShiftWorkServer
+
+    instance = ShiftWorkServer()
+    yield instance
+    instance.offloader.shutdown()
+    if instance.http_client is not None:
+        await instance.http_client.aclose()
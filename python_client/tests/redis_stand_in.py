@@ -0,0 +1,102 @@
+"""
+Minimal local RESP2 server for tests, standing in for Redis
+
+Understands the commands RedisBackend sends (AUTH, SELECT, GET, SET with PX,
+INCR, DEL) against one dict per database. Every command is recorded with
+the index of the connection that sent it.
+"""
+
+import asyncio
+import time
+from typing import Dict, List, Optional, Tuple
+
+
+class StandInRedisServer:
+    """RESP2 server on 127.0.0.1 with an ephemeral port.
+
+    password: require AUTH with this password (and username, if given) before other commands.
+    """
+
+    def __init__(self, *, password: Optional[str] = None, username: Optional[str] = None):
+        self.password = password
+        self.username = username
+        self.databases: Dict[int, Dict[bytes, Tuple[bytes, float]]] = {}
+        self.commands: List[Tuple[int, List[bytes]]] = []
+        self.connections = 0
+        self.port = 0
+        self._server: Optional[asyncio.AbstractServer] = None
+
+    async def __aenter__(self) -> "StandInRedisServer":
+        self._server = await asyncio.start_server(self._handle, "127.0.0.1", 0)
+        self.port = self._server.sockets[0].getsockname()[1]
+        return self
+
+    async def __aexit__(self, *exc):
+        self._server.close()
+        await self._server.wait_closed()
+
+    def url(self, db: int = 0, credentials: str = "") -> str:
+        return f"redis://{credentials}127.0.0.1:{self.port}/{db}"
+
+    def value(self, key: str, db: int = 0) -> Optional[bytes]:
+        entry = self.databases.get(db, {}).get(key.encode("utf-8"))
+        return entry[0] if entry is not None else None
+
+    def names(self) -> List[str]:
+        return [args[0].decode().upper() for _, args in self.commands]
+
+    @staticmethod
+    async def _read_command(reader: asyncio.StreamReader) -> List[bytes]:
+        header = await reader.readuntil(b"\r\n")
+        assert header[:1] == b"*", header
+        args = []
+        for _ in range(int(header[1:-2])):
+            length = int((await reader.readuntil(b"\r\n"))[1:-2])
+            args.append((await reader.readexactly(length + 2))[:-2])
+        return args
+
+    async def _handle(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        index = self.connections
+        self.connections += 1
+        db = 0
+        authenticated = self.password is None
+        try:
+            while True:
+                try:
+                    args = await self._read_command(reader)
+                except (asyncio.IncompleteReadError, ConnectionError):
+                    return
+                self.commands.append((index, args))
+                name = args[0].decode().upper()
+                store = self.databases.setdefault(db, {})
+                if name == "AUTH":
+                    credentials = tuple(a.decode() for a in args[1:])
+                    expected = (self.username, self.password) if self.username else (self.password,)
+                    authenticated = credentials == expected
+                    writer.write(b"+OK\r\n" if authenticated else b"-WRONGPASS invalid username-password pair\r\n")
+                elif not authenticated:
+                    writer.write(b"-NOAUTH Authentication required.\r\n")
+                elif name == "SELECT":
+                    db = int(args[1])
+                    writer.write(b"+OK\r\n")
+                elif name == "GET":
+                    entry = store.get(args[1])
+                    if entry is None or entry[1] <= time.monotonic():
+                        writer.write(b"$-1\r\n")
+                    else:
+                        writer.write(b"$%d\r\n%s\r\n" % (len(entry[0]), entry[0]))
+                elif name == "SET":
+                    ttl = int(args[4]) / 1000 if len(args) > 4 and args[3].upper() == b"PX" else float("inf")
+                    store[args[1]] = (args[2], time.monotonic() + ttl)
+                    writer.write(b"+OK\r\n")
+                elif name == "INCR":
+                    value = int(store.get(args[1], (b"0",))[0]) + 1
+                    store[args[1]] = (str(value).encode(), float("inf"))
+                    writer.write(b":%d\r\n" % value)
+                elif name == "DEL":
+                    writer.write(b":%d\r\n" % (store.pop(args[1], None) is not None))
+                else:
+                    writer.write(b"-ERR unknown command '%s'\r\n" % args[0])
+                await writer.drain()
+        finally:
+            writer.close()
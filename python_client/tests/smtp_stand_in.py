@@ -0,0 +1,182 @@
+"""
+Minimal local SMTP server for tests, in the spirit of aiosmtpd's Controller
+
+Speaks EHLO/HELO, AUTH PLAIN/LOGIN, MAIL/RCPT/DATA, RSET and QUIT. Every
+read from a connection is recorded as the list of commands it carried, so
+tests can tell pipelined commands (one read) from lock-step ones.
+"""
+
+import asyncio
+import base64
+from dataclasses import dataclass, field
+from typing import Callable, Dict, List, Optional, Set, Tuple
+
+
+@dataclass
+class Session:
+    """What one client connection did"""
+    reads: List[List[str]] = field(default_factory=list)
+    authenticated: Optional[str] = None
+    messages: int = 0
+
+
+@dataclass
+class Delivered:
+    sender: str
+    recipients: List[str]
+    data: bytes
+
+
+class StandInSMTPServer:
+    """SMTP server on 127.0.0.1 with an ephemeral port.
+
+    pipelining: advertise PIPELINING in the EHLO reply.
+    auth: (username, password) to require, advertised as AUTH PLAIN LOGIN.
+    refuse: recipients whose RCPT TO gets a 550.
+    defer: recipient -> how many of its RCPT TOs get a 450 before one is accepted.
+    reply_421: called with (session index, command) before each MAIL FROM; when
+    it returns True the server answers 421 and closes that connection.
+    """
+
+    def __init__(self, *, pipelining: bool = True, auth: Optional[Tuple[str, str]] = None,
+                 refuse: Set[str] = frozenset(), defer: Optional[Dict[str, int]] = None,
+                 reply_421: Optional[Callable[[int, str], bool]] = None):
+        self.pipelining = pipelining
+        self.auth = auth
+        self.refuse = set(refuse)
+        self.defer = dict(defer or {})
+        self.reply_421 = reply_421
+        self.sessions: List[Session] = []
+        self.delivered: List[Delivered] = []
+        self.port = 0
+        self._server: Optional[asyncio.AbstractServer] = None
+
+    async def __aenter__(self) -> "StandInSMTPServer":
+        self._server = await asyncio.start_server(self._handle, "127.0.0.1", 0)
+        self.port = self._server.sockets[0].getsockname()[1]
+        return self
+
+    async def __aexit__(self, *exc):
+        self._server.close()
+        await self._server.wait_closed()
+
+    def _extensions(self) -> List[str]:
+        extensions = ["8BITMIME"]
+        if self.pipelining:
+            extensions.append("PIPELINING")
+        if self.auth:
+            extensions.append("AUTH PLAIN LOGIN")
+        return extensions
+
+    async def _handle(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        session = Session()
+        self.sessions.append(session)
+        index = len(self.sessions) - 1
+        pending = b""
+        sender: Optional[str] = None
+        recipients: List[str] = []
+        data: Optional[List[bytes]] = None
+        login: Optional[List[str]] = None
+
+        def reply(line: str):
+            writer.write(line.encode("utf-8") + b"\r\n")
+
+        try:
+            reply("220 stand-in ESMTP")
+            await writer.drain()
+            while True:
+                chunk = await reader.read(65536)
+                if not chunk:
+                    return
+                pending += chunk
+                lines = pending.split(b"\r\n")
+                pending = lines.pop()
+                commands: List[str] = []
+                session.reads.append(commands)
+                for raw in lines:
+                    if data is not None:
+                        if raw == b".":
+                            session.messages += 1
+                            self.delivered.append(Delivered(sender, recipients, b"\r\n".join(data) + b"\r\n"))
+                            sender, recipients, data = None, [], None
+                            reply("250 OK queued")
+                        else:
+                            data.append(raw[1:] if raw.startswith(b"..") else raw)
+                        continue
+                    line = raw.decode("utf-8")
+                    commands.append(line)
+                    verb = line.split(" ", 1)[0].upper()
+                    if login is not None:
+                        login.append(base64.b64decode(line).decode("utf-8"))
+                        if len(login) == 1:
+                            reply("334 UGFzc3dvcmQ6")
+                        else:
+                            ok = tuple(login) == self.auth
+                            session.authenticated = login[0] if ok else None
+                            login = None
+                            reply("235 Authenticated" if ok else "535 Authentication failed")
+                    elif verb == "EHLO":
+                        writer.write("".join(f"250-{e}\r\n" for e in ["stand-in"] + self._extensions()[:-1]).encode())
+                        reply(f"250 {self._extensions()[-1]}")
+                    elif verb == "HELO":
+                        reply("250 stand-in")
+                    elif verb == "AUTH":
+                        mechanism, _, initial = line[5:].partition(" ")
+                        if mechanism.upper() == "PLAIN":
+                            _, user, password = base64.b64decode(initial).decode("utf-8").split("\0")
+                            ok = (user, password) == self.auth
+                            session.authenticated = user if ok else None
+                            reply("235 Authenticated" if ok else "535 Authentication failed")
+                        else:
+                            login = []
+                            reply("334 VXNlcm5hbWU6")
+                    elif verb == "MAIL":
+                        if self.reply_421 is not None and self.reply_421(index, line):
+                            reply("421 Service closing transmission channel")
+                            await writer.drain()
+                            return
+                        if self.auth and session.authenticated is None:
+                            reply("530 Authentication required")
+                            continue
+                        sender, recipients = line.split(":", 1)[1].strip("<>"), []
+                        reply("250 OK")
+                    elif verb == "RCPT":
+                        address = line.split(":", 1)[1].strip("<>")
+                        if sender is None:
+                            reply("503 Need MAIL first")
+                        elif address in self.refuse:
+                            reply("550 No such user")
+                        elif self.defer.get(address, 0) > 0:
+                            self.defer[address] -= 1
+                            reply("450 Mailbox busy, try again later")
+                        else:
+                            recipients.append(address)
+                            reply("250 OK")
+                    elif verb == "DATA":
+                        if sender is None or not recipients:
+                            reply("554 No valid recipients")
+                        else:
+                            data = []
+                            reply("354 End data with <CR><LF>.<CR><LF>")
+                    elif verb == "RSET":
+                        sender, recipients = None, []
+                        reply("250 OK")
+                    elif verb == "QUIT":
+                        reply("221 Bye")
+                        await writer.drain()
+                        return
+                    else:
+                        reply("502 Command not implemented")
+                if not commands:
+                    session.reads.pop()
+                await writer.drain()
+        finally:
+            writer.close()
+
+    def commands(self, session: int = 0) -> List[str]:
+        """Every command a session sent, in order"""
+        return [command for read in self.sessions[session].reads for command in read]
+
+    def mail_reads(self, session: int = 0) -> List[List[str]]:
+        """The reads of a session that carried a MAIL FROM"""
+        return [read for read in self.sessions[session].reads if any(c.startswith("MAIL") for c in read)]
@@ -0,0 +1,125 @@
+"""RouteLimiter fairness, displacement and Retry-After, plus the 503 the middleware turns shedding into"""
+
+import asyncio
+
+import pytest
+from aiohttp.test_utils import TestClient, TestServer
+
+import http_mcp_server
+from admission import AdmissionController, Overloaded, RouteLimiter
+
+
+async def _queue(limiter: RouteLimiter, caller: str, granted: list) -> asyncio.Task:
+    async def waiter():
+        await limiter.acquire(caller)
+        granted.append(caller)
+
+    task = asyncio.ensure_future(waiter())
+    await asyncio.sleep(0)  # let it reach the queue
+    return task
+
+
+async def test_free_slots_are_granted_round_robin_by_caller():
+    limiter = RouteLimiter("/r", limit=1, max_queue=10, max_queue_time=5)
+    await limiter.acquire("holder")
+    granted = []
+    tasks = [await _queue(limiter, caller, granted) for caller in ("a", "a", "a", "b", "c")]
+    assert limiter.stats()["queued_callers"] == 3
+
+    for _ in tasks:
+        limiter.release()
+        await asyncio.sleep(0)
+    await asyncio.gather(*tasks)
+    # "a" queued first but gets one slot per turn, not all three before "b" and "c"
+    assert granted == ["a", "b", "c", "a", "a"]
+    assert limiter.in_flight == 1 and limiter.queued == 0
+
+
+async def test_full_queue_displaces_the_heaviest_callers_newest_waiter():
+    limiter = RouteLimiter("/r", limit=1, max_queue=3, max_queue_time=5)
+    await limiter.acquire("holder")
+    granted = []
+    heavy = [await _queue(limiter, "heavy", granted) for _ in range(3)]
+
+    light = await _queue(limiter, "light", granted)
+    with pytest.raises(Overloaded) as displaced:
+        await heavy[2]
+    assert displaced.value.reason == "displaced by fair share"
+
+    # The heaviest caller cannot displace its own waiters
+    with pytest.raises(Overloaded) as shed:
+        await limiter.acquire("heavy")
+    assert shed.value.reason == "queue full"
+
+    other = await _queue(limiter, "other", granted)
+    with pytest.raises(Overloaded, match="displaced"):
+        await heavy[1]
+    # Every caller now has one waiter, so nobody is displaced and a newcomer is shed
+    with pytest.raises(Overloaded, match="queue full"):
+        await limiter.acquire("late")
+
+    for _ in range(3):
+        limiter.release()
+        await asyncio.sleep(0)
+    await asyncio.gather(heavy[0], light, other)
+    assert granted == ["heavy", "light", "other"]
+    stats = limiter.stats()
+    assert (stats["displaced"], stats["shed_queue_full"]) == (2, 2)
+
+
+async def test_waiting_past_max_queue_time_is_shed():
+    limiter = RouteLimiter("/r", limit=1, max_queue=10, max_queue_time=0.02)
+    await limiter.acquire("holder")
+    with pytest.raises(Overloaded, match="queue timeout"):
+        await limiter.acquire("a")
+    assert limiter.queued == 0
+    assert limiter.stats()["shed_queue_timeout"] == 1
+
+
+async def test_cancelled_waiter_leaves_the_queue():
+    limiter = RouteLimiter("/r", limit=1, max_queue=10, max_queue_time=5)
+    await limiter.acquire("holder")
+    task = await _queue(limiter, "a", [])
+    task.cancel()
+    with pytest.raises(asyncio.CancelledError):
+        await task
+    assert limiter.queued == 0
+    limiter.release()
+    assert limiter.in_flight == 0
+
+
+def test_retry_after_tracks_service_time_and_queue_depth():
+    limiter = RouteLimiter("/r", limit=2, max_queue=10, max_queue_time=5)
+    assert limiter.retry_after() == 1
+    limiter.in_flight = 1
+    for _ in range(40):
+        limiter.in_flight += 1
+        limiter.release(duration=3.0)
+    # EWMA has converged on 3s; one request ahead of a newcomer on 2 slots
+    limiter.queued = 1
+    assert limiter.retry_after() == 3
+    limiter.queued = 1000
+    assert limiter.retry_after() == 60
+
+
+async def test_shed_request_gets_503_with_retry_after(server, monkeypatch):
+    monkeypatch.setattr(http_mcp_server, "ADMISSION_CONTROL", True)
+    monkeypatch.setattr(http_mcp_server, "AUTH_TOKEN", None)
+    server.admission = AdmissionController(default_limit=1, max_queue=0, max_queue_time=1.0)
+    limiter = server.admission.limiter("/api/tools")
+    await limiter.acquire("someone-else")
+    limiter._service_time = 2.5
+
+    client = TestClient(TestServer(server.http_app))
+    await client.start_server()
+    try:
+        response = await client.get("/api/tools")
+        assert response.status == 503
+        assert response.headers["Retry-After"] == "3"
+        # Exempt paths are never shed
+        assert (await client.get("/ping")).status == 200
+        limiter.release()
+        assert (await client.get("/api/tools")).status == 200
+    finally:
+        await client.close()
+    assert server.admission.stats()["/api/tools"]["shed_queue_full"] == 1
@@ -0,0 +1,192 @@
+"""Bulk email pipeline: token-bucket pacing, which failures are retried, and the per-recipient report"""
+
+import asyncio
+import math
+from types import SimpleNamespace
+
+import httpx
+import pytest
+
+import bulk_email
+from bulk_email import BulkReport, RecipientResult, TokenBucket, is_transient, run_bulk
+from smtp_pool import SMTPConnectionError, SMTPPool, SMTPRecipientsRefused, SMTPReplyError
+from smtp_stand_in import StandInSMTPServer
+
+_real_sleep = asyncio.sleep
+
+
+class FakeClock:
+    """Monotonic time that only moves when bulk_email sleeps"""
+
+    def __init__(self):
+        self.now = 0.0
+        self.sleeps = []
+
+    def monotonic(self) -> float:
+        return self.now
+
+    async def sleep(self, seconds: float):
+        self.sleeps.append(seconds)
+        # Like real time, a sleep always moves the clock on, however small the delay
+        self.now = max(self.now + seconds, math.nextafter(self.now, math.inf))
+        await _real_sleep(0)
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    fake = FakeClock()
+    monkeypatch.setattr(bulk_email, "time", SimpleNamespace(monotonic=fake.monotonic))
+    monkeypatch.setattr(bulk_email, "asyncio", SimpleNamespace(
+        Lock=asyncio.Lock, Queue=asyncio.Queue, gather=asyncio.gather, TimeoutError=asyncio.TimeoutError,
+        sleep=fake.sleep,
+    ))
+    return fake
+
+
+async def test_token_bucket_allows_a_burst_then_paces(clock):
+    bucket = TokenBucket(rate=10, burst=3)
+    times = []
+    for _ in range(7):
+        await bucket.acquire()
+        times.append(round(clock.now, 6))
+    assert times == [0, 0, 0, 0.1, 0.2, 0.3, 0.4]
+    assert bucket.waited == pytest.approx(0.4)
+
+
+async def test_token_bucket_refills_while_idle_up_to_the_burst(clock):
+    bucket = TokenBucket(rate=2, burst=2)
+    await bucket.acquire()
+    await bucket.acquire()
+    clock.now += 60
+    await bucket.acquire()
+    await bucket.acquire()
+    assert clock.sleeps == []
+    await bucket.acquire()
+    assert clock.sleeps == [pytest.approx(0.5)]
+
+
+async def test_concurrent_waiters_share_the_rate(clock):
+    bucket = TokenBucket(rate=4, burst=1)
+    times = []
+
+    async def send():
+        await bucket.acquire()
+        times.append(clock.now)
+
+    await asyncio.gather(*(send() for _ in range(5)))
+    assert times == pytest.approx([0, 0.25, 0.5, 0.75, 1.0])
+
+
+async def test_zero_rate_is_unlimited(clock):
+    bucket = TokenBucket(rate=0)
+    for _ in range(100):
+        await bucket.acquire()
+    assert clock.sleeps == []
+
+
+@pytest.mark.parametrize("error, transient", [
+    (SMTPConnectionError("reset"), True),
+    (SMTPReplyError(451, "Local error"), True),
+    (SMTPReplyError(554, "Rejected"), False),
+    (SMTPRecipientsRefused({"a@example.com": (450, "busy")}), True),
+    (SMTPRecipientsRefused({"a@example.com": (450, "busy"), "b@example.com": (550, "no user")}), False),
+    (httpx.HTTPStatusError("", request=httpx.Request("GET", "http://api"), response=httpx.Response(503)), True),
+    (httpx.HTTPStatusError("", request=httpx.Request("GET", "http://api"), response=httpx.Response(429)), True),
+    (httpx.HTTPStatusError("", request=httpx.Request("GET", "http://api"), response=httpx.Response(404)), False),
+    (httpx.ConnectError("refused"), True),
+    (ValueError("bad template"), False),
+])
+def test_transient_classification(error, transient):
+    assert is_transient(error) is transient
+
+
+def _message(recipient: str) -> str:
+    return f"From: schedules@example.com\r\nTo: {recipient}\r\nSubject: Schedule\r\n\r\nHello\r\n"
+
+
+async def test_run_bulk_against_the_stand_in(clock):
+    recipients = ["ok@example.com", "busy@example.com", "gone@example.com", "flaky@example.com",
+                  "missing@example.com"]
+    fetches = {}
+    prepared, progress, send_times = [], [], []
+
+    async def prepare(recipient):
+        fetches[recipient] = fetches.get(recipient, 0) + 1
+        if recipient == "flaky@example.com" and fetches[recipient] == 1:
+            raise httpx.HTTPStatusError("", request=httpx.Request("GET", "http://api"), response=httpx.Response(503))
+        if recipient == "missing@example.com":
+            raise httpx.HTTPStatusError("", request=httpx.Request("GET", "http://api"), response=httpx.Response(404))
+        return _message(recipient)
+
+    # busy@ gets a 450 twice before it is accepted; gone@ gets a 550
+    async with StandInSMTPServer(refuse={"gone@example.com"}, defer={"busy@example.com": 2}) as server:
+        pool = SMTPPool("127.0.0.1", server.port, sender="schedules@example.com", starttls=False, timeout=5.0)
+
+        async def send(recipient, message):
+            send_times.append(clock.now)
+            await pool.send_message(message, recipients=[recipient])
+
+        report = await run_bulk(
+            recipients, key=lambda r: r, prepare=prepare, send=send,
+            limiter=TokenBucket(rate=5, burst=1), concurrency=3, max_attempts=4,
+            prepared=prepared.append, progress=lambda report, result: progress.append(result.key),
+        )
+        await pool.close()
+
+    assert sorted(d.recipients[0] for d in server.delivered) == ["busy@example.com", "flaky@example.com",
+                                                                 "ok@example.com"]
+    # Every send went through the 5/s bucket, retries included
+    gaps = [b - a for a, b in zip(send_times, send_times[1:])]
+    assert len(send_times) == 6 and all(gap >= 0.2 - 1e-9 for gap in gaps)
+
+    results = report.results
+    assert (results["ok@example.com"].ok, results["ok@example.com"].attempts) == (True, 2)
+    # Transient 4xx: retried until accepted (1 fetch + 3 sends)
+    assert (results["busy@example.com"].ok, results["busy@example.com"].attempts) == (True, 4)
+    # Transient fetch failure: retried (2 fetches + 1 send)
+    assert (results["flaky@example.com"].ok, results["flaky@example.com"].attempts) == (True, 3)
+    # Permanent 5xx: reported at once (1 fetch + 1 send)
+    gone = results["gone@example.com"]
+    assert (gone.ok, gone.attempts, gone.stage) == (False, 2, "send")
+    assert "550" in gone.error
+    # Permanent fetch failure: never sent
+    missing = results["missing@example.com"]
+    assert (missing.ok, missing.attempts, missing.stage) == (False, 1, "fetch")
+    assert fetches["missing@example.com"] == 1
+
+    summary = report.summary()
+    assert (summary["total"], summary["sent"], summary["failed"], summary["retried"]) == (5, 3, 2, 2)
+    assert set(summary["failures"]) == {"gone@example.com", "missing@example.com"}
+    assert report.as_results() == {r: r in ("ok@example.com", "busy@example.com", "flaky@example.com")
+                                   for r in recipients}
+    assert sorted(prepared) == sorted(progress) == sorted(recipients)
+
+
+async def test_transient_failures_stop_at_max_attempts(clock):
+    sends = []
+
+    async def send(item, message):
+        sends.append(item)
+        raise SMTPReplyError(451, "Try later")
+
+    async def prepare(item):
+        return "message"
+
+    report = await run_bulk(["a"], key=str, prepare=prepare, send=send, max_attempts=3, backoff_base=1.0)
+    assert sends == ["a", "a", "a"]
+    result = report.results["a"]
+    assert (result.ok, result.attempts, result.stage) == (False, 4, "send")
+    # Backoff between attempts, capped by full jitter at base * 2^(n-1)
+    assert len(clock.sleeps) == 2 and clock.sleeps[0] <= 1.0 and clock.sleeps[1] <= 2.0
+
+
+def test_report_counts():
+    report = BulkReport(total=3, started=10.0, finished=12.0)
+    report.results["a"] = RecipientResult("a", True, 2)
+    report.results["b"] = RecipientResult("b", True, 5)
+    report.results["c"] = RecipientResult("c", False, 2, "send", "SMTPReplyError: 550 No such user")
+    assert (report.done, report.sent, report.failed, report.elapsed) == (3, 2, 1, 2.0)
+    assert report.summary() == {
+        "total": 3, "sent": 2, "failed": 1, "retried": 1, "elapsed_seconds": 2.0, "per_second": 1.5,
+        "failures": {"c": "send: SMTPReplyError: 550 No such user"},
+    }
@@ -0,0 +1,121 @@
+"""_call_upstream: in-flight accounting, breaker bookkeeping and outcome labels"""
+
+import asyncio
+
+import httpx
+import pytest
+
+import http_mcp_server
+from resilience import CircuitBreaker
+
+PATH = "/api/companies/c1/schedules"
+
+
+@pytest.fixture(autouse=True)
+def fixed_backoff(monkeypatch):
+    monkeypatch.setattr(http_mcp_server, "HTTPX_RETRIES", 3)
+    monkeypatch.setattr(http_mcp_server, "full_jitter_backoff", lambda attempt, base, cap: 0.05)
+
+
+def _outcomes(server) -> dict:
+    return {labels[1]: count for labels, count in server.m_upstream_requests._values.items()}
+
+
+def _transport_error():
+    return httpx.ConnectError("refused", request=httpx.Request("GET", "http://api" + PATH))
+
+
+async def test_backoff_is_not_counted_as_in_flight(server):
+    seen = []
+
+    async def send():
+        seen.append(server._upstream_in_flight)
+        if len(seen) == 1:
+            raise _transport_error()
+        return "ok"
+
+    task = asyncio.ensure_future(server._call_upstream(PATH, send))
+    await asyncio.sleep(0.02)
+    # First attempt failed and the retry has not started: nothing is in flight during the backoff
+    assert server._upstream_in_flight == 0
+    assert await task == "ok"
+    assert seen == [1, 1]
+    assert server._upstream_in_flight == 0
+    assert _outcomes(server) == {"transport_error": 1, "ok": 1}
+
+
+async def test_cancel_during_backoff_leaves_probe_free(server, monkeypatch):
+    breaker = server._breaker_for(PATH)
+    breaker._state = CircuitBreaker.HALF_OPEN
+
+    async def send():
+        raise _transport_error()
+
+    # The failed probe re-opens the breaker; once the reset timeout passes a new probe must be possible
+    monkeypatch.setattr(breaker, "reset_timeout", 0.01)
+    task = asyncio.ensure_future(server._call_upstream(PATH, send))
+    await asyncio.sleep(0.02)
+    task.cancel()
+    with pytest.raises(asyncio.CancelledError):
+        await task
+    assert server._upstream_in_flight == 0
+    assert breaker.state == CircuitBreaker.HALF_OPEN
+    assert breaker.allow()
+
+
+async def test_cancelled_attempt_releases_half_open_probe(server):
+    breaker = server._breaker_for(PATH)
+    breaker._state = CircuitBreaker.HALF_OPEN
+    started = asyncio.Event()
+
+    async def send():
+        started.set()
+        await asyncio.sleep(10)
+
+    task = asyncio.ensure_future(server._call_upstream(PATH, send))
+    await started.wait()
+    task.cancel()
+    with pytest.raises(asyncio.CancelledError):
+        await task
+    assert _outcomes(server) == {"cancelled": 1}
+    # No verdict: the next request may probe
+    assert breaker.allow()
+
+
+async def test_parse_error_counts_against_breaker_without_retry(server):
+    calls = []
+
+    async def send():
+        calls.append(1)
+        raise ValueError("Expected a JSON array")
+
+    with pytest.raises(ValueError):
+        await server._call_upstream(PATH, send)
+    assert len(calls) == 1
+    assert _outcomes(server) == {"parse_error": 1}
+    assert server._breaker_for(PATH).consecutive_failures == 1
+
+
+async def test_unexpected_error_is_not_reported_as_cancelled(server):
+    async def send():
+        raise KeyError("personId")
+
+    with pytest.raises(KeyError):
+        await server._call_upstream(PATH, send)
+    assert _outcomes(server) == {"error": 1}
+    assert server._upstream_in_flight == 0
+
+
+async def test_client_error_is_not_retried(server):
+    calls = []
+
+    async def send():
+        calls.append(1)
+        request = httpx.Request("GET", "http://api" + PATH)
+        raise httpx.HTTPStatusError("forbidden", request=request, response=httpx.Response(403, request=request))
+
+    with pytest.raises(httpx.HTTPStatusError):
+        await server._call_upstream(PATH, send)
+    assert len(calls) == 1
+    assert _outcomes(server) == {"client_error": 1}
+    assert server._breaker_for(PATH).consecutive_failures == 0
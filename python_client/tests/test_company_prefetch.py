@@ -0,0 +1,192 @@
+"""Company prefetch for bulk emails: paging through execute_batch, the last page, the per-employee fallback and
+splitting rows by employee"""
+
+import gc
+import json
+import weakref
+
+import httpx
+import pytest
+
+from http_smtp_client import EmailConfig, HTTPScheduleEmailer, HTTPShiftWorkClient, ScheduleEmailData
+
+
+class FakeGateway:
+    """Stands in for the gateway's tool endpoints, serving each company's schedules in pages"""
+
+    def __init__(self, rows: dict, page_size: int = 2, paged_tool: bool = True, failing_pages: set = frozenset()):
+        self.rows = rows  # company_id -> schedule rows
+        self.page_size = page_size
+        self.paged_tool = paged_tool
+        self.failing_pages = set(failing_pages)
+        self.requests = []  # ("execute", page) / ("batch", [pages]) / ("employee", person_id) / ("missing", None)
+
+    def _page(self, arguments: dict) -> dict:
+        rows = self.rows.get(arguments["company_id"])
+        if rows is None:
+            return {"company_id": arguments["company_id"], "error": "Company not found"}
+        page = arguments["page"]
+        total_pages = -(-len(rows) // self.page_size)
+        items = rows[(page - 1) * self.page_size:page * self.page_size]
+        return {"company_id": arguments["company_id"], "page": page, "total_pages": total_pages, "items": items}
+
+    def handler(self, request: httpx.Request) -> httpx.Response:
+        path = request.url.path
+        if path.startswith("/api/employees/"):
+            company_id, person_id = path.split("/")[3:5]
+            self.requests.append(("employee", person_id))
+            schedules = [r for r in self.rows.get(company_id, []) if str(r["personId"]) == person_id]
+            return httpx.Response(200, json={"company_id": company_id, "person_id": person_id,
+                                             "total_schedules": len(schedules), "schedules": schedules})
+        if not self.paged_tool:
+            self.requests.append(("missing", None))
+            return httpx.Response(404, json={"error": "Unknown tool: get_schedules_paged"})
+        body = json.loads(request.content)
+        if path == "/api/tools/execute":
+            self.requests.append(("execute", body["arguments"]["page"]))
+            return httpx.Response(200, json={"tool_name": body["tool_name"], "result": self._page(body["arguments"])})
+        pages = [call["arguments"]["page"] for call in body["calls"]]
+        self.requests.append(("batch", pages))
+        results = []
+        for index, call in enumerate(body["calls"]):
+            page = call["arguments"]["page"]
+            if page in self.failing_pages:
+                self.failing_pages.discard(page)
+                results.append({"index": index, "ok": False, "status": 503, "error": "Service unavailable"})
+            else:
+                results.append({"index": index, "ok": True, "result": self._page(call["arguments"])})
+        return httpx.Response(200, json={"results": results})
+
+
+def _rows(count: int, people: int = 3, company_id: str = "c1") -> list:
+    return [{"scheduleId": n, "personId": n % people, "companyId": company_id} for n in range(count)]
+
+
+@pytest.fixture
+async def client():
+    client = HTTPShiftWorkClient("http://gateway")
+    yield client
+    await client.close()
+
+
+def _serve(client: HTTPShiftWorkClient, gateway: FakeGateway):
+    client.client = httpx.AsyncClient(transport=httpx.MockTransport(gateway.handler))
+
+
+async def test_pages_after_the_first_go_through_execute_batch(client):
+    gateway = FakeGateway({"c1": _rows(90)}, page_size=2)
+    _serve(client, gateway)
+    schedules = await client.get_company_schedules("c1", page_size=2)
+
+    assert [s["scheduleId"] for s in schedules] == list(range(90))
+    # 45 pages: page 1 on its own, then batches of COMPANY_PAGES_PER_BATCH (20)
+    assert gateway.requests == [("execute", 1), ("batch", list(range(2, 22))), ("batch", list(range(22, 42))),
+                                ("batch", [42, 43, 44, 45])]
+
+
+@pytest.mark.parametrize("count, expected", [(0, []), (1, [0]), (2, [0, 1])])
+async def test_single_page_or_empty_company_needs_no_batch(client, count, expected):
+    gateway = FakeGateway({"c1": _rows(count)}, page_size=2)
+    _serve(client, gateway)
+    schedules = await client.get_company_schedules("c1", page_size=2)
+    assert [s["scheduleId"] for s in schedules] == expected
+    assert gateway.requests == [("execute", 1)]
+
+
+async def test_page_failing_inside_a_batch_is_retried_on_its_own(client):
+    gateway = FakeGateway({"c1": _rows(10)}, page_size=2, failing_pages={3})
+    _serve(client, gateway)
+    schedules = await client.get_company_schedules("c1", page_size=2)
+    assert [s["scheduleId"] for s in schedules] == list(range(10))
+    assert gateway.requests == [("execute", 1), ("batch", [2, 3, 4, 5]), ("execute", 3)]
+
+
+async def test_unknown_company_gives_none(client):
+    _serve(client, FakeGateway({}))
+    assert await client.get_company_schedules("c9") is None
+
+
+class FakeSMTPPool:
+    def __init__(self, on_send=None):
+        self.sent = []
+        self.on_send = on_send
+
+    async def send_message(self, message, sender, recipients):
+        if self.on_send:
+            self.on_send(recipients[0])
+        self.sent.append((recipients[0], message))
+
+
+def _emailer(gateway: FakeGateway, on_send=None) -> HTTPScheduleEmailer:
+    emailer = HTTPScheduleEmailer(EmailConfig("127.0.0.1", 25, "schedules@example.com", "", use_tls=False,
+                                              send_rate=0, html_email=False, company_locale=False))
+    _serve(emailer.http_client, gateway)
+    emailer.smtp_pool = FakeSMTPPool(on_send)
+    return emailer
+
+
+def _requests(*recipients) -> list:
+    return [ScheduleEmailData(company_id=company_id, person_id=str(person_id),
+                              recipient_email=f"p{person_id}@{company_id}.example.com")
+            for company_id, person_id in recipients]
+
+
+async def test_bulk_run_splits_each_company_by_employee():
+    gateway = FakeGateway({"c1": _rows(9), "c2": _rows(4, people=2, company_id="c2")}, page_size=1000)
+    emailer = _emailer(gateway)
+    requests = _requests(("c1", 0), ("c2", 1), ("c1", 1), ("c1", 2), ("c1", 7), ("c9", 0))
+    report = await emailer.run_bulk_schedule_emails(requests)
+    await emailer.http_client.close()
+
+    assert report.sent == 6
+    # One page request per company, however many of its employees get an email
+    assert sorted(gateway.requests) == [("execute", 1)] * 3
+    schedules = {f"{r.person_id}@{r.company_id}": [s["scheduleId"] for s in r.schedules] for r in requests}
+    assert schedules == {"0@c1": [0, 3, 6], "1@c1": [1, 4, 7], "2@c1": [2, 5, 8], "7@c1": [],
+                         "1@c2": [1, 3], "0@c9": []}
+    assert requests[-1].error == "Company c9 not found"
+
+
+async def test_company_is_dropped_after_its_last_recipient(monkeypatch):
+    class Rows(dict):
+        pass
+
+    kept = {}
+    seen_alive = {}
+
+    async def prefetch(company_id, start_date, end_date):
+        by_person = Rows()
+        for row in gateway.rows[company_id]:
+            by_person.setdefault(str(row["personId"]), []).append(row)
+        kept[company_id] = weakref.ref(by_person)
+        return by_person
+
+    def on_send(recipient):
+        # With one recipient at a time, c1 is finished before c2's first email is sent
+        if recipient.endswith("@c2.example.com"):
+            gc.collect()
+            seen_alive.setdefault("c1", kept["c1"]() is not None)
+
+    gateway = FakeGateway({"c1": _rows(6), "c2": _rows(2, company_id="c2")})
+    emailer = _emailer(gateway, on_send)
+    monkeypatch.setattr(emailer, "_prefetch_company", prefetch)
+    report = await emailer.run_bulk_schedule_emails(_requests(("c1", 0), ("c2", 0), ("c1", 1)), concurrency=1)
+    await emailer.http_client.close()
+
+    assert report.sent == 3
+    assert seen_alive == {"c1": False}
+
+
+async def test_falls_back_to_per_employee_fetches_without_the_paged_tool():
+    gateway = FakeGateway({"c1": _rows(6)}, paged_tool=False)
+    emailer = _emailer(gateway)
+    requests = _requests(("c1", 0), ("c1", 1), ("c1", 2))
+    report = await emailer.run_bulk_schedule_emails(requests, concurrency=1)
+    await emailer.http_client.close()
+
+    assert report.sent == 3 and report.failed == 0
+    assert [[s["scheduleId"] for s in r.schedules] for r in requests] == [[0, 3], [1, 4], [2, 5]]
+    # Only the first recipient tried the paged tool; the rest went straight to the per-employee endpoint
+    assert [kind for kind, _ in gateway.requests] == ["missing", "employee", "employee", "employee"]
+    assert len(emailer.smtp_pool.sent) == 3
+
@@ -0,0 +1,158 @@
+"""ConditionalStore: 304 reuse, content-digest short-circuit, and export/adopt between processes"""
+
+import hashlib
+import json
+
+import httpx
+import pytest
+
+from schedule_cache import ConditionalStore
+from shared_cache import pack_value, unpack_value
+
+PATH = "/api/companies/c1/people"
+BODY = json.dumps([{"personId": 6, "name": "Ada"}, {"personId": 7, "name": "Grace"}]).encode("utf-8")
+KEY = (PATH, (), "scope")
+
+
+def _digest(body: bytes) -> bytes:
+    return hashlib.blake2b(body, digest_size=16).digest()
+
+
+class Upstream:
+    """httpx handler that serves BODY (or a replacement) and records the conditional headers it was sent"""
+
+    def __init__(self, etag=None, last_modified=None):
+        self.body = BODY
+        self.etag = etag
+        self.last_modified = last_modified
+        self.status = None
+        self.seen = []
+
+    def __call__(self, request: httpx.Request) -> httpx.Response:
+        conditional = {name: request.headers[name] for name in ("If-None-Match", "If-Modified-Since")
+                       if name in request.headers}
+        self.seen.append(conditional)
+        if self.status is not None:
+            return httpx.Response(self.status)
+        if self.etag and conditional.get("If-None-Match") == self.etag:
+            return httpx.Response(304, headers={"ETag": self.etag})
+        headers = {}
+        if self.etag:
+            headers["ETag"] = self.etag
+        if self.last_modified:
+            headers["Last-Modified"] = self.last_modified
+        return httpx.Response(200, content=self.body, headers=headers)
+
+
+@pytest.fixture
+def parsed():
+    return []
+
+
+@pytest.fixture
+def parse(parsed):
+    def parse(body: bytes):
+        parsed.append(body)
+        return json.loads(body)
+    return parse
+
+
+def _serve(server, upstream):
+    server.http_client = httpx.AsyncClient(base_url="http://api", transport=httpx.MockTransport(upstream))
+
+
+async def test_304_reuses_the_parsed_body(server, parse, parsed):
+    upstream = Upstream(etag='"v1"', last_modified="Sat, 17 Oct 2026 08:00:00 GMT")
+    _serve(server, upstream)
+    first, size = await server._http_get_json(PATH, parse=parse)
+    again, again_size = await server._http_get_json(PATH, parse=parse)
+
+    assert again is first and again_size == size == len(BODY)
+    assert len(parsed) == 1
+    assert upstream.seen == [{}, {"If-None-Match": '"v1"', "If-Modified-Since": "Sat, 17 Oct 2026 08:00:00 GMT"}]
+    counters = server.conditional_store.stats()["endpoints"]["/api/companies/{id}/people"]
+    assert (counters["requests"], counters["not_modified"], counters["bytes_saved"]) == (2, 1, len(BODY))
+
+
+async def test_304_without_a_stored_body_refetches_unconditionally(server, parse, parsed):
+    upstream = Upstream(etag='"v1"')
+
+    def evicting(request: httpx.Request) -> httpx.Response:
+        # The stored body is evicted while the conditional request is in flight
+        if "If-None-Match" in request.headers:
+            server.conditional_store.discard_where(lambda key: True)
+        return upstream(request)
+
+    _serve(server, evicting)
+    await server._http_get_json(PATH, parse=parse)
+    value, _ = await server._http_get_json(PATH, parse=parse)
+    assert value == json.loads(BODY)
+    assert upstream.seen == [{}, {"If-None-Match": '"v1"'}, {}]
+    assert len(parsed) == 2
+
+
+async def test_identical_body_without_validators_is_not_parsed_again(server, parse, parsed):
+    upstream = Upstream()
+    _serve(server, upstream)
+    first, _ = await server._http_get_json(PATH, parse=parse)
+    again, _ = await server._http_get_json(PATH, parse=parse)
+    assert again is first
+    assert len(parsed) == 1
+    assert upstream.seen == [{}, {}]
+
+    upstream.body = json.dumps([{"personId": 6, "name": "Ada Lovelace"}]).encode("utf-8")
+    changed, size = await server._http_get_json(PATH, parse=parse)
+    assert changed == [{"personId": 6, "name": "Ada Lovelace"}]
+    assert size == len(upstream.body)
+    assert len(parsed) == 2
+    counters = server.conditional_store.stats()["endpoints"]["/api/companies/{id}/people"]
+    assert counters["unchanged"] == 1
+
+
+async def test_404_discards_the_stored_body(server, parse):
+    upstream = Upstream(etag='"v1"')
+    _serve(server, upstream)
+    await server._http_get_json(PATH, parse=parse)
+    upstream.status = 404
+    assert await server._http_get_json(PATH, parse=parse) == (None, 0)
+    assert server.conditional_store.stats()["entries"] == 0
+
+
+def test_unchanged_needs_a_matching_digest():
+    store = ConditionalStore(max_entries=10, max_bytes=10_000)
+    assert store.headers_for(KEY, "people") == {}
+    assert store.not_modified(KEY, "people") is None
+    store.store(KEY, "people", ["parsed"], len(BODY), {}, _digest(BODY))
+    assert store.headers_for(KEY, "people") == {}
+    assert store.unchanged(KEY, _digest(BODY), "people") == ["parsed"]
+    assert store.unchanged(KEY, _digest(BODY + b" "), "people") is None
+    assert store.unchanged(("other", (), "scope"), _digest(BODY), "people") is None
+
+
+def test_export_and_adopt_carry_validators_and_digest():
+    exporting = ConditionalStore(max_entries=10, max_bytes=10_000)
+    exporting.store(KEY, "people", json.loads(BODY), len(BODY),
+                    {"ETag": '"v1"', "Last-Modified": "Sat, 17 Oct 2026 08:00:00 GMT"}, _digest(BODY))
+    assert exporting.export(("missing", (), "scope")) is None
+    # The shared tier stores the export as MessagePack (or JSON) bytes
+    state = unpack_value(pack_value(exporting.export(KEY)))
+
+    adopting = ConditionalStore(max_entries=10, max_bytes=10_000)
+    assert KEY not in adopting
+    adopting.adopt(KEY, state)
+    assert KEY in adopting
+    assert adopting.headers_for(KEY, "people") == {
+        "If-None-Match": '"v1"', "If-Modified-Since": "Sat, 17 Oct 2026 08:00:00 GMT",
+    }
+    assert adopting.not_modified(KEY, "people") == (json.loads(BODY), len(BODY))
+    assert adopting.unchanged(KEY, _digest(BODY), "people") == json.loads(BODY)
+    assert adopting.stats()["bytes"] == len(BODY)
+
+
+def test_store_is_bounded_by_bytes():
+    store = ConditionalStore(max_entries=10, max_bytes=2 * len(BODY))
+    for n in range(3):
+        store.store((f"/p{n}", (), "scope"), "people", n, len(BODY), {}, _digest(BODY))
+    assert ("/p0", (), "scope") not in store
+    assert ("/p2", (), "scope") in store
+    assert store.stats()["evictions"] == 1
@@ -0,0 +1,102 @@
+"""Per-call deadlines: nesting, timeout clamping, and how MCP and HTTP callers see invalid or missed deadlines"""
+
+import asyncio
+
+import httpx
+import pytest
+from aiohttp.test_utils import TestClient, TestServer
+from mcp import types
+
+import http_mcp_server
+from http_mcp_server import _tool_timeout
+from resilience import deadline_remaining, deadline_scope
+
+
+async def test_tighter_deadline_wins_when_nested():
+    async with deadline_scope(10):
+        async with deadline_scope(0.5):
+            assert 0.4 < deadline_remaining() <= 0.5
+        # An inner scope cannot extend the outer one
+        async with deadline_scope(0.2):
+            async with deadline_scope(60):
+                assert deadline_remaining() <= 0.2
+        assert 9 < deadline_remaining() <= 10
+    assert deadline_remaining() is None
+
+
+async def test_deadline_cancels_the_body():
+    with pytest.raises(TimeoutError):
+        async with deadline_scope(10):
+            async with deadline_scope(0.01):
+                await asyncio.sleep(5)
+
+
+async def test_tasks_started_inside_a_scope_inherit_its_deadline():
+    async with deadline_scope(0.5):
+        remaining = await asyncio.ensure_future(asyncio.sleep(0, deadline_remaining()))
+    assert 0 < remaining <= 0.5
+
+
+def test_tool_timeout_defaults_and_clamping(monkeypatch):
+    monkeypatch.setattr(http_mcp_server, "TOOL_TIMEOUT_SECONDS", 30.0)
+    monkeypatch.setattr(http_mcp_server, "TOOL_TIMEOUT_MAX_SECONDS", 120.0)
+    monkeypatch.setattr(http_mcp_server, "TOOL_TIMEOUTS", {"get_schedules_paged": 5.0})
+
+    assert _tool_timeout("ping") == 30.0
+    assert _tool_timeout("get_schedules_paged", None, "") == 5.0
+    # The shortest caller value wins, and callers cannot ask for more than the cap
+    assert _tool_timeout("ping", "2.5", 10) == 2.5
+    assert _tool_timeout("ping", 600) == 120.0
+    for bad in ("soon", -1, 0, float("nan")):
+        with pytest.raises(ValueError):
+            _tool_timeout("ping", bad)
+
+
+async def _call_mcp_tool(server, name: str, arguments: dict) -> str:
+    handler = server.server.request_handlers[types.CallToolRequest]
+    result = await handler(types.CallToolRequest(
+        method="tools/call", params=types.CallToolRequestParams(name=name, arguments=arguments)))
+    return result.root.content[0].text
+
+
+@pytest.mark.parametrize("timeout", [-1, 0])
+async def test_mcp_call_with_invalid_timeout_is_an_invalid_argument(server, timeout):
+    text = await _call_mcp_tool(server, "ping", {"timeout_seconds": timeout})
+    assert text == "Invalid argument: timeout must be positive"
+    assert 'gateway_tool_calls_total{tool="ping",transport="mcp",outcome="invalid"} 1' in server.metrics.render()
+
+
+async def test_mcp_call_past_its_deadline(server):
+    async def upstream(request: httpx.Request) -> httpx.Response:
+        await asyncio.sleep(5)
+        return httpx.Response(200, json=[])
+
+    server.http_client = httpx.AsyncClient(base_url="http://api", transport=httpx.MockTransport(upstream))
+    text = await _call_mcp_tool(server, "get_employee_schedules",
+                                {"company_id": "c1", "person_id": "6", "timeout_seconds": 0.05})
+    assert text == "Deadline exceeded"
+
+
+async def test_http_call_past_its_deadline_gets_504(server, monkeypatch):
+    monkeypatch.setattr(http_mcp_server, "AUTH_TOKEN", None)
+
+    async def upstream(request: httpx.Request) -> httpx.Response:
+        await asyncio.sleep(5)
+        return httpx.Response(200, json=[])
+
+    server.http_client = httpx.AsyncClient(base_url="http://api", transport=httpx.MockTransport(upstream))
+    client = TestClient(TestServer(server.http_app))
+    await client.start_server()
+    try:
+        body = {"tool_name": "get_employee_schedules", "arguments": {"company_id": "c1", "person_id": "6"}}
+        response = await client.post("/api/tools/execute", json=body, headers={"X-Request-Timeout": "0.05"})
+        assert response.status == 504
+        assert (await response.json())["error"] == "Deadline exceeded"
+
+        response = await client.get("/api/employees/c1/6/schedules", headers={"X-Request-Timeout": "0.05"})
+        assert response.status == 504
+
+        response = await client.post("/api/tools/execute", json=body, headers={"X-Request-Timeout": "-3"})
+        assert response.status == 400
+    finally:
+        await client.close()
@@ -0,0 +1,133 @@
+"""EmailQueue leases, idempotency and crash-safe resume"""
+
+import asyncio
+import time
+
+import pytest
+
+from email_queue import EmailQueue, drain, idempotency_key
+from smtp_pool import SMTPConnectionError
+
+SCHEDULES = [{"scheduleId": 1, "personId": 6, "startDate": "2026-10-19T08:00:00"},
+             {"scheduleId": 2, "personId": 6, "startDate": "2026-10-20T08:00:00"}]
+
+
+@pytest.fixture
+def path(tmp_path):
+    return str(tmp_path / "queue.sqlite3")
+
+
+async def _enqueue(queue: EmailQueue, count: int):
+    for n in range(count):
+        await queue.enqueue(f"c1:{n}:v1", f"p{n}@example.com", "sender@example.com", b"Subject: x\r\n\r\nhi\r\n")
+
+
+def test_idempotency_key_tracks_schedule_content():
+    reordered = [{key: row[key] for key in reversed(list(row))} for row in SCHEDULES]
+    assert idempotency_key("c1", "6", SCHEDULES) == idempotency_key("c1", "6", reordered)
+    assert idempotency_key("c1", "6", SCHEDULES).startswith("c1:6:")
+    changed = [dict(SCHEDULES[0], startDate="2026-10-19T09:00:00"), SCHEDULES[1]]
+    assert idempotency_key("c1", "6", changed) != idempotency_key("c1", "6", SCHEDULES)
+    assert idempotency_key("c1", "6", None) == idempotency_key("c1", "6", [])
+
+
+async def test_reenqueue_of_same_key_is_a_no_op(path):
+    key = idempotency_key("c1", "6", SCHEDULES)
+    async with EmailQueue(path) as queue:
+        assert await queue.enqueue(key, "a@example.com", "sender@example.com", b"first")
+        assert not await queue.enqueue(key, "a@example.com", "sender@example.com", b"second")
+        [email] = await queue.claim("w1")
+        assert email.message == b"first"
+        await queue.mark_sent(email.id)
+        # A sent key stays recorded, so a re-run does not email the person again
+        assert await queue.contains(key)
+        assert not await queue.enqueue(key, "a@example.com", "sender@example.com", b"third")
+        assert await queue.stats() == {"pending": 0, "sending": 0, "sent": 1, "failed": 0}
+
+
+async def test_expired_lease_is_claimed_again(path):
+    async with EmailQueue(path, lease_seconds=0.05) as queue:
+        await _enqueue(queue, 1)
+        [first] = await queue.claim("w1")
+        assert first.attempts == 1
+        # Leased to w1: nobody else may take it until the lease runs out
+        assert await queue.claim("w2") == []
+        await asyncio.sleep(0.1)
+        [again] = await queue.claim("w2")
+        assert (again.id, again.attempts) == (first.id, 2)
+
+
+async def test_lease_expiring_on_last_attempt_fails_the_message(path):
+    async with EmailQueue(path, lease_seconds=0.01, max_attempts=2) as queue:
+        await _enqueue(queue, 1)
+        for _ in range(2):
+            assert len(await queue.claim("crashing-worker")) == 1
+            await asyncio.sleep(0.03)
+        assert await queue.claim("w2") == []
+        assert await queue.stats() == {"pending": 0, "sending": 0, "sent": 0, "failed": 1}
+        assert await queue.next_due() is None
+        row = queue._db.execute("SELECT last_error FROM emails").fetchone()
+    assert "Lease expired on attempt 2 of 2" in row[0]
+
+
+async def test_concurrent_claims_never_share_a_message(path):
+    # Two queue objects are two connections on two threads, like two processes draining one file
+    async with EmailQueue(path) as first, EmailQueue(path) as second:
+        await _enqueue(first, 40)
+        claimed = {"a": [], "b": []}
+
+        async def claim_all(queue: EmailQueue, name: str):
+            while True:
+                emails = await queue.claim(name, limit=3)
+                if not emails:
+                    return
+                claimed[name].extend(email.id for email in emails)
+
+        await asyncio.gather(claim_all(first, "a"), claim_all(second, "b"))
+        ids = claimed["a"] + claimed["b"]
+        assert sorted(ids) == sorted(set(ids))
+        assert len(ids) == 40
+        assert await first.stats() == {"pending": 0, "sending": 40, "sent": 0, "failed": 0}
+
+
+async def test_drain_resumes_after_a_crashed_worker(path):
+    async with EmailQueue(path, lease_seconds=0.05) as queue:
+        await _enqueue(queue, 3)
+        # A worker took a message and died before marking it sent
+        [orphan] = await queue.claim("dead-worker")
+
+    sent = []
+
+    async def send(email):
+        sent.append(email.idempotency_key)
+
+    async with EmailQueue(path, lease_seconds=0.05) as queue:
+        counts = await drain(queue, send, workers=2, poll_interval=0.02)
+        assert counts == {"sent": 3, "retried": 0, "failed": 0}
+        assert sorted(sent) == ["c1:0:v1", "c1:1:v1", "c1:2:v1"]
+        assert orphan.idempotency_key in sent
+        assert await queue.stats() == {"pending": 0, "sending": 0, "sent": 3, "failed": 0}
+
+
+async def test_drain_retries_transient_failures_then_gives_up(path):
+    calls = []
+
+    async def send(email):
+        calls.append(time.monotonic())
+        raise SMTPConnectionError("connection reset")
+
+    async with EmailQueue(path, max_attempts=3) as queue:
+        await _enqueue(queue, 1)
+        counts = await drain(queue, send, backoff_base=0.01, backoff_cap=0.02, poll_interval=0.01)
+        assert counts == {"sent": 0, "retried": 2, "failed": 1}
+        assert len(calls) == 3
+        assert await queue.stats() == {"pending": 0, "sending": 0, "sent": 0, "failed": 1}
+        assert await queue.requeue_failed() == 1
+        assert await queue.stats() == {"pending": 1, "sending": 0, "sent": 0, "failed": 0}
+
+
+async def test_close_is_idempotent(path):
+    queue = EmailQueue(path)
+    await _enqueue(queue, 1)
+    await queue.close()
+    await queue.close()
@@ -0,0 +1,269 @@
+"""Compiled email templates against the string-building loop they replaced, and where an email's language comes from"""
+
+import asyncio
+from datetime import datetime
+
+import httpx
+import pytest
+from aiohttp.test_utils import TestClient, TestServer
+from mcp import types
+
+import http_mcp_server
+from email_templates import EmailView, templates_for
+from http_smtp_client import EmailConfig, HTTPScheduleEmailer, HTTPShiftWorkClient, ScheduleEmailData
+
+NOW = datetime(2026, 10, 17, 9, 5, 3)
+
+SCHEDULES = [
+    {"scheduleId": 1, "personId": 6, "startDate": "2026-10-19T08:00:00", "description": None, "status": "published"},
+    # Braces, template-looking text and HTML specials in values must come out untouched
+    {"scheduleId": 2, "personId": 6, "name": "Café {employee} <b>&</b>", "hours": 7.5, "tags": ["a", "b"]},
+    # A different shape, including keys the templates would treat as fields
+    {"{company_id}": "x", "key with \"quotes\"": 'it\'s', "emoji": "✓"},
+    {},
+]
+
+
+def legacy_mime_body(email_data: ScheduleEmailData, error=None) -> str:
+    """The plain-text part http_smtp_client built before the compiled templates (datetime.now() pinned)"""
+    if email_data.schedules and len(email_data.schedules) > 0:
+        schedule_count = len(email_data.schedules)
+        body = f"""Hello,
+
+Here is the work schedule information for employee {email_data.employee_name or email_data.person_id}:
+
+Company ID: {email_data.company_id}
+Employee ID: {email_data.person_id}
+Total Schedules: {schedule_count}
+
+Schedule Details:
+"""
+
+        for i, schedule in enumerate(email_data.schedules, 1):
+            body += f"\n--- Schedule {i} ---\n"
+            for key, value in schedule.items():
+                body += f"{key}: {value}\n"
+            body += "\n"
+
+        body += f"""
+This email was generated automatically on {NOW.strftime('%Y-%m-%d %H:%M:%S')}.
+
+Best regards,
+ShiftWork Schedule System
+"""
+    else:
+        error_msg = ""
+        if error:
+            error_msg = f"\n\nError: {error}"
+
+        body = f"""Hello,
+
+No schedules found for employee {email_data.employee_name or email_data.person_id} in company {email_data.company_id}.{error_msg}
+
+This email was generated automatically on {NOW.strftime('%Y-%m-%d %H:%M:%S')}.
+
+Best regards,
+ShiftWork Schedule System
+"""
+    return body
+
+
+def legacy_simple_email(email_data: ScheduleEmailData, sender: str, error=None) -> str:
+    """The simple-text fallback: the same body behind Subject/From/To lines"""
+    return (f"Subject: Work Schedule for {email_data.employee_name or email_data.person_id}\n"
+            f"From: {sender}\nTo: {email_data.recipient_email}\n\n" + legacy_mime_body(email_data, error))
+
+
+CASES = {
+    "schedules": (SCHEDULES, None),
+    "one schedule": (SCHEDULES[:1], None),
+    "empty": ([], None),
+    "none": (None, None),
+    "error": ([], "Company c1 not found"),
+}
+
+
+@pytest.mark.parametrize("case", list(CASES))
+@pytest.mark.parametrize("employee_name", ["Ada Lovelace", None])
+def test_text_output_matches_the_old_renderer_byte_for_byte(case, employee_name):
+    schedules, error = CASES[case]
+    email_data = ScheduleEmailData(company_id="c1", person_id="6", recipient_email="ada@example.com",
+                                   employee_name=employee_name, schedules=schedules)
+    view = EmailView(company_id="c1", person_id="6", recipient="ada@example.com",
+                     employee=employee_name or "6", sender="schedules@example.com",
+                     schedules=schedules, error=error, generated_at=NOW)
+    templates = templates_for("en")
+
+    assert templates.render_text(view).encode("utf-8") == legacy_mime_body(email_data, error).encode("utf-8")
+    expected_raw = legacy_simple_email(email_data, "schedules@example.com", error).encode("utf-8")
+    assert templates.render_raw(view).encode("utf-8") == expected_raw
+    streamed = []
+    templates.render_raw(view, streamed.append)
+    assert "".join(streamed).encode("utf-8") == expected_raw
+
+
+def test_html_escapes_values_and_keys():
+    view = EmailView(company_id="c1", person_id="6", recipient="ada@example.com", employee="<Ada>",
+                     schedules=SCHEDULES[1:3], generated_at=NOW)
+    body = templates_for("en").render_html(view)
+    assert "Café {employee} &lt;b&gt;&amp;&lt;/b&gt;" in body
+    assert "&lt;Ada&gt;" in body and "<Ada>" not in body
+    assert "key with &quot;quotes&quot;" in body and "it&#x27;s" in body
+
+
+@pytest.mark.parametrize("locale, expected", [
+    ("es", "es"), ("es-MX", "es"), ("es_mx", "es"), ("EN", "en"), ("fr-FR", "en"), (None, "en"), ("", "en"),
+])
+def test_locale_fallbacks(locale, expected):
+    assert templates_for(locale).locale == expected
+
+
+def test_spanish_wording_and_date_format():
+    view = EmailView(company_id="c1", person_id="6", recipient="ada@example.com", employee="Ada",
+                     schedules=SCHEDULES[:1], generated_at=NOW)
+    templates = templates_for("es-MX")
+    assert templates.subject(view) == "Horario de trabajo de Ada"
+    body = templates.render_text(view)
+    assert "--- Turno 1 ---" in body
+    assert "el 17/10/2026 09:05:03." in body
+
+
+class FakeShiftWorkClient:
+    """Stands in for HTTPShiftWorkClient's company settings lookup"""
+
+    def __init__(self, locales: dict, fail: set = frozenset()):
+        self.locales = locales
+        self.fail = set(fail)
+        self.lookups = []
+
+    async def get_company_locale(self, company_id: str):
+        self.lookups.append(company_id)
+        await asyncio.sleep(0)
+        if company_id in self.fail:
+            self.fail.discard(company_id)
+            raise httpx.HTTPStatusError("403", request=httpx.Request("POST", "http://gateway"),
+                                        response=httpx.Response(403))
+        return self.locales.get(company_id)
+
+
+def _emailer(client: FakeShiftWorkClient, **config) -> HTTPScheduleEmailer:
+    emailer = HTTPScheduleEmailer(EmailConfig("127.0.0.1", 25, "schedules@example.com", "", use_tls=False, **config))
+    emailer.http_client = client
+    return emailer
+
+
+def _request(company_id: str, locale=None) -> ScheduleEmailData:
+    return ScheduleEmailData(company_id=company_id, person_id="6", recipient_email="ada@example.com",
+                             employee_name="Ada", schedules=[], locale=locale)
+
+
+async def test_company_language_is_looked_up_once_per_company():
+    client = FakeShiftWorkClient({"c1": "es-MX", "c2": "en"})
+    emailer = _emailer(client)
+    requests = [_request("c1") for _ in range(5)] + [_request("c2"), _request("c1", locale="en")]
+    await asyncio.gather(*(emailer._fill_locale(r) for r in requests))
+
+    assert [r.locale for r in requests] == ["es-MX"] * 5 + ["en", "en"]
+    assert sorted(client.lookups) == ["c1", "c2"]
+    assert emailer._templates(requests[0]).subject(emailer._email_view(requests[0])) == "Horario de trabajo de Ada"
+
+
+async def test_failed_lookup_falls_back_to_the_configured_locale_and_is_retried():
+    client = FakeShiftWorkClient({"c1": "es"}, fail={"c1"})
+    emailer = _emailer(client, locale="en")
+    first, second = _request("c1"), _request("c1")
+    await emailer._fill_locale(first)
+    assert first.locale is None
+    assert emailer._templates(first).locale == "en"
+    await emailer._fill_locale(second)
+    assert second.locale == "es"
+    assert client.lookups == ["c1", "c1"]
+
+
+async def test_concurrent_emails_share_a_failed_lookup_and_all_fall_back():
+    client = FakeShiftWorkClient({"c1": "es"}, fail={"c1"})
+    emailer = _emailer(client, locale="en")
+    requests = [_request("c1") for _ in range(4)]
+    await asyncio.gather(*(emailer._fill_locale(r) for r in requests))
+    assert [r.locale for r in requests] == [None] * 4
+    assert client.lookups == ["c1"]
+    # The failure is not remembered
+    assert await emailer._company_locale("c1") == "es"
+    assert client.lookups == ["c1", "c1"]
+
+
+async def test_company_without_a_language_uses_the_configured_locale():
+    client = FakeShiftWorkClient({})
+    emailer = _emailer(client, locale="es")
+    requests = [_request("c1"), _request("c1")]
+    for request in requests:
+        await emailer._fill_locale(request)
+    assert [r.locale for r in requests] == [None, None]
+    assert emailer._templates(requests[0]).locale == "es"
+    # "No language set" is an answer, so it is not asked again
+    assert client.lookups == ["c1"]
+
+
+async def test_company_lookup_can_be_switched_off():
+    client = FakeShiftWorkClient({"c1": "es"})
+    emailer = _emailer(client, locale="es", company_locale=False)
+    request = _request("c1")
+    await emailer._fill_locale(request)
+    assert request.locale is None and client.lookups == []
+    assert emailer._templates(request).locale == "es"
+
+
+async def test_gateway_returns_only_regional_settings(server):
+    settings = {"settingsId": 3, "companyId": "c1", "defaultTimeZone": "America/Mexico_City",
+                "defaultLanguage": "es-MX", "firstDayOfWeek": "Monday", "dateFormat": "dd/MM/yyyy",
+                "timeFormat": "HH:mm", "currencySymbol": "$", "minimumHourlyRate": 15.0,
+                "minimumPasswordLength": 12}
+
+    def handler(request: httpx.Request) -> httpx.Response:
+        if request.url.path == "/api/companies/c1/settings":
+            return httpx.Response(200, json=settings)
+        return httpx.Response(404)
+
+    server.http_client = httpx.AsyncClient(base_url="http://api", transport=httpx.MockTransport(handler))
+    result = await server._execute_tool("get_company_regional_settings", {"company_id": "c1"})
+    assert result["settings"] == {
+        "defaultTimeZone": "America/Mexico_City", "defaultLanguage": "es-MX", "firstDayOfWeek": "Monday",
+        "dateFormat": "dd/MM/yyyy", "timeFormat": "HH:mm", "currencySymbol": "$",
+    }
+    missing = await server._execute_tool("get_company_regional_settings", {"company_id": "c9"})
+    assert "error" in missing
+    with pytest.raises(ValueError):
+        await server._execute_tool("get_company_regional_settings", {})
+
+
+async def test_regional_settings_tool_is_listed(server, monkeypatch):
+    handler = server.server.request_handlers[types.ListToolsRequest]
+    tools = {tool.name: tool for tool in (await handler(types.ListToolsRequest(method="tools/list"))).root.tools}
+    assert tools["get_company_regional_settings"].inputSchema["required"] == ["company_id"]
+
+    monkeypatch.setattr(http_mcp_server, "AUTH_TOKEN", None)
+    client = TestClient(TestServer(server.http_app))
+    await client.start_server()
+    try:
+        listed = (await (await client.get("/api/tools")).json())["tools"]
+    finally:
+        await client.close()
+    assert "get_company_regional_settings" in [tool["name"] for tool in listed]
+
+
+@pytest.mark.parametrize("result, expected", [
+    ({"company_id": "c1", "settings": {"defaultLanguage": "es-MX"}}, "es-MX"),
+    ({"company_id": "c1", "settings": {"defaultLanguage": ""}}, None),
+    ({"company_id": "c1", "error": "Company settings not found"}, None),
+])
+async def test_client_reads_default_language_from_the_tool_result(result, expected):
+    def handler(request: httpx.Request) -> httpx.Response:
+        assert request.url.path == "/api/tools/execute"
+        return httpx.Response(200, json={"tool_name": "get_company_regional_settings", "result": result})
+
+    client = HTTPShiftWorkClient("http://gateway")
+    client.client = httpx.AsyncClient(transport=httpx.MockTransport(handler))
+    try:
+        assert await client.get_company_locale("c1") == expected
+    finally:
+        await client.close()
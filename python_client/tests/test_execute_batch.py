@@ -0,0 +1,124 @@
+"""_execute_tool_batch: dedupe, ordering, the concurrency cap, the batch deadline and per-item failures"""
+
+import asyncio
+import json
+
+import httpx
+import pytest
+
+from schedule_cache import SnapshotCache
+
+
+class FakeTools:
+    """Stands in for ShiftWorkServer._execute_tool, recording calls and peak concurrency"""
+
+    def __init__(self, delay: float = 0.01):
+        self.delay = delay
+        self.calls = []
+        self.running = 0
+        self.peak = 0
+
+    async def __call__(self, tool_name, arguments, auth_token=None, timeout=None):
+        self.calls.append((tool_name, dict(arguments)))
+        self.running += 1
+        self.peak = max(self.peak, self.running)
+        try:
+            await asyncio.sleep(arguments.get("sleep", self.delay))
+            if tool_name == "missing":
+                raise LookupError(f"Unknown tool: {tool_name}")
+            if tool_name == "invalid":
+                raise ValueError("company_id is required")
+            if tool_name == "broken":
+                raise RuntimeError("API error")
+            return {"tool": tool_name, **arguments}
+        finally:
+            self.running -= 1
+
+
+@pytest.fixture
+def tools(server, monkeypatch):
+    fake = FakeTools()
+    monkeypatch.setattr(server, "_execute_tool", fake)
+    return fake
+
+
+async def test_identical_calls_run_once_and_share_the_result(server, tools):
+    calls = [
+        {"tool_name": "get_employee_schedules", "arguments": {"company_id": "c1", "person_id": "6"}},
+        # Same arguments in another order, and with a per-call timeout: still the same call
+        {"tool_name": "get_employee_schedules", "arguments": {"person_id": "6", "company_id": "c1", "timeout_seconds": 5}},
+        {"name": "get_employee_schedules", "arguments": {"company_id": "c1", "person_id": "7"}},
+    ]
+    results = await server._execute_tool_batch(calls)
+    assert len(tools.calls) == 2
+    assert results[0]["result"] == {"tool": "get_employee_schedules", "company_id": "c1", "person_id": "6"}
+    assert results[1]["result"] is results[0]["result"]
+    assert results[2]["result"]["person_id"] == "7"
+
+
+async def test_results_keep_request_order(server, tools):
+    # Later calls finish first
+    calls = [{"tool_name": "ping", "arguments": {"n": n, "sleep": 0.05 - n * 0.01}} for n in range(5)]
+    results = await server._execute_tool_batch(calls)
+    assert [r["index"] for r in results] == [0, 1, 2, 3, 4]
+    assert [r["result"]["n"] for r in results] == [0, 1, 2, 3, 4]
+
+
+async def test_concurrency_is_capped(server, tools):
+    calls = [{"tool_name": "ping", "arguments": {"n": n}} for n in range(12)]
+    results = await server._execute_tool_batch(calls, max_concurrency=3)
+    assert all(r["ok"] for r in results)
+    assert tools.peak == 3
+
+
+async def test_one_failure_does_not_fail_the_others(server, tools):
+    calls = [
+        {"tool_name": "ping", "arguments": {}},
+        {"tool_name": "missing", "arguments": {}},
+        {"tool_name": "invalid", "arguments": {}},
+        {"tool_name": "broken", "arguments": {}},
+        {"tool_name": "ping", "arguments": "not an object"},
+        "not a call",
+        {"tool_name": "ping", "arguments": {"n": 1}},
+    ]
+    results = await server._execute_tool_batch(calls)
+    assert [(r["ok"], r.get("status")) for r in results] == [
+        (True, None), (False, 404), (False, 400), (False, 500), (False, 400), (False, 400), (True, None),
+    ]
+    # Internal errors are not leaked
+    assert results[3]["error"] == "Internal server error"
+
+
+async def test_batch_deadline_bounds_every_call(server, tools):
+    calls = [
+        {"tool_name": "ping", "arguments": {"n": 0, "sleep": 0}},
+        {"tool_name": "ping", "arguments": {"n": 1, "sleep": 5}},
+        # Queued behind the cap until the deadline has already passed
+        {"tool_name": "ping", "arguments": {"n": 2, "sleep": 0}},
+    ]
+    started = asyncio.get_running_loop().time()
+    results = await server._execute_tool_batch(calls, max_concurrency=1, timeout=0.1)
+    assert asyncio.get_running_loop().time() - started < 1
+    assert results[0]["ok"]
+    assert [(r["ok"], r["status"]) for r in results[1:]] == [(False, 504), (False, 504)]
+
+
+ROWS = [{"scheduleId": n, "personId": n % 4, "companyId": "c1"} for n in range(20)]
+
+
+@pytest.mark.parametrize("ttl", [60, 0])
+async def test_same_company_calls_share_one_schedule_fetch(server, ttl):
+    server.schedule_cache = SnapshotCache(ttl=ttl, max_entries=10, max_bytes=10_000_000)
+    requests = []
+
+    async def upstream(request: httpx.Request) -> httpx.Response:
+        requests.append(request.url.path)
+        await asyncio.sleep(0.02)
+        return httpx.Response(200, content=json.dumps(ROWS).encode("utf-8"))
+
+    server.http_client = httpx.AsyncClient(base_url="http://api", transport=httpx.MockTransport(upstream))
+    calls = [{"tool_name": "get_employee_schedules", "arguments": {"company_id": "c1", "person_id": str(p)}}
+             for p in range(4)]
+    results = await server._execute_tool_batch(calls)
+    assert [r["result"]["total_schedules"] for r in results] == [5, 5, 5, 5]
+    assert requests == ["/api/companies/c1/schedules"]
@@ -0,0 +1,189 @@
+"""Hedged upstream requests: when the hedge fires, what gates it, and which answer is used"""
+
+import asyncio
+import json
+
+import httpx
+import pytest
+
+import http_mcp_server
+from resilience import CircuitBreaker, LatencyTracker
+
+PATH = "/api/companies/c1/people"
+
+
+def _warm(server, path: str, seconds: float, samples: int = 20):
+    """Give the route a latency history so its hedge delay is `seconds`"""
+    tracker = server.latencies.setdefault(http_mcp_server._endpoint_label(path), LatencyTracker())
+    for _ in range(samples):
+        tracker.record(seconds)
+
+
+def _sender(delays: list, results: list = None, started: list = None, cancelled: list = None):
+    """send() factory: call n sleeps delays[n] and returns results[n] (raising it if it is an exception)"""
+    calls = iter(range(len(delays)))
+
+    async def send():
+        n = next(calls)
+        if started is not None:
+            started.append(n)
+        try:
+            await asyncio.sleep(delays[n])
+        except asyncio.CancelledError:
+            if cancelled is not None:
+                cancelled.append(n)
+            raise
+        result = results[n] if results else n
+        if isinstance(result, Exception):
+            raise result
+        return result
+
+    return send
+
+
+def test_latency_tracker_needs_twenty_samples():
+    tracker = LatencyTracker()
+    for n in range(19):
+        tracker.record(n / 100)
+    assert tracker.percentile(95) is None
+    tracker.record(0.19)
+    assert tracker.percentile(95) == 0.18
+    assert tracker.percentile(50) == 0.09
+    assert tracker.percentile(100) == 0.19
+
+
+def test_latency_tracker_keeps_a_rolling_window():
+    tracker = LatencyTracker(sample_size=20)
+    for _ in range(20):
+        tracker.record(5.0)
+    for _ in range(20):
+        tracker.record(0.01)
+    assert tracker.percentile(99) == 0.01
+
+
+async def test_no_hedge_before_warm_up(server):
+    started = []
+    assert await server._hedged(PATH, _sender([0.05, 0], started=started)) == 0
+    assert started == [0]
+    assert server.hedge_stats["sent"] == 0
+
+
+async def test_hedge_fires_after_the_route_percentile_and_the_faster_answer_wins(server, monkeypatch):
+    monkeypatch.setattr(http_mcp_server, "HEDGE_MIN_DELAY", 0.001)
+    _warm(server, PATH, 0.02)
+    started, cancelled = [], []
+    assert await server._hedged(PATH, _sender([1.0, 0], started=started, cancelled=cancelled)) == 1
+    assert started == [0, 1]
+    # The slow first request is cancelled, not left to finish
+    await asyncio.sleep(0)
+    assert cancelled == [0]
+    assert server.hedge_stats == {"sent": 1, "won": 1}
+
+
+async def test_fast_request_is_not_hedged(server, monkeypatch):
+    monkeypatch.setattr(http_mcp_server, "HEDGE_MIN_DELAY", 0.001)
+    _warm(server, PATH, 0.2)
+    started = []
+    assert await server._hedged(PATH, _sender([0.01, 0], started=started)) == 0
+    assert started == [0]
+
+
+async def test_hedge_delay_is_never_below_the_minimum(server, monkeypatch):
+    monkeypatch.setattr(http_mcp_server, "HEDGE_MIN_DELAY", 0.2)
+    _warm(server, PATH, 0.001)
+    started = []
+    assert await server._hedged(PATH, _sender([0.02, 0], started=started)) == 0
+    assert started == [0]
+
+
+async def test_exhausted_budget_sends_no_hedge(server, monkeypatch):
+    monkeypatch.setattr(http_mcp_server, "HEDGE_MIN_DELAY", 0.001)
+    _warm(server, PATH, 0.001)
+    monkeypatch.setattr(server.hedge_budget, "try_acquire", lambda: False)
+    started = []
+    assert await server._hedged(PATH, _sender([0.05, 0], started=started)) == 0
+    assert started == [0]
+    assert server.hedge_stats["sent"] == 0
+
+
+async def test_budget_caps_hedges_at_its_percentage(server, monkeypatch):
+    monkeypatch.setattr(http_mcp_server, "HEDGE_MIN_DELAY", 0.001)
+    _warm(server, PATH, 0.001)
+    # Keep the delay fixed; otherwise the unhedged requests would teach the route to wait longer
+    tracker = server.latencies[http_mcp_server._endpoint_label(PATH)]
+    monkeypatch.setattr(tracker, "record", lambda seconds: None)
+    # Every request is slow enough to hedge, but hedges stay within 5% of the 40 requests
+    for _ in range(40):
+        await server._hedged(PATH, _sender([0.005, 0]))
+    assert server.hedge_stats["sent"] == 2
+    assert server.hedge_budget.stats()["exhausted"] == 38
+
+
+async def test_no_hedge_unless_the_breaker_is_closed(server, monkeypatch):
+    monkeypatch.setattr(http_mcp_server, "HEDGE_MIN_DELAY", 0.001)
+    _warm(server, PATH, 0.001)
+    breaker = server._breaker_for(PATH)
+    breaker._state = CircuitBreaker.HALF_OPEN
+    started = []
+    assert await server._hedged(PATH, _sender([0.02, 0], started=started)) == 0
+    assert started == [0]
+
+
+async def test_failed_attempt_falls_back_to_the_other(server, monkeypatch):
+    monkeypatch.setattr(http_mcp_server, "HEDGE_MIN_DELAY", 0.001)
+    _warm(server, PATH, 0.005)
+    # The hedge fails first; the slower original is still used
+    send = _sender([0.05, 0], results=["original", httpx.ConnectError("refused")])
+    assert await server._hedged(PATH, send) == "original"
+    assert server.hedge_stats == {"sent": 1, "won": 0}
+
+    # Both fail: the last failure is raised
+    send = _sender([0.05, 0], results=[httpx.ReadTimeout("slow"), httpx.ConnectError("refused")])
+    with pytest.raises(httpx.ReadTimeout):
+        await server._hedged(PATH, send)
+
+
+async def test_loser_that_already_finished_is_discarded(server, monkeypatch):
+    monkeypatch.setattr(http_mcp_server, "HEDGE_MIN_DELAY", 0.001)
+    _warm(server, PATH, 0.005)
+    discarded = []
+
+    async def discard(result):
+        discarded.append(result)
+
+    async def send_both_at_once():
+        # Both answers land in the same loop iteration: one wins, the other must still be released
+        await gate.wait()
+        return object()
+
+    gate = asyncio.Event()
+    winner = asyncio.ensure_future(server._hedged(PATH, send_both_at_once, discard=discard))
+    await asyncio.sleep(0.05)
+    gate.set()
+    result = await winner
+    await asyncio.sleep(0)
+    assert len(discarded) == 1 and discarded[0] is not result
+
+
+async def test_employee_schedules_snapshot_fetch_is_hedged(server, monkeypatch):
+    """The company snapshot behind get_employee_schedules is a streamed GET; it must be hedged too"""
+    monkeypatch.setattr(http_mcp_server, "HEDGE_REQUESTS", True)
+    monkeypatch.setattr(http_mcp_server, "HEDGE_MIN_DELAY", 0.001)
+    path = "/api/companies/c1/schedules"
+    _warm(server, path, 0.01)
+    body = json.dumps([{"scheduleId": 1, "personId": 6}, {"scheduleId": 2, "personId": 7}]).encode("utf-8")
+    requests = []
+
+    async def upstream(request: httpx.Request) -> httpx.Response:
+        requests.append(request.url.path)
+        if len(requests) == 1:
+            await asyncio.sleep(5)  # a stuck replica
+        return httpx.Response(200, content=body)
+
+    server.http_client = httpx.AsyncClient(base_url="http://api", transport=httpx.MockTransport(upstream))
+    result = await asyncio.wait_for(
+        server._execute_tool("get_employee_schedules", {"company_id": "c1", "person_id": "6"}), timeout=2)
+
+    assert [s.get("scheduleId") for s in result["schedules"]] == [1]
+    assert requests == [path, path]
+    assert server.hedge_stats == {"sent": 1, "won": 1}
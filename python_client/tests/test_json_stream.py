@@ -0,0 +1,96 @@
+"""Incremental JSON array parsing: chunk boundaries anywhere, and malformed bodies"""
+
+import json
+
+import pytest
+
+from json_stream import iter_json_array, iter_json_array_batches
+
+BODY = json.dumps([
+    {"scheduleId": 1, "title": "Opening \"shift\" },{ not a boundary", "tags": [{"a": 1}, {"b": 2}]},
+    {"scheduleId": 2, "title": "Café – Straße ✓", "hours": -1.5e3, "notes": None},
+    {"scheduleId": 3, "title": "\\},{\\", "nested": {"list": [[], {}], "flag": True}},
+], ensure_ascii=False).encode("utf-8")
+
+
+async def _chunks(body: bytes, size: int):
+    for start in range(0, len(body), size):
+        yield body[start:start + size]
+
+
+async def _split(body: bytes, at: int):
+    yield body[:at]
+    yield body[at:]
+
+
+async def _collect(body_chunks) -> list:
+    return [item async for item in iter_json_array(body_chunks)]
+
+
+async def _collect_batches(body_chunks) -> list:
+    return [batch async for batch in iter_json_array_batches(body_chunks, json.loads)]
+
+
+async def test_elements_survive_a_split_at_every_byte():
+    expected = json.loads(BODY)
+    for at in range(len(BODY) + 1):
+        assert await _collect(_split(BODY, at)) == expected, at
+
+
+async def test_scalars_and_numbers_split_mid_token():
+    body = b'[ -12.5e-3 , 7, "x", true, null, [1, [2]] ]'
+    for size in (1, 2, 3, 5):
+        assert await _collect(_chunks(body, size)) == json.loads(body)
+
+
+@pytest.mark.parametrize("body", [b"[]", b"  [ ]  ", b"\n[\n]\n"])
+async def test_empty_arrays(body):
+    assert await _collect(_chunks(body, 1)) == []
+    assert await _collect_batches(_chunks(body, 1)) == []
+
+
+async def test_batches_survive_a_split_at_every_byte():
+    expected = json.loads(BODY)
+    for at in range(len(BODY) + 1):
+        batches = await _collect_batches(_split(BODY, at))
+        assert [item for batch in batches for item in batch] == expected, at
+        assert all(batches)
+
+
+async def test_batches_follow_chunk_arrival():
+    rows = [{"scheduleId": n} for n in range(50)]
+    body = json.dumps(rows).encode("utf-8")
+    batches = await _collect_batches(_chunks(body, 64))
+    assert len(batches) > 1
+    assert [item for batch in batches for item in batch] == rows
+
+
+MALFORMED = [
+    b'{"scheduleId": 1}',
+    b'[{"scheduleId": 1},',
+    b'[{"scheduleId": 1}',
+    b'[{"scheduleId": 1}] trailing',
+    b'[{"scheduleId": 1} {"scheduleId": 2}]',
+    b'[{"scheduleId": }]',
+    b"",
+    b"   ",
+]
+
+
+@pytest.mark.parametrize("body", MALFORMED)
+async def test_malformed_array_raises_value_error(body):
+    for size in (1, 7, len(body) or 1):
+        with pytest.raises(ValueError):
+            await _collect(_chunks(body, size))
+
+
+@pytest.mark.parametrize("body", MALFORMED)
+async def test_malformed_batches_raise_value_error(body):
+    for size in (1, 7, len(body) or 1):
+        with pytest.raises(ValueError):
+            await _collect_batches(_chunks(body, size))
+
+
+async def test_truncated_number_raises_value_error():
+    with pytest.raises(ValueError):
+        await _collect(_chunks(b"[1, -", 2))
@@ -0,0 +1,51 @@
+"""Event-loop monitor: a deliberately blocked loop is measured, counted once and reported with its stack"""
+
+import asyncio
+import logging
+import time
+
+from loop_monitor import LoopMonitor
+
+
+def block_the_loop(seconds: float):
+    time.sleep(seconds)
+
+
+async def test_blocked_loop_is_detected_and_reported(caplog):
+    lags = []
+    monitor = LoopMonitor(interval=0.01, block_threshold=0.05, observe=lags.append)
+    monitor.start()
+    try:
+        await asyncio.sleep(0.05)
+        assert monitor.stalls == 0
+        with caplog.at_level(logging.WARNING, logger="loop_monitor"):
+            block_the_loop(0.3)
+            # Let the heartbeat run again and record how late it was
+            await asyncio.sleep(0.05)
+    finally:
+        monitor.stop()
+
+    # One stall, logged once although the watchdog saw it on several checks
+    assert monitor.stalls == 1
+    assert 0.15 < monitor.longest_stall < 1.0
+    assert monitor.max_lag >= 0.25 and max(lags) == monitor.max_lag
+    warnings = [r.getMessage() for r in caplog.records if r.name == "loop_monitor"]
+    assert len(warnings) == 1
+    assert warnings[0].startswith("Event loop blocked for ")
+    # The stack points at the callback that blocked the loop
+    assert "block_the_loop" in warnings[0]
+
+    stats = monitor.stats()
+    assert stats["stalls"] == 1 and stats["lag_max_ms"] >= 250
+    assert stats["lag_p50_ms"] < stats["lag_max_ms"]
+
+
+async def test_idle_loop_is_not_reported():
+    monitor = LoopMonitor(interval=0.01, block_threshold=0.1)
+    monitor.start()
+    try:
+        await asyncio.sleep(0.15)
+    finally:
+        monitor.stop()
+    assert monitor.stalls == 0
+    assert monitor.percentile(50) < 0.05
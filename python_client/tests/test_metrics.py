@@ -0,0 +1,98 @@
+"""Prometheus text exposition: label escaping, histogram buckets, worker labels and merging workers"""
+
+import math
+
+from metrics import Registry, merge, with_labels
+
+
+def test_counter_and_label_escaping():
+    registry = Registry()
+    calls = registry.counter("calls_total", "Calls", ("tool", "note"))
+    calls.inc("ping", 'say "hi"\nback\\slash')
+    calls.inc("ping", 'say "hi"\nback\\slash', amount=2.5)
+    calls.inc("schedules", "")
+    assert registry.render() == (
+        "# HELP calls_total Calls\n"
+        "# TYPE calls_total counter\n"
+        'calls_total{tool="ping",note="say \\"hi\\"\\nback\\\\slash"} 3.5\n'
+        'calls_total{tool="schedules",note=""} 1\n'
+    )
+
+
+def test_unlabelled_metric_and_special_values():
+    registry = Registry()
+    registry.counter("hits_total", "Hits").inc()
+    registry.gauge_function("odd", "Odd values", ("kind",),
+                            lambda: [(("inf",), math.inf), (("-inf",), -math.inf), (("nan",), math.nan)])
+    lines = registry.render().splitlines()
+    assert "hits_total 1" in lines
+    assert lines[-3:] == ['odd{kind="inf"} +Inf', 'odd{kind="-inf"} -Inf', 'odd{kind="nan"} NaN']
+
+
+def test_histogram_buckets_are_cumulative_and_inclusive():
+    registry = Registry()
+    latency = registry.histogram("latency_seconds", "Latency", ("route",), buckets=(0.5, 0.1, 1.0))
+    for value in (0.05, 0.1, 0.3, 0.7, 2.0):
+        latency.observe(value, "/a")
+    assert registry.render().splitlines()[2:] == [
+        # Buckets are sorted, and a value equal to a bound falls in that bucket (le = less than or equal)
+        'latency_seconds_bucket{route="/a",le="0.1"} 2',
+        'latency_seconds_bucket{route="/a",le="0.5"} 3',
+        'latency_seconds_bucket{route="/a",le="1"} 4',
+        'latency_seconds_bucket{route="/a",le="+Inf"} 5',
+        'latency_seconds_sum{route="/a"} 3.15',
+        'latency_seconds_count{route="/a"} 5',
+    ]
+
+
+def test_with_labels_adds_to_every_sample():
+    registry = Registry()
+    registry.counter("hits_total", "Hits").inc()
+    registry.counter("calls_total", "Calls", ("tool",)).inc("ping")
+    text = with_labels(registry.render(), {"worker": "2", "host": 'a"b'})
+    assert text.splitlines() == [
+        "# HELP hits_total Hits",
+        "# TYPE hits_total counter",
+        'hits_total{worker="2",host="a\\"b"} 1',
+        "# HELP calls_total Calls",
+        "# TYPE calls_total counter",
+        'calls_total{worker="2",host="a\\"b",tool="ping"} 1',
+    ]
+    assert with_labels(text, {}) == text
+
+
+def _worker(calls: int, latencies=(), only=None) -> str:
+    registry = Registry()
+    counter = registry.counter("calls_total", "Calls", ("tool",))
+    counter.inc("ping", amount=calls)
+    if only:
+        registry.counter(only, "Only on this worker").inc()
+    histogram = registry.histogram("latency_seconds", "Latency", buckets=(0.1, 1.0))
+    for value in latencies:
+        histogram.observe(value)
+    return registry.render()
+
+
+def test_merge_groups_each_family_once_across_workers():
+    texts = [with_labels(_worker(3, [0.05], only="first_total"), {"worker": "0"}),
+             with_labels(_worker(4, [0.5]), {"worker": "1"})]
+    lines = merge(texts).splitlines()
+    assert lines.count("# TYPE calls_total counter") == 1
+    assert lines[:4] == ["# HELP calls_total Calls", "# TYPE calls_total counter",
+                         'calls_total{worker="0",tool="ping"} 3', 'calls_total{worker="1",tool="ping"} 4']
+    assert 'first_total{worker="0"} 1' in lines
+    assert 'latency_seconds_bucket{worker="1",le="1"} 1' in lines
+
+
+def test_merge_sums_the_same_series_from_several_workers():
+    # Two processes of one worker slot overlap during a rolling restart; unlabelled workers merge into totals
+    lines = merge([_worker(3, [0.05, 2.0]), _worker(4, [0.5]), _worker(0.5)]).splitlines()
+    assert 'calls_total{tool="ping"} 7.5' in lines
+    assert [line for line in lines if line.startswith("latency_seconds")] == [
+        'latency_seconds_bucket{le="0.1"} 1',
+        'latency_seconds_bucket{le="1"} 2',
+        'latency_seconds_bucket{le="+Inf"} 3',
+        "latency_seconds_sum 2.55",
+        "latency_seconds_count 3",
+    ]
+    assert len(lines) == len(set(lines))
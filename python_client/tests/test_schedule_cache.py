@@ -0,0 +1,156 @@
+"""SnapshotCache: TTL, LRU bounds, single-flight loading and stale reads; CompanySnapshot indexes"""
+
+import asyncio
+import time
+from types import SimpleNamespace
+
+import pytest
+
+import schedule_cache
+from schedule_cache import CompanySnapshot, SnapshotCache
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    """Controllable monotonic clock for the cache module"""
+    now = [1000.0]
+    monkeypatch.setattr(schedule_cache, "time", SimpleNamespace(monotonic=lambda: now[0], time=time.time))
+    return now
+
+
+def _loader(value, size=10, calls=None, gate: asyncio.Event = None):
+    async def load():
+        if calls is not None:
+            calls.append(value)
+        if gate is not None:
+            await gate.wait()
+        return value, size
+    return load
+
+
+async def test_entries_expire_after_ttl(clock):
+    cache = SnapshotCache(ttl=30, max_entries=10, max_bytes=1000)
+    calls = []
+    assert await cache.get_or_load("k", _loader("v1", calls=calls)) == "v1"
+    clock[0] += 29.9
+    assert await cache.get_or_load("k", _loader("v2", calls=calls)) == "v1"
+    clock[0] += 0.1
+    assert cache.get("k") is None
+    assert await cache.get_or_load("k", _loader("v2", calls=calls)) == "v2"
+    assert calls == ["v1", "v2"]
+    assert (cache.hits, cache.misses) == (1, 2)
+
+
+async def test_zero_ttl_never_stores(clock):
+    cache = SnapshotCache(ttl=0, max_entries=10, max_bytes=1000)
+    assert await cache.get_or_load("k", _loader("v")) == "v"
+    assert cache.get_stale("k") is None
+
+
+async def test_least_recently_used_entry_is_evicted_by_count(clock):
+    cache = SnapshotCache(ttl=60, max_entries=2, max_bytes=1000)
+    cache.put("a", "A", 1)
+    cache.put("b", "B", 1)
+    assert cache.get("a") == "A"  # "b" is now the least recently used
+    cache.put("c", "C", 1)
+    assert cache.get("b") is None
+    assert (cache.get("a"), cache.get("c")) == ("A", "C")
+    assert cache.evictions == 1
+
+
+async def test_entries_are_evicted_by_bytes(clock):
+    cache = SnapshotCache(ttl=60, max_entries=100, max_bytes=100)
+    for key in "abcd":
+        cache.put(key, key, 30)
+    assert cache.get("a") is None
+    assert cache.stats()["bytes"] == 90
+    # A value larger than the whole budget is returned but never stored
+    assert await cache.get_or_load("huge", _loader("H", size=101)) == "H"
+    assert cache.get("huge") is None
+    assert cache.stats()["entries"] == 3
+
+
+async def test_concurrent_misses_share_one_load(clock):
+    cache = SnapshotCache(ttl=60, max_entries=10, max_bytes=1000)
+    calls, gate = [], asyncio.Event()
+    waiters = [asyncio.ensure_future(cache.get_or_load("k", _loader("v", calls=calls, gate=gate))) for _ in range(5)]
+    await asyncio.sleep(0)
+    gate.set()
+    assert await asyncio.gather(*waiters) == ["v"] * 5
+    assert calls == ["v"]
+    assert (cache.misses, cache.coalesced) == (1, 4)
+
+
+async def test_cancelled_caller_does_not_abort_the_shared_load(clock):
+    cache = SnapshotCache(ttl=60, max_entries=10, max_bytes=1000)
+    gate = asyncio.Event()
+    first = asyncio.ensure_future(cache.get_or_load("k", _loader("v", gate=gate)))
+    second = asyncio.ensure_future(cache.get_or_load("k", _loader("other", gate=gate)))
+    await asyncio.sleep(0)
+    first.cancel()
+    gate.set()
+    assert await second == "v"
+    assert cache.get("k") == "v"
+
+
+async def test_failed_load_reaches_every_waiter_and_is_not_cached(clock):
+    cache = SnapshotCache(ttl=60, max_entries=10, max_bytes=1000)
+    gate = asyncio.Event()
+
+    async def failing():
+        await gate.wait()
+        raise RuntimeError("upstream down")
+
+    waiters = [asyncio.ensure_future(cache.get_or_load("k", failing)) for _ in range(3)]
+    await asyncio.sleep(0)
+    gate.set()
+    results = await asyncio.gather(*waiters, return_exceptions=True)
+    assert all(isinstance(r, RuntimeError) for r in results)
+    assert await cache.get_or_load("k", _loader("v")) == "v"
+
+
+async def test_none_is_returned_but_not_stored(clock):
+    cache = SnapshotCache(ttl=60, max_entries=10, max_bytes=1000)
+    assert await cache.get_or_load("k", _loader(None)) is None
+    assert cache.get_stale("k") is None
+
+
+async def test_invalidation_during_a_load_keeps_its_result_out(clock):
+    cache = SnapshotCache(ttl=60, max_entries=10, max_bytes=1000)
+    gate = asyncio.Event()
+    load = asyncio.ensure_future(cache.get_or_load(("c1", "scope"), _loader("old", gate=gate)))
+    await asyncio.sleep(0)
+    assert cache.invalidate_where(lambda key: key[0] == "c1") == 1
+    gate.set()
+    # The caller still gets its answer, but it predates the invalidation and is not cached
+    assert await load == "old"
+    assert cache.get(("c1", "scope")) is None
+
+
+async def test_get_stale_serves_expired_entries_until_evicted(clock):
+    cache = SnapshotCache(ttl=10, max_entries=1, max_bytes=1000)
+    cache.put("k", "v", 1)
+    clock[0] += 3600
+    assert cache.get("k") is None
+    assert cache.get_stale("k") == "v"
+    assert cache.stale_served == 1
+    cache.put("other", "o", 1)
+    assert cache.get_stale("k") is None
+    assert cache.get_stale("missing") is None
+
+
+def test_company_snapshot_filters_through_its_indexes():
+    schedules = [
+        {"scheduleId": 1, "personId": 6, "locationId": 1, "areaId": 2, "status": "published"},
+        {"scheduleId": 2, "personId": "6", "locationId": 2, "areaId": 2, "status": "draft"},
+        {"scheduleId": 3, "personId": 7, "locationId": 1, "areaId": 3, "status": "published"},
+    ]
+    snapshot = CompanySnapshot(schedules)
+    assert [s["scheduleId"] for s in snapshot.by_person(6)] == [1, 2]
+    assert [s["scheduleId"] for s in snapshot.by_location("1")] == [1, 3]
+    assert [s["scheduleId"] for s in snapshot.filter(location_id=1, status="published", area_id=3)] == [3]
+    assert snapshot.filter() == schedules
+    assert sorted(snapshot.people()) == ["6", "7"]
+    # Lookups return copies; callers cannot corrupt the index
+    snapshot.by_person(6).clear()
+    assert len(snapshot.by_person(6)) == 2
@@ -0,0 +1,113 @@
+"""Paged schedule reads: prefetching the next page, where paging stops, and cancelling an unused prefetch"""
+
+import asyncio
+
+import httpx
+import pytest
+
+ROWS = [{"scheduleId": n, "personId": 6} for n in range(10)]
+
+
+class PagedAPI:
+    """Stands in for /schedules/paged; `hold` keeps a page's response back until it is released"""
+
+    def __init__(self, rows: list = ROWS, total_pages=None, hold=()):
+        self.rows = rows
+        self.total_pages = total_pages
+        self.held = {page: asyncio.Event() for page in hold}
+        self.requested = []
+        self.cancelled = []
+
+    async def handler(self, request: httpx.Request) -> httpx.Response:
+        if request.url.path != "/api/companies/c1/schedules/paged":
+            return httpx.Response(404)
+        page, page_size = int(request.url.params["page"]), int(request.url.params["pageSize"])
+        self.requested.append(page)
+        if page in self.held:
+            try:
+                await self.held[page].wait()
+            except asyncio.CancelledError:
+                self.cancelled.append(page)
+                raise
+        items = self.rows[(page - 1) * page_size:page * page_size]
+        total_pages = self.total_pages if self.total_pages is not None else -(-len(self.rows) // page_size)
+        return httpx.Response(200, json={"items": items, "page": page, "pageSize": page_size,
+                                         "totalCount": len(self.rows), "totalPages": total_pages})
+
+
+@pytest.fixture
+def api(server):
+    def serve(**kwargs) -> PagedAPI:
+        fake = PagedAPI(**kwargs)
+        server.http_client = httpx.AsyncClient(base_url="http://api", transport=httpx.MockTransport(fake.handler))
+        return fake
+    return serve
+
+
+async def _pages(server, page_size: int = 4) -> list:
+    return [[item["scheduleId"] for item in body["items"]]
+            async for body in server._iter_schedule_pages("c1", {}, page_size=page_size)]
+
+
+async def test_next_page_is_requested_while_the_caller_handles_this_one(server, api):
+    fake = api()
+    pages = server._iter_schedule_pages("c1", {}, page_size=4)
+    first = await anext(pages)
+    await asyncio.sleep(0.01)
+    # The caller has not asked for page 2 yet
+    assert [item["scheduleId"] for item in first["items"]] == [0, 1, 2, 3]
+    assert fake.requested == [1, 2]
+    assert [item["scheduleId"] for item in (await anext(pages))["items"]] == [4, 5, 6, 7]
+    await pages.aclose()
+
+
+async def test_stops_after_the_last_page(server, api):
+    fake = api()
+    assert await _pages(server) == [[0, 1, 2, 3], [4, 5, 6, 7], [8, 9]]
+    assert fake.requested == [1, 2, 3]
+
+
+async def test_short_page_is_the_last_even_if_the_page_count_says_otherwise(server, api):
+    fake = api(total_pages=9)
+    assert await _pages(server) == [[0, 1, 2, 3], [4, 5, 6, 7], [8, 9]]
+    assert fake.requested == [1, 2, 3]
+
+
+async def test_empty_page_ends_paging(server, api):
+    # Rows deleted while paging: the API still claims more pages
+    fake = api(rows=ROWS[:8], total_pages=5)
+    assert await _pages(server) == [[0, 1, 2, 3], [4, 5, 6, 7], []]
+    assert fake.requested == [1, 2, 3]
+
+
+async def test_unknown_company_yields_nothing(server, api):
+    api()
+    assert [body async for body in server._iter_schedule_pages("c9", {}, page_size=4)] == []
+
+
+async def test_prefetch_is_cancelled_when_the_caller_stops_early(server, api):
+    fake = api(hold=[2])
+    async for body in server._iter_schedule_pages("c1", {}, page_size=4):
+        break
+    await asyncio.sleep(0.01)
+    assert fake.requested == [1, 2]
+    assert fake.cancelled == [2]
+
+
+async def test_employee_pages_are_collected(server, api):
+    api()
+    schedules = await server._get_employee_schedules_paged("c1", "6")
+    assert [s["scheduleId"] for s in schedules] == list(range(10))
+    assert await server._get_employee_schedules_paged("c9", "6") is None
+    assert await server._get_employee_schedules_paged("c1", "not-a-number") == []
+
+
+async def test_paged_tool_returns_one_page(server, api):
+    api()
+    result = await server._execute_tool("get_schedules_paged", {"company_id": "c1", "page": 3, "page_size": 4})
+    assert [item["scheduleId"] for item in result["items"]] == [8, 9]
+    assert (result["page"], result["page_size"], result["total_pages"], result["total_count"]) == (3, 4, 3, 10)
+    missing = await server._execute_tool("get_schedules_paged", {"company_id": "c9"})
+    assert missing["error"] == "Company c9 not found" and missing["items"] == []
+    with pytest.raises(ValueError):
+        await server._execute_tool("get_schedules_paged", {"company_id": "c1", "page": "two"})
@@ -0,0 +1,183 @@
+"""Shared cache tier: the mmap backend off the event loop, and the RESP2 client against a stand-in server"""
+
+import asyncio
+import os
+import threading
+import time
+
+import pytest
+
+from redis_stand_in import StandInRedisServer
+from schedule_cache import CompanySnapshot
+from shared_cache import MmapBackend, RedisBackend, SharedCache, SharedCacheError
+
+
+@pytest.fixture
+async def mmap_backend(tmp_path):
+    backend = MmapBackend(str(tmp_path / "cache"), max_bytes=64 * 1024)
+    yield backend
+    await backend.close()
+
+
+async def test_mmap_round_trip_and_expiry(mmap_backend):
+    await mmap_backend.set("a", b"hello", ttl=60)
+    await mmap_backend.set("short", b"gone soon", ttl=0.01)
+    assert bytes(await mmap_backend.get("a")) == b"hello"
+    assert await mmap_backend.get("missing") is None
+    await asyncio.sleep(0.02)
+    assert await mmap_backend.get("short") is None
+    await mmap_backend.delete("a")
+    await mmap_backend.delete("a")
+    assert await mmap_backend.get("a") is None
+
+
+@pytest.mark.parametrize("content", [b"\x00", b"\x00" * 7, b"\x7f\xf8" + b"\x00" * 6 + b"nan expiry"])
+async def test_mmap_truncated_or_garbled_entry_is_a_miss(mmap_backend, content):
+    await mmap_backend.set("a", b"hello", ttl=60)
+    # Cut short by a full disk or a crash mid-copy, or not written by us
+    with open(mmap_backend._path("a"), "wb") as f:
+        f.write(content)
+    assert await mmap_backend.get("a") is None
+    # The entry can be written again
+    await mmap_backend.set("a", b"hello again", ttl=60)
+    assert bytes(await mmap_backend.get("a")) == b"hello again"
+
+
+async def test_mmap_counters(mmap_backend):
+    assert await mmap_backend.get_int("gen") == 0
+    assert sorted(await asyncio.gather(*(mmap_backend.incr("gen") for _ in range(10)))) == list(range(1, 11))
+    assert await mmap_backend.get_int("gen") == 10
+
+
+async def test_mmap_file_io_runs_off_the_loop_thread(mmap_backend, monkeypatch):
+    threads = set()
+    for name in ("_read", "_write", "_incr", "_read_int"):
+        original = getattr(mmap_backend, name)
+
+        def traced(*args, _original=original):
+            threads.add(threading.get_ident())
+            return _original(*args)
+
+        monkeypatch.setattr(mmap_backend, name, traced)
+
+    await mmap_backend.set("a", b"x", ttl=60)
+    await mmap_backend.get("a")
+    await mmap_backend.incr("gen")
+    await mmap_backend.get_int("gen")
+    assert threads and threading.get_ident() not in threads
+
+
+async def test_sweep_runs_in_the_background(mmap_backend, monkeypatch):
+    swept = threading.Event()
+
+    def slow_sweep():
+        time.sleep(0.2)
+        swept.set()
+
+    monkeypatch.setattr(mmap_backend, "_sweep", slow_sweep)
+    started = time.monotonic()
+    # One write of max_bytes // 8 is enough to trigger a sweep
+    await mmap_backend.set("big", b"x" * (mmap_backend.max_bytes // 8), ttl=60)
+    await mmap_backend.set("next", b"y", ttl=60)
+    assert time.monotonic() - started < 0.15
+    assert not swept.is_set()
+    await mmap_backend._sweeping
+    assert swept.is_set()
+
+
+async def test_sweep_drops_expired_then_oldest_entries(mmap_backend):
+    chunk = b"x" * (mmap_backend.max_bytes // 8)
+    await mmap_backend.set("expired", b"old", ttl=0.01)
+    await asyncio.sleep(0.02)
+    for n in range(12):
+        await mmap_backend.set(f"k{n}", chunk, ttl=60)
+        if mmap_backend._sweeping is not None:
+            await mmap_backend._sweeping
+    sizes = [entry.stat().st_size for entry in os.scandir(mmap_backend.directory) if entry.name.endswith(".v")]
+    assert sum(sizes) <= mmap_backend.max_bytes
+    assert await mmap_backend.get("expired") is None
+    assert await mmap_backend.get("k11") is not None
+    assert await mmap_backend.get("k0") is None
+
+
+async def test_redis_commands_share_one_connection():
+    async with StandInRedisServer() as server:
+        cache = SharedCache(RedisBackend(server.url(), pool_size=2, timeout=1.0))
+        assert await cache.get("missing") is None
+        await cache.set("snap", b"\x00packed\r\nrows", ttl=30)
+        assert await cache.get("snap") == b"\x00packed\r\nrows"
+        assert server.value("shiftwork:snap") == b"\x00packed\r\nrows"
+        await cache.close()
+
+    assert server.connections == 1
+    assert server.names() == ["GET", "SET", "GET"]
+    assert server.commands[1][1][3:] == [b"PX", b"30000"]
+    assert cache.stats()["hits"] == 1 and cache.stats()["misses"] == 1
+
+
+async def test_redis_auth_and_database_selected_on_connect():
+    async with StandInRedisServer(username="gateway", password="p@ss") as server:
+        backend = RedisBackend(server.url(db=3, credentials="gateway:p%40ss@"), timeout=1.0)
+        assert await backend.incr("counter") == 1
+        await backend.close()
+
+    assert [args for _, args in server.commands] == [
+        [b"AUTH", b"gateway", b"p@ss"], [b"SELECT", b"3"], [b"INCR", b"counter"],
+    ]
+    assert server.value("counter", db=3) == b"1"
+
+
+async def test_redis_error_reply_keeps_the_connection():
+    async with StandInRedisServer(password="right") as server:
+        backend = RedisBackend(server.url(), timeout=1.0)
+        for _ in range(2):
+            with pytest.raises(SharedCacheError, match="NOAUTH"):
+                await backend.get("key")
+        await backend.close()
+
+    assert server.connections == 1
+
+
+async def test_unreachable_redis_is_a_counted_miss():
+    async with StandInRedisServer() as server:
+        url = server.url()
+    cache = SharedCache(RedisBackend(url, timeout=0.5))
+    assert await cache.get("snap") is None
+    assert await cache.generation("c1") is None
+    assert await cache.bump("c1") is None
+    assert cache.stats()["errors"] == 3
+    await cache.close()
+
+
+async def test_generation_bump_reaches_other_processes():
+    async with StandInRedisServer() as server:
+        first = SharedCache(RedisBackend(server.url(), timeout=1.0))
+        second = SharedCache(RedisBackend(server.url(), timeout=1.0))
+        assert await second.generation("c1") == 0
+        assert await first.bump("c1") == 1
+        assert await first.bump("c1") == 2
+        assert await second.generation("c1") == 2
+        assert await second.generation("c2") == 0
+        await first.close()
+        await second.close()
+
+
+async def test_invalidation_bumps_the_company_generation(server):
+    async with StandInRedisServer() as redis:
+        server.shared_cache = SharedCache(RedisBackend(redis.url(), timeout=1.0))
+        try:
+            assert await server._company_generation("c1") == 0
+            server.schedule_cache.put(("c1", "scope-a", 0), CompanySnapshot([]), 10)
+            server.invalidate_company_cache("c1")
+            await asyncio.gather(*server._background_tasks)
+            assert redis.value("shiftwork:gen:c1") == b"1"
+            assert await server._company_generation("c1") == 1
+            server.invalidate_company_cache("c1")
+            # A fetch that was in flight stores its snapshot under the old generation before the bump lands
+            server.schedule_cache.put(("c1", "scope-a", 1), CompanySnapshot([]), 10)
+            await asyncio.gather(*server._background_tasks)
+            assert server.schedule_cache.get(("c1", "scope-a", 1)) is None
+            assert server.schedule_cache.get(("c1", "scope-a", 2)) is None
+            assert await server._company_generation("c1") == 2
+        finally:
+            await server.shared_cache.close()
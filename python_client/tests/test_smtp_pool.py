@@ -0,0 +1,137 @@
+"""SMTPPool against a local stand-in SMTP server"""
+
+import pytest
+
+from smtp_pool import SMTPPool, SMTPRecipientsRefused, SMTPReplyError
+from smtp_stand_in import StandInSMTPServer
+
+MESSAGE = "From: sender@example.com\r\nTo: a@example.com\r\nSubject: Schedule\r\n\r\nHello\r\n.dotted line\r\n"
+
+
+def _pool(server: StandInSMTPServer, **options) -> SMTPPool:
+    options.setdefault("username", "sender@example.com")
+    options.setdefault("password", "secret")
+    return SMTPPool("127.0.0.1", server.port, sender="sender@example.com", starttls=False, timeout=5.0, **options)
+
+
+async def test_connection_is_reused_across_messages():
+    async with StandInSMTPServer(auth=("sender@example.com", "secret")) as server:
+        pool = _pool(server)
+        for recipient in ("a@example.com", "b@example.com", "c@example.com"):
+            assert await pool.send_message(MESSAGE, recipients=[recipient]) == {}
+        await pool.close()
+
+    assert len(server.sessions) == 1
+    assert server.sessions[0].authenticated == "sender@example.com"
+    assert server.sessions[0].messages == 3
+    assert [d.recipients for d in server.delivered] == [["a@example.com"], ["b@example.com"], ["c@example.com"]]
+    assert server.commands()[-1] == "QUIT"
+    stats = pool.stats()
+    assert (stats["connections_opened"], stats["sent"], stats["reconnects"]) == (1, 3, 0)
+
+
+async def test_connection_is_replaced_after_max_messages():
+    async with StandInSMTPServer() as server:
+        pool = _pool(server, username=None, password=None, max_messages_per_connection=2)
+        for _ in range(3):
+            await pool.send_message(MESSAGE, recipients=["a@example.com"])
+        await pool.close()
+
+    assert [s.messages for s in server.sessions] == [2, 1]
+
+
+async def test_dot_stuffing_round_trips():
+    async with StandInSMTPServer() as server:
+        pool = _pool(server, username=None, password=None)
+        await pool.send_message(MESSAGE, recipients=["a@example.com"])
+        await pool.close()
+
+    assert server.delivered[0].data.endswith(b"Hello\r\n.dotted line\r\n")
+
+
+async def test_reconnects_once_after_421():
+    # The first session is closed by the server at its second MAIL FROM
+    mails = {}
+
+    def reply_421(session, command):
+        mails[session] = mails.get(session, 0) + 1
+        return session == 0 and mails[session] == 2
+
+    async with StandInSMTPServer(auth=("sender@example.com", "secret"), reply_421=reply_421) as server:
+        pool = _pool(server)
+        await pool.send_message(MESSAGE, recipients=["a@example.com"])
+        await pool.send_message(MESSAGE, recipients=["b@example.com"])
+        await pool.close()
+
+    assert len(server.sessions) == 2
+    assert [d.recipients for d in server.delivered] == [["a@example.com"], ["b@example.com"]]
+    assert server.sessions[1].authenticated == "sender@example.com"
+    stats = pool.stats()
+    assert (stats["connections_opened"], stats["reconnects"], stats["sent"], stats["failed"]) == (2, 1, 2, 0)
+
+
+async def test_repeated_421_is_raised_after_one_retry():
+    async with StandInSMTPServer(reply_421=lambda session, command: True) as server:
+        pool = _pool(server, username=None, password=None)
+        with pytest.raises(SMTPReplyError) as raised:
+            await pool.send_message(MESSAGE, recipients=["a@example.com"])
+        await pool.close()
+
+    assert raised.value.code == 421
+    assert len(server.sessions) == 2
+    assert pool.stats()["failed"] == 1
+
+
+async def test_pipelining_sends_envelope_in_one_write():
+    recipients = ["a@example.com", "b@example.com", "c@example.com"]
+    async with StandInSMTPServer(pipelining=True) as server:
+        pool = _pool(server, username=None, password=None)
+        await pool.send_message(MESSAGE, recipients=recipients)
+        await pool.close()
+
+    assert server.mail_reads() == [
+        ["MAIL FROM:<sender@example.com>"] + [f"RCPT TO:<{r}>" for r in recipients] + ["DATA"]
+    ]
+    assert server.delivered[0].recipients == recipients
+
+
+async def test_without_pipelining_commands_wait_for_replies():
+    recipients = ["a@example.com", "b@example.com"]
+    async with StandInSMTPServer(pipelining=False) as server:
+        pool = _pool(server, username=None, password=None)
+        await pool.send_message(MESSAGE, recipients=recipients)
+        await pool.close()
+
+    envelope = [read for read in server.sessions[0].reads if read[0].split(" ")[0] in ("MAIL", "RCPT", "DATA")]
+    assert envelope == [["MAIL FROM:<sender@example.com>"], ["RCPT TO:<a@example.com>"],
+                        ["RCPT TO:<b@example.com>"], ["DATA"]]
+    assert server.delivered[0].recipients == recipients
+
+
+@pytest.mark.parametrize("pipelining", [True, False])
+async def test_some_recipients_refused(pipelining):
+    async with StandInSMTPServer(pipelining=pipelining, refuse={"gone@example.com"}) as server:
+        pool = _pool(server, username=None, password=None)
+        refused = await pool.send_message(MESSAGE, recipients=["a@example.com", "gone@example.com", "b@example.com"])
+        await pool.close()
+
+    assert list(refused) == ["gone@example.com"]
+    assert refused["gone@example.com"][0] == 550
+    assert server.delivered[0].recipients == ["a@example.com", "b@example.com"]
+
+
+@pytest.mark.parametrize("pipelining", [True, False])
+async def test_all_recipients_refused_keeps_connection_usable(pipelining):
+    async with StandInSMTPServer(pipelining=pipelining, refuse={"gone@example.com", "left@example.com"}) as server:
+        pool = _pool(server, username=None, password=None)
+        with pytest.raises(SMTPRecipientsRefused) as raised:
+            await pool.send_message(MESSAGE, recipients=["gone@example.com", "left@example.com"])
+        assert not raised.value.transient
+        # The session was reset, not dropped, so the next message goes out on it
+        await pool.send_message(MESSAGE, recipients=["a@example.com"])
+        await pool.close()
+
+    assert set(raised.value.refused) == {"gone@example.com", "left@example.com"}
+    assert len(server.sessions) == 1
+    assert "RSET" in server.commands()
+    assert [d.recipients for d in server.delivered] == [["a@example.com"]]
@@ -0,0 +1,117 @@
+"""Company snapshots decoded batch by batch from a streamed upstream body"""
+
+import asyncio
+import json
+
+import httpx
+import pytest
+
+from json_stream import iter_json_array_batches
+from schedule_cache import CompanySnapshot, SnapshotCache
+from schedule_record import Schedule, decode_schedules
+
+ROWS = [
+    {"scheduleId": i, "personId": i % 3, "companyId": "c1", "status": "published",
+     # Looks like an element boundary, but sits inside a string
+     "description": "swap },{ with next shift" if i % 4 == 0 else None,
+     "startDate": f"2026-10-{i % 28 + 1:02d}T08:00:00"}
+    for i in range(50)
+]
+BODY = json.dumps(ROWS, separators=(",", ":")).encode("utf-8")
+
+
+async def _chunks(data: bytes, size: int):
+    for i in range(0, len(data), size):
+        yield data[i:i + size]
+
+
+def _client(handler) -> httpx.AsyncClient:
+    return httpx.AsyncClient(base_url="http://api", transport=httpx.MockTransport(handler))
+
+
+@pytest.mark.parametrize("size", [1, 7, 64, 1000, len(BODY)])
+async def test_batches_match_whole_body_decode(size):
+    batches = [batch async for batch in iter_json_array_batches(_chunks(BODY, size), decode_schedules)]
+    rows = [row for batch in batches for row in batch]
+    assert [r.to_dict() for r in rows] == [r.to_dict() for r in decode_schedules(BODY)]
+    if size < len(BODY) // 4:
+        assert len(batches) > 1
+
+
+async def test_snapshot_fetch_streams_and_revalidates(server):
+    requests = []
+    decoded_sizes = []
+
+    def decode(data: bytes):
+        decoded_sizes.append(len(data))
+        return decode_schedules(data)
+
+    def handler(request: httpx.Request) -> httpx.Response:
+        requests.append(request)
+        if request.url.path.endswith("/missing/schedules"):
+            return httpx.Response(404)
+        return httpx.Response(200, content=_chunks(BODY, 256))
+
+    server.http_client = _client(handler)
+    path = "/api/companies/c1/schedules"
+    snapshot, size = await server._http_stream_json_batches(path, decode, CompanySnapshot)
+    assert size == len(BODY)
+    assert len(snapshot) == 50
+    assert all(isinstance(row, Schedule) for row in snapshot.schedules)
+    assert [s.get("scheduleId") for s in snapshot.by_person("1")] == [i for i in range(50) if i % 3 == 1]
+    assert snapshot.schedules[0].description == "swap },{ with next shift"
+    # Never one decode over the whole body
+    assert len(decoded_sizes) > 1 and max(decoded_sizes) < len(BODY)
+
+    # Same body again: the previously built snapshot is reused
+    again, _ = await server._http_stream_json_batches(path, decode, CompanySnapshot)
+    assert again is snapshot
+    assert server.conditional_store.stats()["endpoints"]["/api/companies/{id}/schedules"]["unchanged"] == 1
+
+    assert await server._http_stream_json_batches("/api/companies/missing/schedules", decode, CompanySnapshot) == (None, 0)
+
+
+async def test_not_modified_reuses_snapshot(server):
+    def handler(request: httpx.Request) -> httpx.Response:
+        if request.headers.get("If-None-Match") == '"v1"':
+            return httpx.Response(304)
+        return httpx.Response(200, content=_chunks(BODY, 512), headers={"ETag": '"v1"'})
+
+    server.http_client = _client(handler)
+    first = await server._get_company_snapshot("c1")
+    server.schedule_cache.clear()
+    second = await server._get_company_snapshot("c1")
+    assert second is first
+    counters = server.conditional_store.stats()["endpoints"]["/api/companies/{id}/schedules"]
+    assert counters["not_modified"] == 1
+
+
+async def test_malformed_body_is_a_parse_error(server):
+    server.http_client = _client(lambda request: httpx.Response(200, content=_chunks(BODY[:-40], 100)))
+    with pytest.raises(ValueError):
+        await server._get_company_snapshot("c1")
+    assert server._breaker_for("/api/companies/c1/schedules").consecutive_failures == 1
+
+
+async def test_concurrent_calls_share_one_fetch_with_caching_disabled(server):
+    """SCHEDULE_CACHE_TTL=0 keeps no snapshot, but concurrent calls for a company must not each download it"""
+    server.schedule_cache = SnapshotCache(ttl=0, max_entries=10, max_bytes=10_000_000)
+    requests = []
+
+    async def handler(request: httpx.Request) -> httpx.Response:
+        requests.append(request.url.path)
+        await asyncio.sleep(0.02)
+        return httpx.Response(200, content=BODY)
+
+    server.http_client = _client(handler)
+    results = await asyncio.gather(*(
+        server._execute_tool("get_employee_schedules", {"company_id": "c1", "person_id": str(n % 3)})
+        for n in range(5)
+    ))
+    assert requests == ["/api/companies/c1/schedules"]
+    assert [r["total_schedules"] for r in results] == [len([i for i in range(50) if i % 3 == n % 3]) for n in range(5)]
+    assert server.schedule_cache.stats()["entries"] == 0
+
+    # Nothing was kept, so the next call goes upstream again
+    await server._execute_tool("get_employee_schedules", {"company_id": "c1", "person_id": "1"})
+    assert len(requests) == 2
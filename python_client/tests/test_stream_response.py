@@ -0,0 +1,92 @@
+"""_stream_json_response: chunked JSON / NDJSON output and mid-stream failures"""
+
+import json
+
+import aiohttp
+import pytest
+from aiohttp import web
+from aiohttp.test_utils import TestClient, TestServer
+
+import http_mcp_server
+
+RESULT = {"company_id": "c1", "total_schedules": 10, "schedules": [{"scheduleId": i} for i in range(10)]}
+
+
+@pytest.fixture(autouse=True)
+def small_batches(monkeypatch):
+    monkeypatch.setattr(http_mcp_server, "STREAM_MIN_ROWS", 5)
+    monkeypatch.setattr(http_mcp_server, "STREAM_BATCH_ROWS", 3)
+
+
+async def _serve(outcomes: list):
+    async def handler(request):
+        try:
+            response = await http_mcp_server._stream_json_response(request, RESULT, "schedules")
+        except Exception as e:  # pragma: no cover - what the endpoints would turn into a second response
+            outcomes.append(e)
+            raise
+        outcomes.append(response)
+        return response
+
+    app = web.Application()
+    app.router.add_get("/rows", handler)
+    client = TestClient(TestServer(app))
+    await client.start_server()
+    return client
+
+
+async def test_large_result_is_streamed_as_json():
+    outcomes = []
+    client = await _serve(outcomes)
+    try:
+        response = await client.get("/rows")
+        assert response.headers["Transfer-Encoding"] == "chunked"
+        assert response.headers["X-Total-Count"] == "10"
+        assert json.loads(await response.read()) == RESULT
+    finally:
+        await client.close()
+
+
+async def test_ndjson_writes_one_row_per_line():
+    client = await _serve([])
+    try:
+        response = await client.get("/rows", params={"format": "ndjson"})
+        assert response.content_type == "application/x-ndjson"
+        lines = (await response.read()).decode().splitlines()
+        assert [json.loads(line) for line in lines] == RESULT["schedules"]
+    finally:
+        await client.close()
+
+
+@pytest.mark.parametrize("error", [ConnectionResetError("reset by peer"), RuntimeError("encoder failed")])
+async def test_write_failure_after_headers_ends_the_stream(monkeypatch, error):
+    writes = []
+    original = web.StreamResponse.write
+
+    async def failing_write(self, data):
+        writes.append(data)
+        if len(writes) == 2:
+            raise error
+        await original(self, data)
+
+    monkeypatch.setattr(web.StreamResponse, "write", failing_write)
+    outcomes = []
+    client = await _serve(outcomes)
+    try:
+        response = await client.get("/rows")
+        assert response.status == 200
+        if isinstance(error, ConnectionResetError):
+            body = await response.read()
+        else:
+            # A failure on the server side drops the connection, so the client cannot mistake the body for complete
+            with pytest.raises(aiohttp.ClientPayloadError):
+                await response.read()
+            body = b""
+    finally:
+        await client.close()
+
+    # The helper handed back the response it had started; nothing was raised to the endpoint
+    assert len(outcomes) == 1 and isinstance(outcomes[0], web.StreamResponse)
+    assert len(writes) == 2
+    with pytest.raises(ValueError):
+        json.loads(body)
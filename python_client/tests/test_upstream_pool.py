@@ -0,0 +1,127 @@
+"""Upstream pool instrumentation: connection reuse, pool waits and timeouts, and the in-flight gauge"""
+
+import asyncio
+
+import httpx
+import pytest
+from aiohttp import web
+from aiohttp.test_utils import TestServer
+
+from upstream_pool import InstrumentedTransport, PoolStats, build_transport
+
+
+class FakePool:
+    """Replaces the httpcore pool behind InstrumentedTransport, firing the trace events a real pool would"""
+
+    def __init__(self, connections: int = 1):
+        self.connections = connections
+        self.opened = 0
+
+    async def handle(self, request: httpx.Request) -> httpx.Response:
+        trace = request.extensions["trace"]
+        await asyncio.sleep(0.01)  # waiting for the pool
+        if self.opened < self.connections:
+            self.opened += 1
+            await trace("connection.connect_tcp.started", {})
+            await asyncio.sleep(0.005)
+            await trace("connection.connect_tcp.complete", {})
+            await trace("http11.send_request_headers.started", {})
+        else:
+            await trace("http2.send_request_headers.started", {})
+        if request.url.path == "/timeout":
+            raise httpx.PoolTimeout("no connection available")
+        return httpx.Response(200, request=request)
+
+    def install(self, monkeypatch):
+        async def handle_async_request(transport, request):
+            return await self.handle(request)
+        monkeypatch.setattr(httpx.AsyncHTTPTransport, "handle_async_request", handle_async_request)
+
+
+async def test_new_and_reused_connections_are_counted(monkeypatch):
+    waits = []
+    stats = PoolStats(observe_wait=waits.append)
+    FakePool(connections=1).install(monkeypatch)
+    async with httpx.AsyncClient(transport=InstrumentedTransport(stats)) as client:
+        for _ in range(4):
+            assert (await client.get("http://api/ping")).status_code == 200
+
+    result = stats.stats()
+    assert (result["requests"], result["new_connections"], result["reused_connections"]) == (4, 1, 3)
+    assert result["reuse_ratio"] == 0.75
+    assert result["http_versions"] == {"HTTP/1.1": 1, "HTTP/2": 3}
+    assert result["connect_max_ms"] >= 5 and result["connect_avg_ms"] == result["connect_max_ms"]
+    assert len(waits) == 4 and min(waits) >= 0.01
+    assert result["pool_wait_max_ms"] >= result["pool_wait_avg_ms"] >= 10
+
+
+async def test_pool_timeouts_are_counted(monkeypatch):
+    stats = PoolStats()
+    FakePool().install(monkeypatch)
+    async with httpx.AsyncClient(transport=InstrumentedTransport(stats)) as client:
+        with pytest.raises(httpx.PoolTimeout):
+            await client.get("http://api/timeout")
+    assert stats.pool_timeouts == 1
+
+
+def test_empty_stats():
+    assert PoolStats().stats() == {
+        "requests": 0, "new_connections": 0, "reused_connections": 0, "reuse_ratio": 0.0, "pool_timeouts": 0,
+        "pool_wait_avg_ms": 0.0, "pool_wait_max_ms": 0.0, "connect_avg_ms": 0.0, "connect_max_ms": 0.0,
+        "http_versions": {},
+    }
+
+
+async def test_keepalive_connection_is_reused_against_a_real_server():
+    async def hello(request):
+        await asyncio.sleep(0.02)
+        return web.json_response({"ok": True})
+
+    app = web.Application()
+    app.router.add_get("/hello", hello)
+    stats = PoolStats()
+    async with TestServer(app) as upstream:
+        transport = build_transport(stats, http2=False, max_connections=1, max_keepalive_connections=1,
+                                    keepalive_expiry=30)
+        async with httpx.AsyncClient(base_url=str(upstream.make_url("")), transport=transport) as client:
+            for _ in range(3):
+                await client.get("/hello")
+            # One connection for three concurrent requests: two of them wait for it
+            await asyncio.gather(*(client.get("/hello") for _ in range(3)))
+
+    result = stats.stats()
+    assert (result["requests"], result["new_connections"], result["reused_connections"]) == (6, 1, 5)
+    assert result["http_versions"] == {"HTTP/1.1": 6}
+    assert result["pool_wait_max_ms"] >= 20
+
+
+async def test_in_flight_gauge_follows_upstream_calls(server):
+    gate = asyncio.Event()
+    seen = []
+
+    async def send():
+        seen.append(server._upstream_in_flight)
+        await gate.wait()
+        return "ok"
+
+    async def fail():
+        raise httpx.HTTPStatusError("", request=httpx.Request("GET", "http://api"), response=httpx.Response(404))
+
+    calls = [asyncio.ensure_future(server._call_upstream("/api/companies/c1/people", send)) for _ in range(2)]
+    await asyncio.sleep(0.01)
+    assert server._upstream_in_flight == 2
+    assert "gateway_upstream_in_flight 2" in server.metrics.render().splitlines()
+    gate.set()
+    assert await asyncio.gather(*calls) == ["ok", "ok"]
+    assert sorted(seen) == [1, 2]
+
+    with pytest.raises(httpx.HTTPStatusError):
+        await server._call_upstream("/api/companies/c1/people", fail)
+    cancelled = asyncio.ensure_future(server._call_upstream("/api/companies/c1/people", asyncio.Event().wait))
+    await asyncio.sleep(0.01)
+    cancelled.cancel()
+    with pytest.raises(asyncio.CancelledError):
+        await cancelled
+    # Failures and cancellations release their slot too
+    assert server._upstream_in_flight == 0
+    assert "gateway_upstream_in_flight 0" in server.metrics.render().splitlines()
@@ -0,0 +1,114 @@
+"""POST /webhooks/shiftwork: signature checks, duplicate deliveries and coalesced invalidation"""
+
+import asyncio
+import base64
+import hashlib
+import hmac
+import json
+
+import pytest
+from aiohttp.test_utils import TestClient, TestServer
+
+import http_mcp_server
+from schedule_cache import CompanySnapshot
+
+SECRET = "webhook-test-secret"
+
+
+def _sign(body: bytes, secret: str = SECRET) -> str:
+    # Same scheme as WebhookService.GenerateHmacSignature
+    return base64.b64encode(hmac.new(secret.encode("utf-8"), body, hashlib.sha256).digest()).decode()
+
+
+def _payload(event_type: str, company_id: str = "c1", timestamp: str = "2026-10-17T08:00:00Z") -> bytes:
+    return json.dumps({"eventType": event_type, "timestamp": timestamp,
+                       "data": {"companyId": company_id, "personId": 6}}).encode("utf-8")
+
+
+@pytest.fixture
+def coalesce(monkeypatch):
+    monkeypatch.setattr(http_mcp_server, "WEBHOOK_SECRET_KEY", SECRET)
+    monkeypatch.setattr(http_mcp_server, "WEBHOOK_COALESCE_SECONDS", 0.05)
+
+
+@pytest.fixture
+async def client(server, coalesce):
+    client = TestClient(TestServer(server.http_app))
+    await client.start_server()
+    yield client
+    await client.close()
+
+
+async def _deliver(client, body: bytes, signature=None):
+    headers = {"Content-Type": "application/json"}
+    if signature is not False:
+        headers["X-ShiftWork-Signature"] = signature or _sign(body)
+    return await client.post("/webhooks/shiftwork", data=body, headers=headers)
+
+
+def _cache_company(server, company_id: str):
+    """Seed a schedule snapshot under two token scopes plus a people body, as fetches would have"""
+    for scope in ("scope-a", "scope-b"):
+        server.schedule_cache.put((company_id, scope, 0), CompanySnapshot([]), 10)
+    people = (f"/api/companies/{company_id}/people", (), "scope-a")
+    server.conditional_store.store(people, "people", ["p"], 10, {}, b"digest")
+    return people
+
+
+async def test_signature_is_required(server, client):
+    body = _payload("employee.updated")
+    assert (await _deliver(client, body, signature=False)).status == 401
+    assert (await _deliver(client, body, signature=_sign(body, "other-secret"))).status == 401
+    tampered = body.replace(b"c1", b"c2")
+    assert (await _deliver(client, tampered, signature=_sign(body))).status == 401
+    assert server.webhook_stats["rejected"] == 3
+    assert server.webhook_stats["received"] == 0
+
+
+async def test_unconfigured_receiver_answers_503(server, client, monkeypatch):
+    monkeypatch.setattr(http_mcp_server, "WEBHOOK_SECRET_KEY", None)
+    assert (await _deliver(client, _payload("employee.updated"))).status == 503
+
+
+async def test_missing_company_is_a_bad_request(client):
+    body = json.dumps({"eventType": "employee.updated", "data": {"personId": 6}}).encode("utf-8")
+    assert (await _deliver(client, body)).status == 400
+
+
+async def test_redelivered_body_is_ignored(server, client):
+    body = _payload("employee.updated")
+    first = await _deliver(client, body)
+    again = await _deliver(client, body)
+    assert (first.status, (await first.json())["status"]) == (202, "accepted")
+    assert (again.status, (await again.json())["status"]) == (200, "duplicate")
+    # A new event with otherwise identical data has a different timestamp, so a different digest
+    other = await _deliver(client, _payload("employee.updated", timestamp="2026-10-17T08:00:05Z"))
+    assert other.status == 202
+    assert server.webhook_stats["duplicates"] == 1
+
+
+async def test_burst_is_flushed_once_after_the_window(server, client):
+    people = _cache_company(server, "c1")
+    _cache_company(server, "c2")
+    for n, event_type in enumerate(["employee.created", "employee.updated", "location.updated"]):
+        assert (await _deliver(client, _payload(event_type, timestamp=f"2026-10-17T08:00:0{n}Z"))).status == 202
+    assert (await _deliver(client, _payload("employee.updated", company_id="c2"))).status == 202
+    assert server.webhook_stats["flushes"] == 0
+    assert people in server.conditional_store
+
+    await asyncio.sleep(0.15)
+    assert server.webhook_stats["flushes"] == 1
+    assert server.webhook_stats["invalidations"] == 2
+    assert people not in server.conditional_store
+    # Employee and location events leave the schedule snapshots alone
+    assert server.schedule_cache.get(("c1", "scope-a", 0)) is not None
+
+
+async def test_unknown_event_drops_the_company_for_every_scope(server, client):
+    _cache_company(server, "c1")
+    _cache_company(server, "c2")
+    assert (await _deliver(client, _payload("schedule.updated"))).status == 202
+    await asyncio.sleep(0.15)
+    assert server.schedule_cache.get(("c1", "scope-a", 0)) is None
+    assert server.schedule_cache.get(("c1", "scope-b", 0)) is None
+    assert server.schedule_cache.get(("c2", "scope-a", 0)) is not None
@@ -0,0 +1,114 @@
+"""--workers mode: /metrics assembled over the workers' Unix sockets, and restarting workers that die"""
+
+import multiprocessing
+import os
+import signal
+import time
+
+import pytest
+
+from http_mcp_server import ShiftWorkServer
+from workers import Supervisor, WorkerContext
+
+
+def _context(slot: int, socket_dir: str) -> WorkerContext:
+    return WorkerContext(slot=slot, socket_dir=socket_dir, sock=None, ready=multiprocessing.get_context("fork").Event())
+
+
+@pytest.fixture
+async def workers(tmp_path):
+    started = []
+
+    async def start(slot: int) -> ShiftWorkServer:
+        worker = ShiftWorkServer(worker=_context(slot, str(tmp_path)))
+        await worker._start_worker_metrics()
+        started.append(worker)
+        return worker
+
+    yield start
+    for worker in started:
+        await worker._stop_worker_metrics()
+        worker.offloader.shutdown()
+
+
+async def test_group_metrics_merge_every_worker_over_unix_sockets(workers, tmp_path, caplog):
+    first, second = await workers(0), await workers(1)
+    first.m_http_requests.inc("/ping", "GET", "200", amount=3)
+    second.m_http_requests.inc("/ping", "GET", "200", amount=4)
+    # A socket left behind by a worker that died is skipped, not fatal
+    (tmp_path / "worker-7.sock").touch()
+
+    lines = (await first._group_metrics()).splitlines()
+    assert 'gateway_http_requests_total{worker="0",route="/ping",method="GET",status="200"} 3' in lines
+    assert 'gateway_http_requests_total{worker="1",route="/ping",method="GET",status="200"} 4' in lines
+    assert lines.count("# TYPE gateway_http_requests_total counter") == 1
+    assert "Could not collect metrics from worker-7.sock" in caplog.text
+    # Any worker can answer for the group
+    assert 'gateway_http_requests_total{worker="0",route="/ping",method="GET",status="200"} 3' in (
+        await second._group_metrics()).splitlines()
+
+
+async def test_replacement_worker_takes_over_the_slot_socket(workers, tmp_path):
+    old = await workers(0)
+    new = await workers(0)
+    new.m_http_requests.inc("/ping", "GET", "200")
+    # The retiring worker leaves the socket alone once its replacement has taken it over
+    await old._stop_worker_metrics()
+    assert os.listdir(tmp_path) == ["worker-0.sock"]
+    observer = await workers(1)
+    assert 'gateway_http_requests_total{worker="0",route="/ping",method="GET",status="200"} 1' in (
+        await observer._group_metrics()).splitlines()
+
+
+def _idle_worker(context: WorkerContext):
+    context.ready.set()
+    time.sleep(60)
+
+
+@pytest.fixture
+def supervisor(tmp_path):
+    supervisor = Supervisor(1, _idle_worker, host="127.0.0.1", port=0, shutdown_timeout=2)
+    supervisor.socket_dir = str(tmp_path)
+    yield supervisor
+    supervisor._shutdown()
+
+
+def _kill(supervisor: Supervisor, slot: int = 0) -> int:
+    pid = supervisor._workers[slot].process.pid
+    os.kill(pid, signal.SIGKILL)
+    supervisor._workers[slot].process.join(5)
+    return pid
+
+
+def test_dead_worker_is_restarted(supervisor):
+    supervisor.MIN_UPTIME = 0.0
+    supervisor._reap()
+    assert supervisor._workers[0].ready.wait(5)
+    pid = _kill(supervisor)
+
+    supervisor._reap()
+    replacement = supervisor._workers[0]
+    assert replacement.process.pid != pid and replacement.process.is_alive()
+    assert replacement.ready.wait(5)
+    assert supervisor._failures == {}
+
+
+def test_worker_that_keeps_dying_is_restarted_with_backoff(supervisor):
+    supervisor.MIN_UPTIME = 60.0
+    supervisor._reap()
+    _kill(supervisor)
+
+    supervisor._reap()
+    # Died right after starting: the slot waits 1 s before the next attempt
+    assert 0 not in supervisor._workers
+    assert supervisor._failures == {0: 1}
+    supervisor._reap()
+    assert 0 not in supervisor._workers
+
+    supervisor._respawn_at[0] = time.monotonic()
+    supervisor._reap()
+    assert supervisor._workers[0].process.is_alive()
+    _kill(supervisor)
+    supervisor._reap()
+    assert supervisor._failures == {0: 2}
+    assert supervisor._respawn_at[0] - time.monotonic() == pytest.approx(2, abs=0.5)
@@ -0,0 +1,137 @@
+#!/usr/bin/env python3
+"""
+Instrumented connection pool for the gateway's upstream httpx client
+
+- build_transport(): an httpx transport with env-driven pool limits, keepalive
+  expiry and optional HTTP/2 (falls back to HTTP/1.1 when h2 is not installed)
+- PoolStats: pool-wait time, connect time and connection reuse ratio, gathered
+  from httpcore trace events so no private pool internals are touched
+"""
+
+import logging
+import time
+from typing import Any, Callable, Dict, Optional
+
+import httpx
+
+logger = logging.getLogger(__name__)
+
+try:
+    import h2  # noqa: F401  (httpx needs it for http2=True)
+    HTTP2_AVAILABLE = True
+except ImportError:  # pragma: no cover - optional dependency
+    HTTP2_AVAILABLE = False
+
+
+class PoolStats:
+    """Counters and timings for requests sent through an InstrumentedTransport"""
+
+    def __init__(self, observe_wait: Optional[Callable[[float], None]] = None):
+        # Optional hook that receives every pool wait, e.g. a latency histogram
+        self.observe_wait = observe_wait
+        self.requests = 0
+        self.new_connections = 0
+        self.reused_connections = 0
+        self.pool_timeouts = 0
+        self.pool_wait_total = 0.0
+        self.pool_wait_max = 0.0
+        self.connect_total = 0.0
+        self.connect_max = 0.0
+        self.http_versions: Dict[str, int] = {}
+
+    def record(self, pool_wait: float, connect: float | None, http_version: str | None):
+        self.requests += 1
+        self.pool_wait_total += pool_wait
+        self.pool_wait_max = max(self.pool_wait_max, pool_wait)
+        if self.observe_wait is not None:
+            self.observe_wait(pool_wait)
+        if connect is None:
+            self.reused_connections += 1
+        else:
+            self.new_connections += 1
+            self.connect_total += connect
+            self.connect_max = max(self.connect_max, connect)
+        if http_version:
+            self.http_versions[http_version] = self.http_versions.get(http_version, 0) + 1
+
+    def stats(self) -> dict:
+        sent = self.new_connections + self.reused_connections
+        return {
+            "requests": self.requests,
+            "new_connections": self.new_connections,
+            "reused_connections": self.reused_connections,
+            "reuse_ratio": round(self.reused_connections / sent, 4) if sent else 0.0,
+            "pool_timeouts": self.pool_timeouts,
+            "pool_wait_avg_ms": round(1000 * self.pool_wait_total / self.requests, 3) if self.requests else 0.0,
+            "pool_wait_max_ms": round(1000 * self.pool_wait_max, 3),
+            "connect_avg_ms": round(1000 * self.connect_total / self.new_connections, 3) if self.new_connections else 0.0,
+            "connect_max_ms": round(1000 * self.connect_max, 3),
+            "http_versions": dict(self.http_versions),
+        }
+
+
+class _RequestTrace:
+    """httpcore trace callback for one request.
+
+    The pool hands out a connection just before either connect_tcp (a new
+    connection) or send_request_headers (an idle or multiplexed one) starts,
+    so the time up to the first of those events is the pool wait.
+    """
+
+    __slots__ = ("started", "acquired", "connect_started", "connect_time", "version")
+
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.acquired = None
+        self.connect_started = None
+        self.connect_time = None
+        self.version = None
+
+    async def __call__(self, event: str, info: Dict[str, Any]):
+        now = time.perf_counter()
+        if event == "connection.connect_tcp.started":
+            self.acquired = self.acquired or now
+            self.connect_started = now
+        elif event in ("connection.connect_tcp.complete", "connection.start_tls.complete"):
+            if self.connect_started is not None:
+                self.connect_time = now - self.connect_started
+        elif event.endswith(".send_request_headers.started"):
+            self.acquired = self.acquired or now
+            self.version = "HTTP/2" if event.startswith("http2.") else "HTTP/1.1"
+
+
+class InstrumentedTransport(httpx.AsyncHTTPTransport):
+    """AsyncHTTPTransport that records pool wait and connection reuse for every request"""
+
+    def __init__(self, pool_stats: PoolStats, **kwargs):
+        super().__init__(**kwargs)
+        self.pool_stats = pool_stats
+
+    async def handle_async_request(self, request: httpx.Request) -> httpx.Response:
+        trace = _RequestTrace()
+        request.extensions = {**request.extensions, "trace": trace}
+        try:
+            return await super().handle_async_request(request)
+        except httpx.PoolTimeout:
+            self.pool_stats.pool_timeouts += 1
+            raise
+        finally:
+            if trace.acquired is not None:
+                self.pool_stats.record(trace.acquired - trace.started, trace.connect_time, trace.version)
+
+
+def build_transport(pool_stats: PoolStats, *, http2: bool, max_connections: int,
+                    max_keepalive_connections: int, keepalive_expiry: float) -> InstrumentedTransport:
+    """Transport for the upstream client; http2 is ignored (with a warning) when h2 is missing"""
+    if http2 and not HTTP2_AVAILABLE:
+        logger.warning("HTTPX_HTTP2 is enabled but the h2 package is not installed; using HTTP/1.1")
+        http2 = False
+    return InstrumentedTransport(
+        pool_stats,
+        http2=http2,
+        limits=httpx.Limits(
+            max_connections=max_connections,
+            max_keepalive_connections=max_keepalive_connections,
+            keepalive_expiry=keepalive_expiry,
+        ),
+    )
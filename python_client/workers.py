@@ -0,0 +1,217 @@
+#!/usr/bin/env python3
+"""
+Multi-process worker mode for the HTTP gateway (--workers N)
+
+- Supervisor forks N worker processes, each running its own event loop and
+  ShiftWorkServer. Workers bind the listening port with SO_REUSEPORT, so the
+  kernel spreads incoming connections across them; where SO_REUSEPORT is not
+  available the supervisor binds once and the workers inherit the socket
+- SIGHUP: rolling restart. A replacement is started for each worker in turn
+  and the old one only gets SIGTERM once the replacement is accepting
+- SIGTERM/SIGINT: every worker gets SIGTERM and drains in-flight requests for
+  up to the shutdown timeout (plus KILL_GRACE) before it is killed
+- Workers that exit unexpectedly are restarted, with backoff if they keep failing
+- Each worker serves its own /metrics on a Unix socket in a shared directory;
+  WorkerContext.peer_sockets() lists them so any worker can answer /metrics
+  for the whole group
+"""
+
+import logging
+import multiprocessing
+import os
+import re
+import shutil
+import signal
+import socket
+import tempfile
+import time
+from dataclasses import dataclass
+from typing import Callable, Dict, List, Optional
+
+logger = logging.getLogger(__name__)
+
+REUSE_PORT_AVAILABLE = hasattr(socket, "SO_REUSEPORT")
+
+_SOCKET_NAME = re.compile(r"^worker-\d+\.sock$")
+
+
+@dataclass
+class WorkerContext:
+    """What a worker process needs to know about its place in the group"""
+
+    slot: int
+    socket_dir: str
+    # Listening socket inherited from the supervisor; None means bind with SO_REUSEPORT
+    sock: Optional[socket.socket]
+    ready: "multiprocessing.synchronize.Event"
+
+    @property
+    def metrics_socket(self) -> str:
+        return os.path.join(self.socket_dir, f"worker-{self.slot}.sock")
+
+    def peer_sockets(self) -> List[str]:
+        """Metrics sockets of the other live workers"""
+        try:
+            names = os.listdir(self.socket_dir)
+        except OSError:
+            return []
+        own = os.path.basename(self.metrics_socket)
+        return sorted(os.path.join(self.socket_dir, n) for n in names if _SOCKET_NAME.match(n) and n != own)
+
+
+@dataclass
+class _Worker:
+    slot: int
+    process: multiprocessing.Process
+    ready: "multiprocessing.synchronize.Event"
+    started: float
+    # When a retiring worker must be gone; it is killed after this
+    deadline: float = 0.0
+
+
+class Supervisor:
+    """Starts, restarts and stops `count` workers running target(WorkerContext)"""
+
+    # Restart backoff for workers that die within MIN_UPTIME seconds of starting
+    MIN_UPTIME = 5.0
+    MAX_BACKOFF = 30.0
+    # Extra time past shutdown_timeout for a draining worker to close its clients and exit
+    KILL_GRACE = 5.0
+
+    def __init__(self, count: int, target: Callable[[WorkerContext], None], *, host: str, port: int,
+                 shutdown_timeout: float = 30.0, ready_timeout: float = 30.0):
+        self.count = max(count, 1)
+        self.target = target
+        self.host = host
+        self.port = port
+        self.shutdown_timeout = shutdown_timeout
+        self.ready_timeout = ready_timeout
+        self._mp = multiprocessing.get_context("fork")
+        self._sock: Optional[socket.socket] = None
+        self.socket_dir = ""
+        self._workers: Dict[int, _Worker] = {}
+        self._retiring: List[_Worker] = []
+        self._failures: Dict[int, int] = {}
+        self._respawn_at: Dict[int, float] = {}
+        self._stopping = False
+        self._reload = False
+
+    def _bind_shared_socket(self) -> socket.socket:
+        sock = socket.socket(socket.AF_INET6 if ":" in self.host else socket.AF_INET, socket.SOCK_STREAM)
+        sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        sock.bind((self.host, self.port))
+        sock.listen(1024)
+        sock.set_inheritable(True)
+        return sock
+
+    def _run_child(self, context: WorkerContext):
+        # Handlers installed by the supervisor are inherited across fork; the
+        # worker's event loop installs its own SIGTERM handler. SIGINT from a
+        # terminal reaches the whole group, so workers leave it to the supervisor.
+        signal.signal(signal.SIGTERM, signal.SIG_DFL)
+        signal.signal(signal.SIGHUP, signal.SIG_DFL)
+        signal.signal(signal.SIGINT, signal.SIG_IGN)
+        self.target(context)
+
+    def _spawn(self, slot: int) -> _Worker:
+        ready = self._mp.Event()
+        context = WorkerContext(slot=slot, socket_dir=self.socket_dir, sock=self._sock, ready=ready)
+        process = self._mp.Process(target=self._run_child, args=(context,), name=f"gateway-worker-{slot}")
+        process.start()
+        logger.info(f"Started worker {slot} (pid {process.pid})")
+        return _Worker(slot, process, ready, time.monotonic())
+
+    def _on_stop(self, signum, frame):
+        self._stopping = True
+
+    def _on_reload(self, signum, frame):
+        self._reload = True
+
+    def run(self) -> int:
+        """Run until SIGTERM/SIGINT; returns a process exit code"""
+        if not REUSE_PORT_AVAILABLE:
+            logger.warning("SO_REUSEPORT is not available; workers will share one inherited listening socket")
+            self._sock = self._bind_shared_socket()
+        self.socket_dir = tempfile.mkdtemp(prefix="shiftwork-workers-")
+        signal.signal(signal.SIGTERM, self._on_stop)
+        signal.signal(signal.SIGINT, self._on_stop)
+        signal.signal(signal.SIGHUP, self._on_reload)
+        logger.info(f"Starting {self.count} workers on {self.host}:{self.port} (SIGHUP for a rolling restart)")
+        try:
+            for slot in range(self.count):
+                self._workers[slot] = self._spawn(slot)
+            while not self._stopping:
+                if self._reload:
+                    self._reload = False
+                    self._rolling_restart()
+                self._reap()
+                time.sleep(0.2)
+        finally:
+            self._shutdown()
+        return 0
+
+    def _reap(self):
+        now = time.monotonic()
+        for worker in list(self._retiring):
+            if not worker.process.is_alive():
+                worker.process.join()
+                self._retiring.remove(worker)
+            elif now >= worker.deadline:
+                logger.warning(f"Worker {worker.slot} (pid {worker.process.pid}) did not drain in time; killing it")
+                worker.process.kill()
+        for slot in range(self.count):
+            worker = self._workers.get(slot)
+            if worker is not None:
+                if worker.process.is_alive():
+                    if now - worker.started >= self.MIN_UPTIME:
+                        self._failures.pop(slot, None)
+                    continue
+                worker.process.join()
+                logger.warning(f"Worker {slot} (pid {worker.process.pid}) exited with code {worker.process.exitcode}")
+                del self._workers[slot]
+                if now - worker.started < self.MIN_UPTIME:
+                    failures = self._failures[slot] = self._failures.get(slot, 0) + 1
+                    delay = min(2 ** (failures - 1), self.MAX_BACKOFF)
+                    logger.warning(f"Worker {slot} keeps failing; restarting it in {delay:.0f}s")
+                    self._respawn_at[slot] = now + delay
+            if now >= self._respawn_at.get(slot, 0.0) and not self._stopping:
+                self._respawn_at.pop(slot, None)
+                self._workers[slot] = self._spawn(slot)
+
+    def _rolling_restart(self):
+        logger.info("Rolling restart of all workers")
+        for slot in range(self.count):
+            old = self._workers.get(slot)
+            new = self._spawn(slot)
+            deadline = time.monotonic() + self.ready_timeout
+            while not new.ready.wait(0.2):
+                if self._stopping or not new.process.is_alive() or time.monotonic() >= deadline:
+                    logger.error(f"Replacement for worker {slot} did not become ready; keeping the old workers")
+                    new.process.kill()
+                    new.process.join()
+                    return
+            self._workers[slot] = new
+            if old is not None and old.process.is_alive():
+                old.process.terminate()
+                old.deadline = time.monotonic() + self.shutdown_timeout + self.KILL_GRACE
+                self._retiring.append(old)
+        logger.info("Rolling restart complete")
+
+    def _shutdown(self):
+        workers = list(self._workers.values()) + self._retiring
+        logger.info(f"Stopping {len(workers)} workers")
+        for worker in workers:
+            if worker.process.is_alive():
+                worker.process.terminate()
+        deadline = time.monotonic() + self.shutdown_timeout + self.KILL_GRACE
+        for worker in workers:
+            worker.process.join(max(deadline - time.monotonic(), 0))
+            if worker.process.is_alive():
+                logger.warning(f"Worker {worker.slot} (pid {worker.process.pid}) did not drain in time; killing it")
+                worker.process.kill()
+                worker.process.join()
+        self._workers.clear()
+        self._retiring.clear()
+        if self._sock is not None:
+            self._sock.close()
+        shutil.rmtree(self.socket_dir, ignore_errors=True)